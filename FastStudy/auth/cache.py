@@ -0,0 +1,86 @@
+# auth/cache.py
+import time
+from collections import OrderedDict
+
+from config import Config
+from metrics import metrics
+
+
+class PrincipalCache:
+    """
+    Bounded LRU of resolved users keyed by token subject (the email).
+    Entries expire after `ttl` seconds and are evicted whenever the user is
+    written on this worker; writes made elsewhere are caught by
+    auth.dependencies checking the entry's revision, so a warm request
+    reads one projected field instead of the whole document.
+    """
+
+    def __init__(self, max_size: int, ttl: int):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # subject -> (expires_at, user_id, user)
+        self._subjects_by_id = {}
+
+    def get(self, subject: str):
+        entry = self._entries.get(subject)
+        if entry is not None and entry[0] < time.monotonic():
+            self._drop(subject)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            metrics.incr("auth.principal_cache.miss")
+            return None
+
+        self._entries.move_to_end(subject)
+        self.hits += 1
+        metrics.incr("auth.principal_cache.hit")
+        # hand out a copy so handlers can mutate it without touching the cache
+        user = entry[2].model_copy(deep=True)
+        user._read_only = True
+        return user
+
+    def put(self, subject: str, user, generation: int):
+        # an invalidation landed while the user was being loaded, the copy may be stale
+        if generation != self.generation:
+            return
+        user_id = str(user.id)
+        self._drop(self._subjects_by_id.get(user_id))
+        self._entries[subject] = (time.monotonic() + self.ttl, user_id, user.model_copy(deep=True))
+        self._entries.move_to_end(subject)
+        self._subjects_by_id[user_id] = subject
+        while len(self._entries) > self.max_size:
+            _, (_, oldest_id, _) = self._entries.popitem(last=False)
+            self._subjects_by_id.pop(oldest_id, None)
+
+    def invalidate(self, subject: str = None, user_id=None):
+        """Evict a user by subject and/or id (the email may have changed)"""
+        self.generation += 1
+        if user_id is not None:
+            self._drop(self._subjects_by_id.get(str(user_id)))
+        self._drop(subject)
+
+    def clear(self):
+        self.generation += 1
+        self._entries.clear()
+        self._subjects_by_id.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def _drop(self, subject):
+        entry = self._entries.pop(subject, None) if subject is not None else None
+        if entry is not None:
+            self._subjects_by_id.pop(entry[1], None)
+
+
+# Global principal cache instance
+principal_cache = PrincipalCache(Config.PRINCIPAL_CACHE_SIZE, Config.PRINCIPAL_CACHE_TTL)
@@ -2,13 +2,26 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from models.User import User
+from metrics import metrics
+from models.User import User, UserRole
+from .cache import principal_cache
 from .utils import SECRET_KEY, ALGORITHM
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
 
 
 async def get_current_user(token: str = Depends(oauth2_scheme)):
+    return await resolve_principal(token)
+
+
+async def require_admin(current_user: User = Depends(get_current_user)) -> User:
+    if not current_user.role == UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return current_user
+
+
+async def resolve_principal(token: str) -> User:
+    """Resolve a bearer token to its user"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -22,7 +35,20 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     except JWTError:
         raise credentials_exception
 
+    # warm path: only the revision is read, to catch writes made on other workers
+    user = principal_cache.get(email)
+    if user is not None:
+        current = await User.get_motor_collection().find_one({"_id": user.id}, {"revision": 1})
+        if current is not None and current.get("revision", 0) == user.revision:
+            return user
+        principal_cache.invalidate(email, user.id)
+        metrics.incr("auth.principal_cache.stale")
+
+    generation = principal_cache.generation
     user = await User.find_one(User.email == email)
     if user is None:
         raise credentials_exception
+    principal_cache.put(email, user, generation)
+    # read-only whether it came from the cache or not, see User.bump_revision
+    user._read_only = True
     return user
\ No newline at end of file
@@ -0,0 +1,66 @@
+# auth/hashing.py
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException, status
+
+from config import Config
+from metrics import metrics
+from .utils import pwd_context
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt on a bounded thread pool so a burst of logins never blocks
+    the event loop. At most `workers` hashes run at once; once `max_queue`
+    more are waiting, further callers get a 503 instead of piling up.
+    """
+
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.pending = 0
+        self._slots = asyncio.Semaphore(workers)
+        self._executor = None
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", pwd_context.hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run("verify", pwd_context.verify, plain_password, hashed_password)
+
+    def shutdown(self):
+        if self._executor:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    async def _run(self, name: str, fn, *args):
+        if self.pending >= self.workers + self.max_queue:
+            metrics.incr("auth.hashing.rejected")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Authentication is busy, please retry",
+                headers={"Retry-After": "1"},
+            )
+
+        self.pending += 1
+        queued_at = time.perf_counter()
+        try:
+            async with self._slots:
+                metrics.observe("auth.hashing.queue_wait", time.perf_counter() - queued_at)
+                with metrics.timer(f"auth.hashing.{name}"):
+                    loop = asyncio.get_running_loop()
+                    return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self.pending -= 1
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # bcrypt releases the GIL, so threads give real parallelism here
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+
+# Global password hashing service
+password_hasher = PasswordHasher(Config.HASH_WORKERS, Config.HASH_MAX_QUEUE)
@@ -11,11 +11,11 @@ from jose import jwt
 
 from models import User
 from .dependencies import get_current_user
+from .hashing import password_hasher
 from .models import Token, UserCreate, RegisterRequest
 from .utils import (
-    verify_password,
     create_access_token,
-    ACCESS_TOKEN_EXPIRE_MINUTES, get_password_hash, SECRET_KEY, ALGORITHM
+    ACCESS_TOKEN_EXPIRE_MINUTES, SECRET_KEY, ALGORITHM
 )
 
 router = APIRouter(prefix="/auth", tags=["Auth"])
@@ -28,7 +28,7 @@ async def authenticate_user(email: str, password: str):
     user = await get_user(email)
     if not user:
         return False
-    if not verify_password(password, user.password):
+    if not await password_hasher.verify(password, user.password):
         return False
     return user
 
@@ -39,7 +39,7 @@ async def login_for_access_token(
 ):
     try:
         user = await User.find_one(User.email == form_data.username)
-        if not user or not verify_password(form_data.password, user.password):
+        if not user or not await password_hasher.verify(form_data.password, user.password):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Incorrect email or password",
@@ -93,7 +93,7 @@ async def register_user(req: RegisterRequest):
 
     # 2) Hash & insert
     user_dict = req.dict()
-    user_dict["password"] = get_password_hash(user_dict["password"])
+    user_dict["password"] = await password_hasher.hash(user_dict["password"])
     new_user = await User(**user_dict).create()
 
     # 3) Issue JWT
@@ -8,4 +8,58 @@ class Config:
     MONGO_URI = os.getenv("MONGO_URI")
     DEBUG = os.getenv("DEBUG", "False").lower() == "true"
     SEED_DATA = os.getenv("SEED_DATA", "False").lower() == "true"
-    ENVIRONMENT = os.getenv("ENVIRONMENT", "development")
\ No newline at end of file
+    ENVIRONMENT = os.getenv("ENVIRONMENT", "development")
+    # drop indexes that are no longer declared on the models at startup
+    SYNC_INDEXES = os.getenv("SYNC_INDEXES", "True").lower() == "true"
+
+    # Resolved principals kept per worker by auth.dependencies.get_current_user
+    PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+    PRINCIPAL_CACHE_TTL = int(os.getenv("PRINCIPAL_CACHE_TTL", "30"))  # seconds
+
+    # bcrypt runs on a bounded pool, see auth.hashing.PasswordHasher
+    HASH_WORKERS = int(os.getenv("HASH_WORKERS", "4"))
+    HASH_MAX_QUEUE = int(os.getenv("HASH_MAX_QUEUE", "32"))
+
+    # Heartbeats are buffered per worker and flushed in bulk, see services.heartbeats
+    HEARTBEAT_FLUSH_SECONDS = float(os.getenv("HEARTBEAT_FLUSH_SECONDS", "5"))
+    HEARTBEAT_OWNER_CACHE_SIZE = int(os.getenv("HEARTBEAT_OWNER_CACHE_SIZE", "50000"))
+
+    # Auto-pause of sessions without heartbeats, see services.session_scheduler
+    SESSION_INACTIVITY_SECONDS = int(os.getenv("SESSION_INACTIVITY_SECONDS", "30"))
+    SCHEDULER_TICK_SECONDS = float(os.getenv("SCHEDULER_TICK_SECONDS", "1"))
+    SCHEDULER_SLOTS = int(os.getenv("SCHEDULER_SLOTS", "128"))
+    SCHEDULER_LEASE_SECONDS = int(os.getenv("SCHEDULER_LEASE_SECONDS", "30"))
+    SCHEDULER_REHYDRATE_SECONDS = int(os.getenv("SCHEDULER_REHYDRATE_SECONDS", "600"))
+
+    # Data migrations run at startup by whichever worker takes this lease
+    MIGRATION_LEASE_SECONDS = int(os.getenv("MIGRATION_LEASE_SECONDS", "600"))
+
+    # Catalog listings may be reused this long before revalidating with If-None-Match
+    CATALOG_MAX_AGE = int(os.getenv("CATALOG_MAX_AGE", "60"))  # seconds
+    # how often each worker checks services.catalog for changes made by another one
+    CATALOG_POLL_SECONDS = float(os.getenv("CATALOG_POLL_SECONDS", "5"))
+
+    # Cursor batch size of the streaming admin user export
+    EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
+
+    # Daily challenge reset and weekly/monthly counter rollover, see services.rollover
+    ROLLOVER_CHUNK_SIZE = int(os.getenv("ROLLOVER_CHUNK_SIZE", "1000"))
+    ROLLOVER_LEASE_SECONDS = int(os.getenv("ROLLOVER_LEASE_SECONDS", "300"))
+    ROLLOVER_POLL_SECONDS = float(os.getenv("ROLLOVER_POLL_SECONDS", "60"))
+
+    # Background settlement of interrupted coin credits, see services.coins
+    COIN_SETTLE_SECONDS = float(os.getenv("COIN_SETTLE_SECONDS", "60"))
+    COIN_SETTLE_LEASE_SECONDS = int(os.getenv("COIN_SETTLE_LEASE_SECONDS", "300"))
+
+    # Per-worker focus-time leaderboards, see services.leaderboards
+    LEADERBOARD_POLL_SECONDS = float(os.getenv("LEADERBOARD_POLL_SECONDS", "5"))
+    LEADERBOARD_SNAPSHOT_SECONDS = float(os.getenv("LEADERBOARD_SNAPSHOT_SECONDS", "300"))
+    LEADERBOARD_LEASE_SECONDS = int(os.getenv("LEADERBOARD_LEASE_SECONDS", "900"))
+    LEADERBOARD_MAX_LIMIT = int(os.getenv("LEADERBOARD_MAX_LIMIT", "100"))
+
+    # Open live channels count as heartbeats at this interval, see routes.StudySessionController
+    LIVE_KEEPALIVE_SECONDS = int(os.getenv("LIVE_KEEPALIVE_SECONDS", "10"))
+    # lifetime of the single-use ticket a live channel is opened with
+    LIVE_TICKET_SECONDS = int(os.getenv("LIVE_TICKET_SECONDS", "30"))
+    # upper bound on the reusable event-stream ticket, which is revoked when the session completes
+    LIVE_STREAM_TICKET_SECONDS = int(os.getenv("LIVE_STREAM_TICKET_SECONDS", str(24 * 60 * 60)))
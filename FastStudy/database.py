@@ -60,21 +60,40 @@ class Database:
             from models.ShopItem import ShopItem
             from models.Milestone import Milestone
             from models.StudySession import StudySession
+            from models.DailyStat import DailyStat
+            from models.CatalogVersion import CatalogVersion
+            from models.UserChallenge import UserChallenge
+            from models.UserMilestone import UserMilestone
+            from models.CoinEntry import CoinEntry
+            from models.LiveTicket import LiveTicket
 
             document_models = [
                 User,
                 Challenge,
                 ShopItem,
                 Milestone,
-                StudySession
+                StudySession,
+                DailyStat,
+                CatalogVersion,
+                UserChallenge,
+                UserMilestone,
+                CoinEntry,
+                LiveTicket
             ]
 
-            # Initialize Beanie with the document models
+            # Initialize Beanie with the document models. This also creates
+            # every index declared in the models' Settings.indexes and, when
+            # SYNC_INDEXES is on, drops the ones that are no longer declared.
             await init_beanie(
                 database=self.database,
-                document_models=document_models
+                document_models=document_models,
+                allow_index_dropping=Config.SYNC_INDEXES
             )
 
+            for model in document_models:
+                indexes = await model.get_motor_collection().index_information()
+                logger.info(f"Indexes on {model.get_collection_name()}: {sorted(indexes)}")
+
             # Verify collections exist
             collection_names = await self.database.list_collection_names()
             logger.info(f"Available collections: {collection_names}")
@@ -0,0 +1,252 @@
+import logging
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+
+def query_shapes() -> list:
+    """
+    Every query shape the routes and background jobs issue, with sample
+    values taken at call time. Shapes marked allow_scan are deliberate full
+    listings, of small collections or by one-off batch passes; their plans
+    are reported but they don't fail the check.
+    """
+    sample_id = ObjectId()
+    now = datetime.utcnow()
+    return [
+        {
+            "name": "auth: principal by email",
+            "collection": "users",
+            "filter": {"email": "someone@example.com"},
+        },
+        {
+            "name": "GET /study-sessions",
+            "collection": "study_sessions",
+            "filter": {"user.$id": sample_id},
+            "sort": [("start_time", -1), ("_id", -1)],
+        },
+        {
+            "name": "GET /study-sessions?cursor&start&end",
+            "collection": "study_sessions",
+            "filter": {
+                "user.$id": sample_id,
+                "start_time": {"$gte": now - timedelta(days=30), "$lt": now},
+                "$or": [
+                    {"start_time": {"$lt": now}},
+                    {"start_time": now, "_id": {"$lt": sample_id}},
+                ],
+            },
+            "sort": [("start_time", -1), ("_id", -1)],
+        },
+        {
+            "name": "study session by id and owner",
+            "collection": "study_sessions",
+            "filter": {"_id": sample_id, "user.$id": sample_id},
+        },
+        {
+            "name": "GET /study-sessions/active (registry miss)",
+            "collection": "study_sessions",
+            "filter": {"_id": sample_id, "end_time": None},
+        },
+        {
+            "name": "session scheduler: hydrate running sessions",
+            "collection": "study_sessions",
+            "filter": {"end_time": None, "is_paused": False},
+            "sort": [("last_heartbeat", 1)],
+        },
+        {
+            "name": "session scheduler: pause expired sessions",
+            "collection": "study_sessions",
+            "filter": {
+                "_id": {"$in": [sample_id]},
+                "is_paused": False,
+                "end_time": None,
+                "last_heartbeat": {"$lt": now - timedelta(seconds=30)},
+            },
+        },
+        {
+            "name": "session scheduler: pause stale sessions",
+            "collection": "study_sessions",
+            "filter": {
+                "is_paused": False,
+                "end_time": None,
+                "last_heartbeat": {"$lt": now - timedelta(seconds=30)},
+            },
+        },
+        {
+            "name": "GET /users/{id}/stats",
+            "collection": "daily_stats",
+            "filter": {"user_id": sample_id},
+            "sort": [("date", -1)],
+        },
+        {
+            "name": "DailyStat.record",
+            "collection": "daily_stats",
+            "filter": {"user_id": sample_id, "date": now},
+        },
+        {
+            "name": "active session registry: hydrate",
+            "collection": "study_sessions",
+            "filter": {"end_time": None},
+            "sort": [("user.$id", 1)],
+        },
+        {
+            "name": "rollover: next chunk boundary",
+            "collection": "users",
+            "filter": {"_id": {"$gt": sample_id}},
+            "sort": [("_id", 1)],
+        },
+        {
+            "name": "rollover: reset daily challenges",
+            "collection": "challenge_progress",
+            "filter": {
+                "user_id": {"$gt": sample_id, "$lte": sample_id},
+                "challenge_id": {"$in": [sample_id]},
+                "last_updated": {"$lt": now},
+            },
+        },
+        {
+            "name": "rollover: roll weekly/monthly focus counters",
+            "collection": "users",
+            "filter": {"_id": {"$gt": sample_id, "$lte": sample_id}, "week_start": {"$not": {"$gte": now}}},
+        },
+        {
+            "name": "/users/me, GET /users/{id}/challenges (and ?fields=challenges)",
+            "collection": "challenge_progress",
+            "filter": {"user_id": {"$in": [sample_id]}},
+        },
+        {
+            "name": "challenge progress upsert / redeem",
+            "collection": "challenge_progress",
+            "filter": {"user_id": sample_id, "challenge_id": sample_id, "is_completed": {"$ne": True}},
+        },
+        {
+            "name": "/users/me, GET /users/{id}/milestones (and ?fields=milestones)",
+            "collection": "milestone_progress",
+            "filter": {"user_id": {"$in": [sample_id]}},
+        },
+        {
+            "name": "milestone tier claim",
+            "collection": "milestone_progress",
+            "filter": {
+                "user_id": sample_id,
+                "milestone_id": sample_id,
+                "progress": {"$gte": 50},
+                "claimed_tiers": {"$ne": "bronze"},
+            },
+        },
+        {
+            "name": "catalog cache: poll versions",
+            "collection": "catalog_versions",
+            "filter": {"_id": {"$in": ["challenges", "milestones", "shop_items"]}},
+        },
+        {
+            "name": "catalog cache: load challenges",
+            "collection": "challenges",
+            "filter": {},
+            "allow_scan": True,
+        },
+        {
+            "name": "catalog cache: load milestones",
+            "collection": "milestones",
+            "filter": {},
+            "allow_scan": True,
+        },
+        {
+            "name": "catalog cache: load shop items",
+            "collection": "shop_items",
+            "filter": {},
+            "allow_scan": True,
+        },
+        {
+            "name": "coin ledger: replayed idempotency key",
+            "collection": "coin_ledger",
+            "filter": {"user_id": sample_id, "idempotency_key": "purchase:sample"},
+        },
+        {
+            "name": "coin ledger: settle pending entries",
+            "collection": "coin_ledger",
+            "filter": {"status": "pending", "created_at": {"$lt": now}},
+        },
+        {
+            "name": "coin ledger: reconcile balances",
+            "collection": "coin_ledger",
+            "filter": {"status": "applied"},
+            "allow_scan": True,
+        },
+        {
+            "name": "leaderboards: poll changed focus counters",
+            "collection": "users",
+            "filter": {"focus_updated_at": {"$gte": now}},
+        },
+        {
+            # only when no snapshot exists yet, once per deployment
+            "name": "leaderboards: build without a snapshot",
+            "collection": "users",
+            "filter": {"total_focus_time": {"$gt": 0}},
+            "allow_scan": True,
+        },
+        {
+            "name": "milestone backfill: users with focus hours",
+            "collection": "users",
+            "filter": {"total_focus_time": {"$gte": 60}},
+            "allow_scan": True,
+        },
+        {
+            "name": "coin settlement: owed challenge rewards",
+            "collection": "challenge_progress",
+            "filter": {"unpaid.at": {"$lt": now}},
+        },
+        {
+            "name": "coin settlement: owed milestone rewards",
+            "collection": "milestone_progress",
+            "filter": {"unpaid.at": {"$lt": now}},
+        },
+        {
+            "name": "GET /users and /users/export (admin)",
+            "collection": "users",
+            "filter": {
+                "_id": {"$gt": sample_id},
+                "role": "user",
+                "is_active": True,
+                "last_login": {"$gte": now - timedelta(days=30), "$lt": now},
+            },
+            "sort": [("_id", 1)],
+        },
+    ]
+
+
+def _plan_stages(plan):
+    """Yield every stage name in an explain plan tree"""
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _plan_stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            yield from _plan_stages(value)
+
+
+async def explain_query_shapes(shapes=None) -> int:
+    """Explain each query shape and return the number of unexpected COLLSCANs"""
+    failures = 0
+    for shape in shapes or query_shapes():
+        cursor = db.database[shape["collection"]].find(shape["filter"])
+        if shape.get("sort"):
+            cursor = cursor.sort(shape["sort"])
+        explained = await cursor.explain()
+
+        stages = list(_plan_stages(explained["queryPlanner"]["winningPlan"]))
+        scanned = "COLLSCAN" in stages
+        if scanned and not shape.get("allow_scan"):
+            failures += 1
+            logger.error(f"❌ {shape['name']}: COLLSCAN on {shape['collection']} ({' > '.join(stages)})")
+        else:
+            logger.info(f"✅ {shape['name']}: {' > '.join(stages)}")
+
+    return failures
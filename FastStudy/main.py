@@ -1,18 +1,30 @@
-import asyncio
 import datetime
 from _pydatetime import timedelta
 from urllib.request import Request
 
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import logging
 import sys
 
-from auth.utils import get_password_hash
+from auth.cache import principal_cache
+from auth.dependencies import require_admin
+from auth.hashing import password_hasher
 from config import Config
 from database import init_db
-from models.User import User, StudyStat
-from models.Challenge import Challenge, ChallengeType, TierName
+from metrics import metrics
+from services.active_sessions import active_sessions
+from services.coins import coin_settler, open_balance
+from services.heartbeats import heartbeat_buffer
+from services.migrations import run_pending_migrations
+from services.session_scheduler import session_scheduler
+from models.User import User, DayTotals
+from models.DailyStat import DailyStat
+from models.CatalogVersion import CatalogVersion
+from services.rollover import rollover_job
+from services.leaderboards import leaderboards
+from services.catalog import CHALLENGES, MILESTONES, SHOP_ITEMS, catalog_cache
+from models.Challenge import Challenge, ChallengeType, ChallengeMetric, TierName
 from models.ShopItem import ShopItem
 from models.Milestone import Milestone
 from models.StudySession import StudySession, Task
@@ -40,6 +52,11 @@ async def __debug():
     print("🐞  __debug HIT")
     return {"debug": True}
 
+# internal counters, auth and cache stats included: admins only
+@app.get("/___metrics", dependencies=[Depends(require_admin)])
+async def __metrics():
+    return {**metrics.snapshot(), "principal_cache": principal_cache.stats()}
+
 from fastapi.responses import JSONResponse
 
 
@@ -52,6 +69,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 @app.middleware("http")
@@ -66,11 +84,25 @@ async def force_cors_credentials(request: Request, call_next):
 # ─── 1) REQUEST/RESPONSE LOGGING ──────────────────────────────────
 from fastapi import Request
 
+# query params that carry credentials and must never reach the logs
+_SECRET_PARAMS = {"token", "ticket"}
+
+
+def _redacted(url) -> str:
+    if not _SECRET_PARAMS.intersection(url.query_params.keys()):
+        return str(url)
+    query = "&".join(
+        f"{key}=***" if key in _SECRET_PARAMS else f"{key}={value}"
+        for key, value in url.query_params.multi_items()
+    )
+    return str(url.replace(query=query))
+
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    print(f"→ {request.method} {request.url}")      # <-- simple print so you definitely see it
+    url = _redacted(request.url)
+    print(f"→ {request.method} {url}")      # <-- simple print so you definitely see it
     response = await call_next(request)
-    print(f"← {response.status_code} {request.url}")  # <-- and print response code
+    print(f"← {response.status_code} {url}")  # <-- and print response code
     return response
 
 # ─── 2) GLOBAL EXCEPTION HANDLER ─────────────────────────────────
@@ -78,7 +110,7 @@ from fastapi.responses import JSONResponse
 
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
-    print(f"💥 Exception on {request.method} {request.url}: {exc!r}")
+    print(f"💥 Exception on {request.method} {_redacted(request.url)}: {exc!r}")
     return JSONResponse(
         status_code=500,
         content={"detail": "Internal server error", "error": str(exc)},
@@ -90,7 +122,8 @@ from routes.UserController import router as user_router
 from routes.ChallengeController import router as challenge_router
 from routes.ItemController import router as item_router
 from routes.MilestoneController import router as milestone_router
-from routes.StudySessionController import router as study_session_router, monitor_sessions
+from routes.StudySessionController import router as study_session_router
+from routes.LeaderboardController import router as leaderboard_router
 from auth.routes import router as auth_router
 
 app.include_router(user_router)
@@ -98,6 +131,7 @@ app.include_router(challenge_router)
 app.include_router(item_router)
 app.include_router(milestone_router)
 app.include_router(study_session_router)
+app.include_router(leaderboard_router)
 app.include_router(auth_router)
 
 
@@ -114,17 +148,20 @@ async def seed_initial_data():
                     description="Accumulate 2 hours of total study time today",
                     coins=30,
                     goal=120,  # minutes
-                    challenge_type=ChallengeType.DAILY
+                    challenge_type=ChallengeType.DAILY,
+                    metric=ChallengeMetric.FOCUS_MINUTES
                 ),
                 Challenge(
                     title="Subject Explorer",
                     description="Study 3 different subjects today",
                     coins=40,
                     goal=3,
-                    challenge_type=ChallengeType.SPECIAL
+                    challenge_type=ChallengeType.SPECIAL,
+                    metric=ChallengeMetric.DISTINCT_SUBJECTS
                 )
             ]
             await Challenge.insert_many(challenges)
+            await CatalogVersion.bump(CHALLENGES)
             logger.info(f"Inserted {len(challenges)} challenges")
 
         # Seed milestones if the collection is empty
@@ -144,6 +181,7 @@ async def seed_initial_data():
                 )
             ]
             await Milestone.insert_many(milestones)
+            await CatalogVersion.bump(MILESTONES)
             logger.info(f"Inserted {len(milestones)} milestones")
 
         # Seed shop items if the collection is empty
@@ -164,15 +202,24 @@ async def seed_initial_data():
                 )
             ]
             await ShopItem.insert_many(shop_items)
+            await CatalogVersion.bump(SHOP_ITEMS)
             logger.info(f"Inserted {len(shop_items)} shop items")
 
         # Seed test user if the User collection is empty
         if await User.find_all().count() == 0:
             logger.info("Seeding test user...")
+            seed_days = {
+                DailyStat.day_of(datetime.utcnow() - timedelta(days=i)): DayTotals(
+                    focus_time=60 + (i * 10),
+                    sessions=2 + i,
+                    distractions_blocked=3 + i
+                )
+                for i in range(7)  # Last 7 days
+            }
             test_user = User(
                 name="Test User",
                 email="test@studyshield.com",
-                password=get_password_hash("testpassword123"),
+                password=await password_hasher.hash("testpassword123"),
                 coins=200,
                 day_streak=5,
                 longest_streak=10,
@@ -180,17 +227,16 @@ async def seed_initial_data():
                 total_focus_time=1250,  # minutes
                 weekly_focus_time=360,
                 monthly_focus_time=890,
-                study_stats=[
-                    StudyStat(
-                        date= datetime.utcnow() - timedelta(days=i),
-                        focus_time=60 + (i * 10),
-                        sessions=2 + i,
-                        distractions_blocked=3 + i
-                    )
-                    for i in range(7)  # Last 7 days
-                ]
+                recent_days={day.date().isoformat(): totals for day, totals in seed_days.items()},
+                streak_start=min(seed_days),
+                last_study_day=max(seed_days)
             )
             await test_user.create()
+            await open_balance(test_user.id, test_user.coins)
+            await DailyStat.insert_many([
+                DailyStat(user_id=test_user.id, date=day, **totals.dict())
+                for day, totals in seed_days.items()
+            ])
             logger.info("Created test user with realistic data")
 
             # Seed study sessions for the test user
@@ -230,6 +276,7 @@ async def startup_event():
     try:
         logger.info("Initializing database connection...")
         await init_db()
+        await run_pending_migrations()
 
         if Config.DEBUG:
             logger.info("Starting data seeding...")
@@ -237,9 +284,38 @@ async def startup_event():
         else:
             logger.info("Skipping data seeding")
 
-        logger.info("Starting session monitor...")
-        asyncio.create_task(monitor_sessions())
+        logger.info("Loading catalogs...")
+        await catalog_cache.start()
+
+        logger.info("Loading active sessions...")
+        await active_sessions.hydrate()
+
+        logger.info("Starting heartbeat buffer...")
+        heartbeat_buffer.start()
+
+        logger.info("Starting session scheduler...")
+        session_scheduler.start()
+
+        logger.info("Starting rollover job...")
+        rollover_job.start()
+
+        logger.info("Starting coin settlement...")
+        coin_settler.start()
+
+        logger.info("Loading leaderboards...")
+        await leaderboards.start()
 
     except Exception as e:
         logger.error(f"Startup failed: {str(e)}")
         raise
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await session_scheduler.stop()
+    await rollover_job.stop()
+    await coin_settler.stop()
+    await leaderboards.stop()
+    await heartbeat_buffer.stop()
+    await catalog_cache.stop()
+    password_hasher.shutdown()
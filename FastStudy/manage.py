@@ -0,0 +1,151 @@
+"""
+Operational commands that run against the configured database.
+
+    python manage.py explain-queries
+    python manage.py migrate-study-stats [--batch-size N]
+    python manage.py backfill-rollups [--batch-size N]
+    python manage.py rollover [--date YYYY-MM-DD]
+    python manage.py migrate-progress [--batch-size N]
+    python manage.py reconcile-coins [--apply]
+    python manage.py backfill-milestones
+"""
+import argparse
+import asyncio
+import logging
+import sys
+from datetime import date, datetime
+
+from database import db, init_db
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s | %(name)s | %(levelname)s | %(message)s",
+    handlers=[logging.StreamHandler(sys.stdout)],
+)
+logger = logging.getLogger("studyshield.manage")
+
+COMMANDS = {}
+
+
+def command(name: str, help: str, *arguments):
+    """Register a coroutine as a subcommand; `arguments` are (flags, kwargs) pairs"""
+    def register(fn):
+        COMMANDS[name] = (fn, help, arguments)
+        return fn
+    return register
+
+
+@command("explain-queries", "Explain every route query shape and fail on any COLLSCAN")
+async def explain_queries(args) -> int:
+    from diagnostics import explain_query_shapes
+    failures = await explain_query_shapes()
+    if failures:
+        logger.error(f"{failures} query shape(s) fell back to a collection scan")
+        return 1
+    logger.info("All query shapes are index-backed")
+    return 0
+
+
+@command(
+    "migrate-study-stats",
+    "Fold embedded User.study_stats arrays into the daily_stats collection",
+    (("--batch-size",), {"type": int, "default": 500}),
+)
+async def migrate_study_stats(args) -> int:
+    from services.migrations import fold_study_stats
+    migrated = await fold_study_stats(args.batch_size)
+    logger.info(f"Migrated study_stats for {migrated} user(s)")
+    return 0
+
+
+@command(
+    "backfill-rollups",
+    "Seed users' streak and rolling-window counters from daily_stats",
+    (("--batch-size",), {"type": int, "default": 500}),
+)
+async def backfill_rollups(args) -> int:
+    from services.migrations import backfill_rollups
+    backfilled = await backfill_rollups(args.batch_size)
+    logger.info(f"Backfilled streak rollups for {backfilled} user(s)")
+    return 0
+
+
+@command(
+    "rollover",
+    "Run or resume the daily challenge reset and focus counter rollover",
+    (("--date",), {"type": date.fromisoformat, "default": None, "help": "UTC day, defaults to today"}),
+)
+async def rollover(args) -> int:
+    from services.rollover import rollover_job
+    if not await rollover_job.lease.acquire():
+        logger.error("Another worker holds the rollover lease")
+        return 1
+    try:
+        job = await rollover_job.run(args.date or datetime.utcnow().date())
+    finally:
+        await rollover_job.lease.release()
+    if job["finished_at"] is None:
+        logger.error(f"Rollover stopped at {job['last_id']}, run it again to resume")
+        return 1
+    logger.info(f"Rolled over {job['processed']} user(s) at {job.get('users_per_second')} users/s")
+    return 0
+
+
+@command(
+    "migrate-progress",
+    "Move embedded User.challenges/milestones into their progress collections",
+    (("--batch-size",), {"type": int, "default": 500}),
+)
+async def migrate_progress(args) -> int:
+    from services.migrations import split_progress
+    migrated = await split_progress(args.batch_size)
+    logger.info(f"Migrated challenge/milestone progress for {migrated} user(s)")
+    return 0
+
+
+@command(
+    "reconcile-coins",
+    "Compare every coin balance with its ledger and report the drift",
+    (("--apply",), {"action": "store_true", "help": "reset drifted balances to their ledger sum"}),
+)
+async def reconcile_coins(args) -> int:
+    from services.coins import reconcile
+    report = await reconcile(apply=args.apply)
+    if report["drifted"] and not report["applied"]:
+        logger.error(f"{report['drifted']} user(s) hold a balance that differs from their ledger")
+        return 1
+    logger.info(f"Reconciled coin balances: {report}")
+    return 0
+
+
+@command("backfill-milestones", "Compute every user's milestone progress from their stored activity")
+async def backfill_milestones(args) -> int:
+    from services.catalog import catalog_cache
+    from services.milestones import backfill_progress
+    await catalog_cache.refresh(force=True)
+    counts = await backfill_progress()
+    logger.info(f"Backfilled milestone progress: {counts}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Study Shield operational commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for name, (_, help, arguments) in COMMANDS.items():
+        subparser = subparsers.add_parser(name, help=help)
+        for flags, kwargs in arguments:
+            subparser.add_argument(*flags, **kwargs)
+    args = parser.parse_args()
+
+    async def run():
+        await init_db()
+        try:
+            return await COMMANDS[args.command][0](args)
+        finally:
+            await db.close()
+
+    sys.exit(asyncio.run(run()))
+
+
+if __name__ == "__main__":
+    main()
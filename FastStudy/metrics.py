@@ -0,0 +1,47 @@
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+class Metrics:
+    """Per-worker counters and timings, exposed on /___metrics"""
+
+    def __init__(self):
+        self.counters = defaultdict(int)
+        self.gauges = {}
+        self.timings = {}
+
+    def incr(self, name: str, amount: int = 1):
+        self.counters[name] += amount
+
+    def gauge(self, name: str, value):
+        self.gauges[name] = value
+
+    def observe(self, name: str, seconds: float):
+        timing = self.timings.setdefault(name, {"count": 0, "total": 0.0, "max": 0.0})
+        timing["count"] += 1
+        timing["total"] += seconds
+        timing["max"] = max(timing["max"], seconds)
+
+    @contextmanager
+    def timer(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def snapshot(self) -> dict:
+        timings = {
+            name: {
+                "count": t["count"],
+                "avg_ms": round(t["total"] / t["count"] * 1000, 3) if t["count"] else 0.0,
+                "max_ms": round(t["max"] * 1000, 3),
+            }
+            for name, t in self.timings.items()
+        }
+        return {"counters": dict(self.counters), "gauges": dict(self.gauges), "timings": timings}
+
+
+# Global metrics instance
+metrics = Metrics()
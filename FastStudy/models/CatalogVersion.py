@@ -0,0 +1,35 @@
+from typing import Dict
+
+from beanie import Document
+from pymongo import ReturnDocument
+
+
+class CatalogVersion(Document):
+    """
+    Change counter for one of the admin-managed catalogs (challenges,
+    milestones, shop_items). Writers bump it, readers use it to validate
+    cached copies and as the ETag of the listing endpoints.
+    """
+    id: str  # catalog name
+    version: int = 0
+
+    class Settings:
+        name = "catalog_versions"
+
+    @classmethod
+    async def bump(cls, name: str) -> int:
+        doc = await cls.get_motor_collection().find_one_and_update(
+            {"_id": name},
+            {"$inc": {"version": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        return doc["version"]
+
+    @classmethod
+    async def current(cls, *names: str) -> Dict[str, int]:
+        """Versions of the named catalogs, 0 for one that was never bumped"""
+        versions = dict.fromkeys(names, 0)
+        async for doc in cls.get_motor_collection().find({"_id": {"$in": list(names)}}):
+            versions[doc["_id"]] = doc["version"]
+        return versions
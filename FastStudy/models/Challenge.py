@@ -2,6 +2,7 @@ from beanie import Document
 from typing import Optional, Dict
 from enum import Enum
 from pydantic import BaseModel
+from pymongo import IndexModel, ASCENDING
 
 
 class ChallengeType(str, Enum):
@@ -10,6 +11,14 @@ class ChallengeType(str, Enum):
     MILESTONE = "milestone"
 
 
+class ChallengeMetric(str, Enum):
+    """What services.challenges counts towards a challenge's goal"""
+    FOCUS_MINUTES = "focus_minutes"
+    SESSIONS = "sessions"
+    DISTRACTIONS_BLOCKED = "distractions_blocked"
+    DISTINCT_SUBJECTS = "distinct_subjects"
+
+
 class TierName(str, Enum):
     BRONZE = "bronze"
     SILVER = "silver"
@@ -25,9 +34,15 @@ class Challenge(Document):
     challenge_type: ChallengeType
     is_limited: bool = False
     expires_in: Optional[int] = None  # in seconds
+    # evaluated server-side from study activity when set; otherwise progress
+    # is posted by the client
+    metric: Optional[ChallengeMetric] = None
 
     class Settings:
         name = "challenges"
+        indexes = [
+            IndexModel([("challenge_type", ASCENDING), ("is_limited", ASCENDING)], name="type_limited"),
+        ]
 
 class ProgressUnit(str, Enum):
     HOURS = "hours"
@@ -0,0 +1,58 @@
+from datetime import datetime
+from enum import Enum
+from typing import Optional
+
+from beanie import Document, PydanticObjectId
+from pydantic import BaseModel, Field
+from pymongo import IndexModel, ASCENDING
+
+
+class CoinReason(str, Enum):
+    OPENING_BALANCE = "opening_balance"
+    ADMIN_GRANT = "admin_grant"
+    CHALLENGE = "challenge"
+    MILESTONE = "milestone"
+    PURCHASE = "purchase"
+
+
+class EntryStatus(str, Enum):
+    PENDING = "pending"  # recorded, balance not yet known to be updated
+    APPLIED = "applied"
+
+
+class OwedCoins(BaseModel):
+    """
+    A reward a progress record has earned but not been paid yet, written
+    in the same update that earns it, so a credit that fails afterwards is
+    paid by services.coins.settle_owed instead of lost
+    """
+    key: str  # the ledger idempotency key it will be posted under
+    coins: int
+    at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class CoinEntry(Document):
+    """One append-only change to a user's coin balance; User.coins is their sum"""
+    user_id: PydanticObjectId
+    amount: int  # negative for spending
+    reason: CoinReason
+    idempotency_key: str
+    status: EntryStatus = EntryStatus.PENDING
+    ref: Optional[str] = None  # what the coins were for, e.g. a challenge or item id
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+    class Settings:
+        name = "coin_ledger"
+        indexes = [
+            IndexModel(
+                [("user_id", ASCENDING), ("idempotency_key", ASCENDING)],
+                name="user_key_unique",
+                unique=True,
+            ),
+            # reconciliation settles leftovers of interrupted posts
+            IndexModel(
+                [("created_at", ASCENDING)],
+                name="pending_created_at",
+                partialFilterExpression={"status": EntryStatus.PENDING.value},
+            ),
+        ]
@@ -0,0 +1,52 @@
+from datetime import datetime, time
+
+from beanie import Document, PydanticObjectId
+from pymongo import IndexModel, ASCENDING, DESCENDING
+
+
+class DailyStat(Document):
+    """One bucket per user per UTC day, replacing the embedded User.study_stats array"""
+    user_id: PydanticObjectId
+    date: datetime  # midnight UTC of the bucket's day
+    focus_time: int = 0  # minutes
+    sessions: int = 0
+    distractions_blocked: int = 0
+
+    class Settings:
+        name = "daily_stats"
+        indexes = [
+            IndexModel(
+                [("user_id", ASCENDING), ("date", DESCENDING)],
+                name="user_day_unique",
+                unique=True,
+            ),
+        ]
+
+    @staticmethod
+    def day_of(moment: datetime) -> datetime:
+        return datetime.combine(moment.date(), time.min)
+
+    @classmethod
+    async def record(
+            cls,
+            user_id: PydanticObjectId,
+            moment: datetime,
+            focus_time: int = 0,
+            sessions: int = 0,
+            distractions_blocked: int = 0
+    ):
+        """
+        Add activity to the user's bucket for that day, creating it if
+        needed; True when this created it, i.e. the user's first activity
+        that day
+        """
+        result = await cls.get_motor_collection().update_one(
+            {"user_id": user_id, "date": cls.day_of(moment)},
+            {"$inc": {
+                "focus_time": focus_time,
+                "sessions": sessions,
+                "distractions_blocked": distractions_blocked,
+            }},
+            upsert=True,
+        )
+        return result.upserted_id is not None
@@ -0,0 +1,68 @@
+import hashlib
+import secrets
+from datetime import datetime, timedelta
+from typing import Optional
+
+from beanie import Document, PydanticObjectId
+from pymongo import IndexModel, ASCENDING
+
+
+class LiveTicket(Document):
+    """
+    Short-lived, single-use pass for opening a study session's live channel.
+    WebSocket and EventSource clients can't set headers, so this is what
+    travels in the URL instead of the bearer token. Only its hash is stored.
+
+    EventSource reconnects on its own to the same URL, so the event stream
+    is opened with a reusable ticket instead, good until the session
+    completes (see revoke) or its expiry, whichever comes first.
+    """
+    id: str  # sha256 of the ticket handed out
+    user_id: PydanticObjectId
+    session_id: PydanticObjectId
+    expires_at: datetime
+    reusable: bool = False
+
+    class Settings:
+        name = "live_tickets"
+        indexes = [
+            # Mongo drops tickets nobody redeemed once they expire
+            IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+            IndexModel([("session_id", ASCENDING)], name="session_id"),
+        ]
+
+    @staticmethod
+    def _digest(ticket: str) -> str:
+        return hashlib.sha256(ticket.encode()).hexdigest()
+
+    @classmethod
+    async def issue(cls, user_id, session_id, ttl: int, reusable: bool = False) -> str:
+        ticket = secrets.token_urlsafe(32)
+        await cls(
+            id=cls._digest(ticket),
+            user_id=user_id,
+            session_id=session_id,
+            expires_at=datetime.utcnow() + timedelta(seconds=ttl),
+            reusable=reusable,
+        ).insert()
+        return ticket
+
+    @classmethod
+    async def redeem(cls, ticket: str, session_id, reusable: bool = False) -> Optional[PydanticObjectId]:
+        """
+        The user a valid ticket of the given kind for this session was issued
+        to. A single-use ticket is used up either way.
+        """
+        collection = cls.get_motor_collection()
+        if reusable:
+            doc = await collection.find_one({"_id": cls._digest(ticket), "reusable": True})
+        else:
+            doc = await collection.find_one_and_delete({"_id": cls._digest(ticket), "reusable": {"$ne": True}})
+        if doc is None or doc["session_id"] != session_id or doc["expires_at"] < datetime.utcnow():
+            return None
+        return doc["user_id"]
+
+    @classmethod
+    async def revoke(cls, session_id):
+        """Drop every ticket of a session that is over"""
+        await cls.get_motor_collection().delete_many({"session_id": session_id})
@@ -1,5 +1,8 @@
+from bisect import bisect_right
+
 from beanie import Document
-from typing import Dict
+from typing import Dict, List, Optional
+from pymongo import IndexModel, ASCENDING
 from models.Challenge import TierName, TierRequirement
 from models.Challenge import ProgressUnit
 
@@ -11,4 +14,41 @@ class Milestone(Document):
     progress_unit: ProgressUnit
 
     class Settings:
-        name = "milestones"
\ No newline at end of file
+        name = "milestones"
+        indexes = [
+            IndexModel([("progress_unit", ASCENDING)], name="progress_unit"),
+        ]
+
+
+class TierLadder:
+    """
+    A milestone's tiers sorted by requirement, compiled once per catalog
+    load, so what a progress value reaches is a bisect instead of a walk
+    over the tiers
+    """
+
+    def __init__(self, milestone: Milestone):
+        ordered = sorted(milestone.tiers.items(), key=lambda item: item[1].value)
+        self.names: List[TierName] = [name for name, _ in ordered]
+        self.values: List[int] = [requirement.value for _, requirement in ordered]
+        self.coins: List[int] = [requirement.coins for _, requirement in ordered]
+
+    def reached(self, progress: int) -> int:
+        """How many tiers, from the bottom, `progress` meets"""
+        return bisect_right(self.values, progress)
+
+    def current(self, progress: int) -> Optional[TierName]:
+        reached = self.reached(progress)
+        return self.names[reached - 1] if reached else None
+
+    def next_goal(self, progress: int) -> Optional[int]:
+        reached = self.reached(progress)
+        return self.values[reached] if reached < len(self.values) else None
+
+    def eligible(self, progress: int, claimed) -> List[TierName]:
+        """Tiers met by `progress` and not claimed yet, lowest first"""
+        claimed = {TierName(name) for name in claimed}
+        return [name for name in self.names[:self.reached(progress)] if name not in claimed]
+
+    def reward(self, tiers) -> int:
+        return sum(self.coins[self.names.index(name)] for name in tiers)
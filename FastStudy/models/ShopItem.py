@@ -8,3 +8,5 @@ class ShopItem(Document):
     image_url: str
     class Settings:
         name = "shop_items"
+        # items are only ever listed in full or fetched by _id
+        indexes = []
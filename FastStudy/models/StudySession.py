@@ -3,6 +3,7 @@ from datetime import datetime
 
 from beanie import Document, Link
 from pydantic import BaseModel, Field
+from pymongo import IndexModel, ASCENDING, DESCENDING
 
 class Task(BaseModel):
     name: str
@@ -30,6 +31,25 @@ class StudySession(Document):
 
     class Settings:
         name = "study_sessions"
+        indexes = [
+            # GET /study-sessions: owner's sessions, newest first, keyset on (start_time, _id)
+            IndexModel(
+                [("user.$id", ASCENDING), ("start_time", DESCENDING), ("_id", DESCENDING)],
+                name="user_start_time_id",
+            ),
+            # the owner's open (not yet completed) session
+            IndexModel(
+                [("user.$id", ASCENDING)],
+                name="user_open_session",
+                partialFilterExpression={"end_time": None},
+            ),
+            # auto-pause: open, running sessions ordered by last heartbeat
+            IndexModel(
+                [("last_heartbeat", ASCENDING)],
+                name="running_last_heartbeat",
+                partialFilterExpression={"end_time": None, "is_paused": False},
+            ),
+        ]
 
 # at bottom, teach Pydantic about User
 from models.User import User
@@ -1,9 +1,12 @@
 from enum import Enum
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 
-from beanie import Document, Link
-from pydantic import BaseModel, Field, EmailStr
+from beanie import Document, Link, after_event, before_event, Replace, Save, SaveChanges, Update, Delete
+from pydantic import BaseModel, Field, EmailStr, PrivateAttr
+from pymongo import IndexModel, ASCENDING, ReturnDocument
+
+from auth.cache import principal_cache
 
 from models.Challenge import Challenge, TierName
 from models.ShopItem import ShopItem
@@ -20,6 +23,8 @@ class ChallengeProgress(BaseModel):
     redeemed: bool = False
     redeemed_at: Optional[datetime] = None
     last_updated: datetime = Field(default_factory=datetime.utcnow)
+    # subjects counted so far by a distinct_subjects challenge
+    subjects: List[str] = []
 
 class MilestoneProgress(BaseModel):
     milestone_id: Link[Milestone]
@@ -34,18 +39,24 @@ class StudyStat(BaseModel):
     sessions: int
     distractions_blocked: int = 0
 
+class DayTotals(BaseModel):
+    focus_time: int = 0
+    sessions: int = 0
+    distractions_blocked: int = 0
+
 class User(Document):
     name: str
     email: EmailStr
     password: str
     coins: int = 0
+    # idempotency keys of the latest coin ledger posts applied to `coins`
+    applied_ops: List[str] = []
     day_streak: int = 0
     longest_streak: int = 0
     streak_multiplier: float = 1
     last_active_date: Optional[datetime] = None
 
-    challenges: List[ChallengeProgress] = []
-    milestones: List[MilestoneProgress] = []
+    # challenge and milestone progress live in models.UserChallenge / UserMilestone
     purchased_items: List[Link[ShopItem]] = []
     blocked_websites: List[str] = []
 
@@ -53,8 +64,17 @@ class User(Document):
     weekly_focus_time: int = 0
     today_focus_time: int = 0
     monthly_focus_time: int = 0
+    # the periods weekly/monthly_focus_time count, see services.streaks.period_starts
+    week_start: Optional[datetime] = None
+    month_start: Optional[datetime] = None
 
-    study_stats: List[StudyStat] = []
+    # compact rollups maintained by services.streaks.record_focus:
+    # the last 31 days of totals keyed by ISO date, plus the current streak's bounds
+    recent_days: Dict[str, DayTotals] = {}
+    streak_start: Optional[datetime] = None
+    last_study_day: Optional[datetime] = None
+    # when the focus counters last changed, see services.leaderboards
+    focus_updated_at: Optional[datetime] = None
 
     #We are going to use this to track the current study session and make it optional
     # forward‐ref string, no import here
@@ -64,14 +84,69 @@ class User(Document):
     role: UserRole = UserRole.USER
     last_login: Optional[datetime] = None
 
+    # bumped on every write, the basis of the /users/me ETag
+    revision: int = 0
+
     class Settings:
         name = "users"
         use_state_management = True
+        indexes = [
+            # every authenticated request resolves the user by email
+            IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+            # leaderboard workers poll for recently changed focus counters
+            IndexModel([("focus_updated_at", ASCENDING)], name="focus_updated_at", sparse=True),
+        ]
+
+    # set on every principal auth.dependencies resolves, cached or not
+    _read_only: bool = PrivateAttr(default=False)
+
+    @before_event(Replace, Save, SaveChanges)
+    def bump_revision(self):
+        if self._read_only:
+            # writing a principal back whole would undo concurrent coin/stat updates
+            raise RuntimeError("Principals are read-only, write through User.apply_update")
+        self.revision += 1
+
+    @after_event(Replace, Save, SaveChanges, Update, Delete)
+    def evict_principal(self):
+        # keep auth.dependencies.get_current_user from serving a stale copy
+        principal_cache.invalidate(self.email, self.id)
+
+    @staticmethod
+    def _with_revision(update):
+        if isinstance(update, list):
+            return [*update, {"$set": {"revision": {"$add": [{"$ifNull": ["$revision", 0]}, 1]}}}]
+        return {**update, "$inc": {**update.get("$inc", {}), "revision": 1}}
+
+    @classmethod
+    async def apply_update(cls, user_id, update, precondition: dict = None, **kwargs):
+        """
+        Raw update_one on a user by _id (and `precondition`, if given), for
+        atomic and pipeline updates that bypass the document's save hooks;
+        bumps the revision and evicts the cached principal
+        """
+        result = await cls.get_motor_collection().update_one(
+            {"_id": user_id, **(precondition or {})}, cls._with_revision(update), **kwargs
+        )
+        principal_cache.invalidate(user_id=user_id)
+        return result
+
+    @classmethod
+    async def apply_update_and_fetch(cls, user_id, update, projection: dict = None, precondition: dict = None):
+        """apply_update returning the raw updated document (or None), projected"""
+        doc = await cls.get_motor_collection().find_one_and_update(
+            {"_id": user_id, **(precondition or {})},
+            cls._with_revision(update),
+            projection=projection,
+            return_document=ReturnDocument.AFTER,
+        )
+        principal_cache.invalidate(user_id=user_id)
+        return doc
 
     @classmethod
     async def create_user(cls, user_data: dict):
-        from auth.utils import get_password_hash
-        user_data["password"] = get_password_hash(user_data["password"])
+        from auth.hashing import password_hasher
+        user_data["password"] = await password_hasher.hash(user_data["password"])
         return await cls(**user_data).create()
 
 # at bottom, teach Pydantic about StudySession
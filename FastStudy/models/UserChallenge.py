@@ -0,0 +1,45 @@
+from datetime import datetime
+from typing import List, Optional
+
+from beanie import Document, PydanticObjectId
+from bson import DBRef
+from pydantic import Field
+from pymongo import IndexModel, ASCENDING
+
+from models.CoinEntry import OwedCoins
+from models.Challenge import Challenge
+from models.User import ChallengeProgress
+
+
+class UserChallenge(Document):
+    """A user's progress on one challenge, replacing the embedded User.challenges array"""
+    user_id: PydanticObjectId
+    challenge_id: PydanticObjectId
+    progress: int = 0
+    is_completed: bool = False
+    redeemed: bool = False
+    redeemed_at: Optional[datetime] = None
+    last_updated: datetime = Field(default_factory=datetime.utcnow)
+    # subjects counted so far by a distinct_subjects challenge
+    subjects: List[str] = []
+    # rewards earned here whose ledger post hasn't finished, see services.coins
+    unpaid: List[OwedCoins] = []
+
+    class Settings:
+        name = "challenge_progress"
+        indexes = [
+            IndexModel(
+                [("user_id", ASCENDING), ("challenge_id", ASCENDING)],
+                name="user_challenge_unique",
+                unique=True,
+            ),
+            # services.coins.settle_owed looks for credits that never finished
+            IndexModel([("unpaid.at", ASCENDING)], name="unpaid_at", sparse=True),
+        ]
+
+    def as_progress(self) -> ChallengeProgress:
+        """The ChallengeProgress shape the API has always returned"""
+        return ChallengeProgress(
+            challenge_id=DBRef(Challenge.get_collection_name(), self.challenge_id),
+            **self.dict(include={"progress", "is_completed", "redeemed", "redeemed_at", "last_updated", "subjects"})
+        )
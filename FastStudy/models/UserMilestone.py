@@ -0,0 +1,41 @@
+from typing import List, Optional
+
+from beanie import Document, PydanticObjectId
+from bson import DBRef
+from pymongo import IndexModel, ASCENDING
+
+from models.CoinEntry import OwedCoins
+from models.Challenge import TierName
+from models.Milestone import Milestone
+from models.User import MilestoneProgress
+
+
+class UserMilestone(Document):
+    """A user's progress on one milestone, replacing the embedded User.milestones array"""
+    user_id: PydanticObjectId
+    milestone_id: PydanticObjectId
+    progress: int = 0
+    current_tier: Optional[TierName] = None
+    next_goal: Optional[int] = None
+    claimed_tiers: List[TierName] = []
+    # rewards earned here whose ledger post hasn't finished, see services.coins
+    unpaid: List[OwedCoins] = []
+
+    class Settings:
+        name = "milestone_progress"
+        indexes = [
+            IndexModel(
+                [("user_id", ASCENDING), ("milestone_id", ASCENDING)],
+                name="user_milestone_unique",
+                unique=True,
+            ),
+            # services.coins.settle_owed looks for credits that never finished
+            IndexModel([("unpaid.at", ASCENDING)], name="unpaid_at", sparse=True),
+        ]
+
+    def as_progress(self) -> MilestoneProgress:
+        """The MilestoneProgress shape the API has always returned"""
+        return MilestoneProgress(
+            milestone_id=DBRef(Milestone.get_collection_name(), self.milestone_id),
+            **self.dict(include={"progress", "current_tier", "next_goal", "claimed_tiers"})
+        )
@@ -1,12 +1,19 @@
 from .User import User, StudyStat
-from .Challenge import Challenge, ChallengeType, TierName
+from .DailyStat import DailyStat
+from .UserChallenge import UserChallenge
+from .UserMilestone import UserMilestone
+from .CatalogVersion import CatalogVersion
+from .CoinEntry import CoinEntry, CoinReason
+from .LiveTicket import LiveTicket
+from .Challenge import Challenge, ChallengeType, ChallengeMetric, TierName
 from .ShopItem import ShopItem
 from .Milestone import Milestone
 from .StudySession import StudySession, Task
 
 __all__ = [
-    'User', 'StudyStat',
-    'Challenge', 'ChallengeType', 'TierName',
+    'User', 'StudyStat', 'DailyStat', 'CatalogVersion',
+    'UserChallenge', 'UserMilestone', 'CoinEntry', 'CoinReason', 'LiveTicket',
+    'Challenge', 'ChallengeType', 'ChallengeMetric', 'TierName',
     'ShopItem',
     'Milestone',
     'StudySession', 'Task'
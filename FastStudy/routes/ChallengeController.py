@@ -1,8 +1,10 @@
 import logging
-from fastapi import APIRouter, HTTPException, Depends
-from models.Challenge import Challenge, ChallengeType
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
+from config import Config
+from models.Challenge import Challenge, ChallengeType, ChallengeMetric
+from services.catalog import CHALLENGES, catalog_cache
+from services.conditional import conditional, make_etag
 from typing import List, Optional
-from beanie import PydanticObjectId
 from auth.dependencies import get_current_user
 from models.User import User
 
@@ -13,16 +15,26 @@ logger = logging.getLogger("ChallengeController")
 # Public endpoints (no auth required)
 @router.get("/", response_model=List[Challenge])
 async def get_challenges(
+        request: Request,
+        response: Response,
         challenge_type: Optional[ChallengeType] = None,
         is_limited: Optional[bool] = None
 ):
+    not_modified = conditional(
+        request, response,
+        make_etag(CHALLENGES, catalog_cache.version(CHALLENGES)),
+        f"public, max-age={Config.CATALOG_MAX_AGE}"
+    )
+    if not_modified:
+        return not_modified
+
     logger.info("Fetching challenges with filters: challenge_type=%s, is_limited=%s", challenge_type, is_limited)
     query = {}
     if challenge_type:
         query["challenge_type"] = challenge_type
     if is_limited is not None:
         query["is_limited"] = is_limited
-    challenges = await Challenge.find(query).to_list()
+    challenges = await catalog_cache.find(CHALLENGES, **query)
     logger.info("Fetched %d challenges", len(challenges))
     return challenges
 
@@ -30,9 +42,7 @@ async def get_challenges(
 @router.get("/daily", response_model=List[Challenge])
 async def get_daily_challenges():
     logger.info("Fetching daily challenges")
-    challenges = await Challenge.find(
-        Challenge.challenge_type == ChallengeType.DAILY
-    ).to_list()
+    challenges = await catalog_cache.find(CHALLENGES, challenge_type=ChallengeType.DAILY)
     logger.info("Fetched %d daily challenges", len(challenges))
     return challenges
 
@@ -40,9 +50,7 @@ async def get_daily_challenges():
 @router.get("/milestones", response_model=List[Challenge])
 async def get_milestone_challenges():
     logger.info("Fetching milestone challenges")
-    challenges = await Challenge.find(
-        Challenge.challenge_type == ChallengeType.MILESTONE
-    ).to_list()
+    challenges = await catalog_cache.find(CHALLENGES, challenge_type=ChallengeType.MILESTONE)
     logger.info("Fetched %d milestone challenges", len(challenges))
     return challenges
 
@@ -50,7 +58,7 @@ async def get_milestone_challenges():
 @router.get("/{challenge_id}", response_model=Challenge)
 async def get_challenge(challenge_id: str):
     logger.info("Fetching challenge with ID: %s", challenge_id)
-    challenge = await Challenge.get(PydanticObjectId(challenge_id))
+    challenge = await catalog_cache.get(CHALLENGES, challenge_id)
     if not challenge:
         logger.warning("Challenge with ID %s not found", challenge_id)
         raise HTTPException(status_code=404, detail="Challenge not found")
@@ -69,6 +77,7 @@ async def create_challenge(
         logger.warning("Unauthorized access attempt by user: %s", current_user.email)
         raise HTTPException(status_code=403, detail="Admin access required")
     await challenge.insert()
+    await catalog_cache.bump(CHALLENGES)
     logger.info("Challenge created successfully: %s", challenge.title)
     return challenge
 
@@ -88,16 +97,19 @@ async def seed_default_daily_challenges(
             description="Complete a 25-minute focused study session",
             coins=10,
             goal=1,
-            challenge_type=ChallengeType.DAILY
+            challenge_type=ChallengeType.DAILY,
+            metric=ChallengeMetric.SESSIONS
         ),
         Challenge(
             title="No Distractions",
             description="Block 3 distracting websites during study time",
             coins=15,
             goal=3,
-            challenge_type=ChallengeType.DAILY
+            challenge_type=ChallengeType.DAILY,
+            metric=ChallengeMetric.DISTRACTIONS_BLOCKED
         ),
     ]
     await Challenge.insert_many(default_dailies)
+    await catalog_cache.bump(CHALLENGES)
     logger.info("Default daily challenges seeded successfully")
     return {"message": "Default daily challenges seeded"}
\ No newline at end of file
@@ -3,13 +3,15 @@ import logging
 
 import beanie
 import pymongo
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
 from pydantic import ValidationError
 from typing import List, Optional
 
+from config import Config
 from models.ShopItem import ShopItem
+from services.catalog import SHOP_ITEMS, catalog_cache
+from services.conditional import conditional, make_etag
 from pydantic import BaseModel, Field
-from beanie import PydanticObjectId
 from auth.dependencies import get_current_user
 from models.User import User
 
@@ -28,9 +30,16 @@ class ShopItemCreate(BaseModel):
 
 
 @router.get("/items", response_model=List[ShopItem])
-async def get_shop_items():
+async def get_shop_items(request: Request, response: Response):
     try:
-        return await ShopItem.find().to_list()
+        not_modified = conditional(
+            request, response,
+            make_etag(SHOP_ITEMS, catalog_cache.version(SHOP_ITEMS)),
+            f"public, max-age={Config.CATALOG_MAX_AGE}"
+        )
+        if not_modified:
+            return not_modified
+        return await catalog_cache.all(SHOP_ITEMS)
     except beanie.exceptions.DocumentNotFound as dnfe:
         logger.error("Database document not found", exc_info=dnfe)
         raise HTTPException(status_code=404, detail="Shop items not found")
@@ -44,7 +53,7 @@ async def get_shop_items():
 
 @router.get("/items/{item_id}", response_model=ShopItem)
 async def get_shop_item(item_id: str):
-    item = await ShopItem.get(PydanticObjectId(item_id))
+    item = await catalog_cache.get(SHOP_ITEMS, item_id)
     if not item:
         logger.warning(f"Shop item not found: {item_id}")
         raise HTTPException(status_code=404, detail="Item not found")
@@ -56,6 +65,7 @@ async def create_shop_item(item_data: ShopItemCreate):
     try:
         item = ShopItem(**item_data.dict(by_alias=True))
         await item.insert()
+        await catalog_cache.bump(SHOP_ITEMS)
         return item
     except ValidationError as ve:
         logger.error("Payload validation failed", exc_info=ve)
@@ -80,4 +90,5 @@ async def seed_default_items(current_user: User = Depends(get_current_user)):
         ),
     ]
     await ShopItem.insert_many(default_items)
+    await catalog_cache.bump(SHOP_ITEMS)
     return {"message": "Default shop items seeded"}
@@ -0,0 +1,60 @@
+# routes/LeaderboardController.py
+from enum import Enum
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, Query
+from pydantic import BaseModel
+
+from auth.dependencies import get_current_user
+from config import Config
+from models.User import User
+from services.leaderboards import ALL_TIME, DAILY, WEEKLY, leaderboards
+
+router = APIRouter(prefix="/leaderboards", tags=["Leaderboards"])
+
+
+class Board(str, Enum):
+    DAILY = DAILY
+    WEEKLY = WEEKLY
+    ALL_TIME = ALL_TIME
+
+
+class LeaderboardEntry(BaseModel):
+    rank: int
+    user_id: str
+    name: str
+    focus_time: int  # minutes
+
+
+class Standing(BaseModel):
+    rank: Optional[int] = None  # None until the user has focus time on the board
+    focus_time: int = 0
+
+
+class LeaderboardOut(BaseModel):
+    board: Board
+    period: str
+    total: int
+    entries: List[LeaderboardEntry]
+    me: Standing
+
+
+@router.get("/{board}", response_model=LeaderboardOut)
+async def get_leaderboard(
+        board: Board,
+        limit: int = Query(10, ge=1, le=Config.LEADERBOARD_MAX_LIMIT),
+        offset: int = Query(0, ge=0),
+        current_user: User = Depends(get_current_user)
+):
+    """A page of the board, highest focus time first, plus the caller's own standing"""
+    standing = leaderboards.standing(board.value, current_user.id)
+    return LeaderboardOut(
+        board=board,
+        period=leaderboards.period(board.value),
+        total=leaderboards.size(board.value),
+        entries=[
+            LeaderboardEntry(rank=rank, user_id=member, name=name, focus_time=score)
+            for rank, member, name, score in leaderboards.top(board.value, limit, offset)
+        ],
+        me=Standing(rank=standing[0], focus_time=standing[1]) if standing else Standing(),
+    )
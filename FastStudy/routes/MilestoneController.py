@@ -1,7 +1,9 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
+from config import Config
 from models.Milestone import Milestone, TierName
+from services.catalog import MILESTONES, catalog_cache
+from services.conditional import conditional, make_etag
 from typing import List
-from beanie import PydanticObjectId
 from auth.dependencies import get_current_user
 from models.User import User
 
@@ -10,14 +12,21 @@ router = APIRouter(prefix="/milestones", tags=["Milestones"])
 
 # Get all milestones - public
 @router.get("/", response_model=List[Milestone])
-async def get_milestones():
-    return await Milestone.find_all().to_list()
+async def get_milestones(request: Request, response: Response):
+    not_modified = conditional(
+        request, response,
+        make_etag(MILESTONES, catalog_cache.version(MILESTONES)),
+        f"public, max-age={Config.CATALOG_MAX_AGE}"
+    )
+    if not_modified:
+        return not_modified
+    return await catalog_cache.all(MILESTONES)
 
 
 # Get single milestone - public
 @router.get("/{milestone_id}", response_model=Milestone)
 async def get_milestone(milestone_id: str):
-    milestone = await Milestone.get(PydanticObjectId(milestone_id))
+    milestone = await catalog_cache.get(MILESTONES, milestone_id)
     if not milestone:
         raise HTTPException(status_code=404, detail="Milestone not found")
     return milestone
@@ -32,6 +41,7 @@ async def create_milestone(
     if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Admin access required")
     await milestone.insert()
+    await catalog_cache.bump(MILESTONES)
     return milestone
 
 
@@ -55,4 +65,5 @@ async def seed_default_milestones(current_user: User = Depends(get_current_user)
         ),
     ]
     await Milestone.insert_many(default_milestones)
+    await catalog_cache.bump(MILESTONES)
     return {"message": "Default milestones seeded"}
\ No newline at end of file
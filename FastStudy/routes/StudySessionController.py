@@ -1,14 +1,36 @@
-from fastapi import APIRouter, HTTPException, Depends
-from pydantic import BaseModel
+import asyncio
+import base64
+import json
+import logging
+from datetime import datetime
+from enum import Enum
+
+from bson import DBRef, ObjectId
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, WebSocket, WebSocketDisconnect, status
+from pydantic import BaseModel, ValidationError
 from typing import List, Optional
 from beanie import PydanticObjectId
+from pymongo import ReturnDocument, DESCENDING
 
 from models.StudySession import StudySession, Task
-from models.User import User, StudyStat
+from models.LiveTicket import LiveTicket
+from models.User import User
+from models.DailyStat import DailyStat
 from auth.dependencies import get_current_user
-from fastapi.responses import JSONResponse
+from config import Config
+from fastapi.responses import JSONResponse, StreamingResponse
+from services.active_sessions import active_sessions, serialize_session
+from services.challenges import StudyEvent, evaluate as evaluate_challenges
+from services.heartbeats import heartbeat_buffer
+from services.leaderboards import SCORE_PROJECTION, leaderboards
+from services.links import link_id
+from services.live_sessions import live_sessions
+from services.milestones import track_progress as track_milestones
+from services.session_scheduler import session_scheduler
+from services.streaks import record_focus
 
 router = APIRouter(prefix="/study-sessions", tags=["Study Sessions"])
+logger = logging.getLogger("studyshield.routes.study_sessions")
 
 
 class CreateSessionRequest(BaseModel):
@@ -21,6 +43,19 @@ class CompleteSessionRequest(BaseModel):
     distractions_blocked: int = 0
     notes: Optional[str] = None
 
+class SessionView(str, Enum):
+    FULL = "full"
+    LITE = "lite"  # no tasks or notes
+
+
+NDJSON = "application/x-ndjson"
+
+_VIEW_PROJECTIONS = {
+    SessionView.FULL: None,
+    SessionView.LITE: {"tasks": 0, "notes": 0},
+}
+
+
 def _parse_oid(session_id: str) -> PydanticObjectId:
     try:
         return PydanticObjectId(session_id)
@@ -28,12 +63,77 @@ def _parse_oid(session_id: str) -> PydanticObjectId:
         raise HTTPException(400, "Invalid session ID")
 
 
-# Get user's study sessions
+def _encode_cursor(doc: dict) -> str:
+    raw = f"{doc['start_time'].isoformat()}|{doc['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_cursor(cursor: str):
+    try:
+        start_time, oid = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(start_time), ObjectId(oid)
+    except Exception:
+        raise HTTPException(400, "Invalid cursor")
+
+
+# Get user's study sessions, newest first. Pages are keyed on
+# (start_time, _id); the cursor for the next page is sent back in the
+# X-Next-Cursor header. Ask for application/x-ndjson to stream every
+# matching session instead of paging.
 @router.get("/", response_model=List[StudySession])
-async def get_study_sessions(current_user: User = Depends(get_current_user)):
-    return await StudySession.find(
-        StudySession.user.id == current_user.id
-    ).sort(-StudySession.start_time).to_list()
+async def get_study_sessions(
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    view: SessionView = SessionView.FULL,
+    current_user: User = Depends(get_current_user)
+):
+    query = {"user.$id": current_user.id}
+    if start or end:
+        query["start_time"] = {}
+        if start:
+            query["start_time"]["$gte"] = start
+        if end:
+            query["start_time"]["$lt"] = end
+    if cursor:
+        after_time, after_id = _decode_cursor(cursor)
+        query["$or"] = [
+            {"start_time": {"$lt": after_time}},
+            {"start_time": after_time, "_id": {"$lt": after_id}},
+        ]
+
+    found = StudySession.get_motor_collection().find(
+        query, _VIEW_PROJECTIONS[view]
+    ).sort([("start_time", DESCENDING), ("_id", DESCENDING)])
+
+    if NDJSON in request.headers.get("accept", ""):
+        async def stream():
+            async for doc in found.batch_size(200):
+                yield json.dumps(serialize_session(doc)) + "\n"
+        return StreamingResponse(stream(), media_type=NDJSON)
+
+    # one extra document tells us whether there's another page
+    docs = await found.limit(limit + 1).to_list(length=limit + 1)
+    headers = {}
+    if len(docs) > limit:
+        docs = docs[:limit]
+        headers["X-Next-Cursor"] = _encode_cursor(docs[-1])
+    return JSONResponse(content=[serialize_session(d) for d in docs], headers=headers)
+
+
+# The user's open session (no end time) from the active session registry.
+# Declared before /{session_id} so that route doesn't shadow it.
+@router.get("/active", response_model=Optional[StudySession])
+@router.get("/last-active-session", response_model=Optional[StudySession])
+async def get_last_active_session(
+    current_user: User = Depends(get_current_user)
+):
+    session = await active_sessions.current(
+        current_user.id, link_id(current_user.current_session)
+    )
+    return JSONResponse(content=session)
 
 
 @router.get("/{session_id}", response_model=StudySession)
@@ -69,12 +169,17 @@ async def create_study_session(
         start_time=datetime.utcnow()
     )
     await session.insert()
+    heartbeat_buffer.remember(session.id, current_user.id)
+    session_scheduler.touch(session.id)
 
     # 2) update users current session
     current_user.current_session = session
 
-    # 3) pin it on the user
-    await current_user.save()
+    # 3) pin it on the user, touching nothing else of the (possibly cached) principal
+    await User.apply_update(
+        current_user.id,
+        {"$set": {"current_session": DBRef(StudySession.get_collection_name(), session.id)}}
+    )
 
     # 4) build a *pure* dict to return
     payload = {
@@ -91,79 +196,171 @@ async def create_study_session(
       "distractions_blocked": session.distractions_blocked,
       "notes": session.notes,
     }
+    active_sessions.put(current_user.id, {
+        **payload,
+        "user": {"id": str(current_user.id), "collection": User.get_collection_name()},
+        "last_heartbeat": session.last_heartbeat.isoformat(),
+    })
 
     return JSONResponse(status_code=201, content=payload)
 
-# Complete study session
-@router.post("/{session_id}/complete")
-async def complete_study_session(
-    session_id: str,
-    req: CompleteSessionRequest,
-    current_user: User = Depends(get_current_user)
-):
-    oid = _parse_oid(session_id)
-    session = await StudySession.find_one(
-        StudySession.id == oid,
-        StudySession.user.id == current_user.id
+async def _transition(oid: PydanticObjectId, user_id, precondition: dict, update: list) -> Optional[dict]:
+    """
+    Apply a session state transition as one conditional find_one_and_update.
+    Returns the updated raw document, or None when the session isn't the
+    user's or isn't in the state the transition starts from.
+    """
+    return await StudySession.get_motor_collection().find_one_and_update(
+        {"_id": oid, "user.$id": user_id, **precondition},
+        update,
+        return_document=ReturnDocument.AFTER,
     )
-    if not session:
-        raise HTTPException(404, "Session not found or not yours")
 
-    session.end_time = datetime.utcnow()
-    session.actual_duration = req.actual_duration
-    session.distractions_blocked = req.distractions_blocked
-    session.notes = req.notes
-
-    remaining = req.actual_duration
-    for t in session.tasks:
-        if t.duration <= remaining:
-            t.completed = True
-            remaining -= t.duration
-        else:
-            break
-
-    await session.save()
-
-    # bump user stats
-    await current_user.update({"$inc": {
-        "total_focus_time": session.actual_duration,
-        "weekly_focus_time": session.actual_duration,
-        "monthly_focus_time": session.actual_duration
-    }})
-    current_user.study_stats.append(StudyStat(
-        date=datetime.utcnow(),
-        focus_time=session.actual_duration,
+
+async def _transition_failed(oid: PydanticObjectId, user_id, conflict: str):
+    # slow path only: tell a missing session apart from one in the wrong state
+    doc = await StudySession.get_motor_collection().find_one(
+        {"_id": oid, "user.$id": user_id}, {"end_time": 1}
+    )
+    if not doc:
+        raise HTTPException(404, "Session not found or not yours")
+    if doc.get("end_time"):
+        raise HTTPException(400, "Session already completed")
+    raise HTTPException(400, conflict)
+
+
+def _complete_tasks(actual_duration: int) -> dict:
+    """Mark tasks completed, in order, for as long as they fit in actual_duration"""
+    return {"$let": {
+        "vars": {"acc": {"$reduce": {
+            "input": "$tasks",
+            "initialValue": {"remaining": actual_duration, "fits": True, "tasks": []},
+            "in": {"$let": {
+                "vars": {"fits": {"$and": [
+                    "$$value.fits",
+                    {"$lte": ["$$this.duration", "$$value.remaining"]}
+                ]}},
+                "in": {
+                    "remaining": {"$cond": [
+                        "$$fits",
+                        {"$subtract": ["$$value.remaining", "$$this.duration"]},
+                        "$$value.remaining"
+                    ]},
+                    "fits": "$$fits",
+                    "tasks": {"$concatArrays": ["$$value.tasks", [{"$mergeObjects": [
+                        "$$this",
+                        {"$cond": ["$$fits", {"completed": True}, {}]}
+                    ]}]]},
+                },
+            }},
+        }}},
+        "in": "$$acc.tasks",
+    }}
+
+
+async def _complete(oid: PydanticObjectId, req: CompleteSessionRequest, current_user: User) -> dict:
+    # only an open session can complete, so focus time is never counted twice
+    session = await _transition(oid, current_user.id, {"end_time": None}, [{"$set": {
+        "end_time": "$$NOW",
+        "actual_duration": {"$literal": req.actual_duration},
+        "distractions_blocked": {"$literal": req.distractions_blocked},
+        "notes": {"$literal": req.notes},
+        "tasks": _complete_tasks(req.actual_duration),
+    }}])
+    if not session:
+        await _transition_failed(oid, current_user.id, "Session already completed")
+
+    heartbeat_buffer.forget(oid)
+    session_scheduler.cancel(oid)
+    active_sessions.remove(current_user.id)
+    live_sessions.publish(oid, "completed")
+    await LiveTicket.revoke(oid)
+
+    # bump user stats, streak and rolling window, and unpin the session in one update
+    scores = await User.apply_update_and_fetch(current_user.id, record_focus(
+        session["end_time"],
+        req.actual_duration,
+        sessions=1,
+        distractions_blocked=req.distractions_blocked,
+        extra={"current_session": None},
+    ), projection=SCORE_PROJECTION)
+    if scores:
+        leaderboards.record(scores)
+    new_day = await DailyStat.record(
+        current_user.id,
+        session["end_time"],
+        focus_time=req.actual_duration,
         sessions=1,
         distractions_blocked=req.distractions_blocked
+    )
+    if scores:
+        await track_milestones(
+            current_user.id, scores.get("total_focus_time", 0), new_day, req.distractions_blocked
+        )
+    await evaluate_challenges(current_user.id, StudyEvent(
+        focus_minutes=req.actual_duration,
+        sessions=1,
+        distractions_blocked=req.distractions_blocked,
+        subjects=[task["name"] for task in session["tasks"] if task.get("completed")],
     ))
-    current_user.current_session = None
-    await current_user.save()
 
     return {"message": "Study session completed successfully"}
 
 
-@router.post("/{session_id}/resume")
-async def resume_session(
+async def _resume(oid: PydanticObjectId, current_user: User) -> dict:
+    # pause accounting happens server-side against the stored paused_at;
+    # resuming also counts as a sign of life for the auto-pause deadline
+    session = await _transition(oid, current_user.id, {"is_paused": True, "end_time": None}, [{"$set": {
+        "total_paused": {"$add": [
+            {"$ifNull": ["$total_paused", 0]},
+            {"$toInt": {"$divide": [
+                {"$subtract": ["$$NOW", {"$ifNull": ["$paused_at", "$$NOW"]}]},
+                1000
+            ]}},
+        ]},
+        "is_paused": False,
+        "paused_at": None,
+        "last_heartbeat": "$$NOW",
+    }}])
+    if not session:
+        await _transition_failed(oid, current_user.id, "Not paused")
+
+    session_scheduler.touch(oid, session["last_heartbeat"])
+    active_sessions.put(current_user.id, serialize_session(session))
+    live_sessions.publish(oid, "resumed", total_paused=session["total_paused"])
+    return {"message": "Resumed"}
+
+
+async def _pause(oid: PydanticObjectId, current_user: User) -> dict:
+    session = await _transition(oid, current_user.id, {"is_paused": False, "end_time": None}, [{"$set": {
+        "is_paused": True,
+        "paused_at": "$$NOW",
+    }}])
+    if not session:
+        await _transition_failed(oid, current_user.id, "Already paused")
+
+    session_scheduler.cancel(oid)
+    active_sessions.put(current_user.id, serialize_session(session))
+    live_sessions.publish(oid, "paused", reason="user", paused_at=session["paused_at"].isoformat())
+    return {"message": "Paused"}
+
+
+# Complete study session
+@router.post("/{session_id}/complete")
+async def complete_study_session(
     session_id: str,
+    req: CompleteSessionRequest,
     current_user: User = Depends(get_current_user)
 ):
-    oid = _parse_oid(session_id)
-    session = await StudySession.find_one(
-        StudySession.id == oid,
-        StudySession.user.id == current_user.id
-    )
-    if not session:
-        raise HTTPException(404, "Session not found or not yours")
+    return await _complete(_parse_oid(session_id), req, current_user)
 
-    if not session.is_paused:
-        raise HTTPException(400, "Not paused")
 
-    paused_time = datetime.utcnow() - session.paused_at
-    session.total_paused += int(paused_time.total_seconds())  # int += int
-    session.is_paused = False
-    session.paused_at = None
-    await session.save()
-    return {"message": "Resumed"}
+@router.post("/{session_id}/resume")
+async def resume_session(
+    session_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    return await _resume(_parse_oid(session_id), current_user)
 
 
 @router.post("/{session_id}/pause")
@@ -171,21 +368,7 @@ async def pause_session(
     session_id: str,
     current_user: User = Depends(get_current_user)
 ):
-    oid = _parse_oid(session_id)
-    session = await StudySession.find_one(
-        StudySession.id == oid,
-        StudySession.user.id == current_user.id
-    )
-    if not session:
-        raise HTTPException(404, "Session not found or not yours")
-
-    if session.is_paused:
-        raise HTTPException(400, "Already paused")
-
-    session.is_paused = True
-    session.paused_at = datetime.utcnow()
-    await session.save()
-    return {"message": "Paused"}
+    return await _pause(_parse_oid(session_id), current_user)
 
 
 @router.post("/{session_id}/heartbeat")
@@ -194,49 +377,152 @@ async def heartbeat(
     current_user: User = Depends(get_current_user)
 ):
     oid = _parse_oid(session_id)
-    session = await StudySession.find_one(
-        StudySession.id == oid,
-        StudySession.user.id == current_user.id
+    # buffered: the write happens in the next bulk flush
+    if not await heartbeat_buffer.record(oid, current_user.id):
+        await _transition_failed(oid, current_user.id, "Session not running")
+    session_scheduler.touch(oid)
+    return {"message": "Heartbeat received"}
+
+
+@router.post("/{session_id}/live/ticket")
+async def issue_live_ticket(
+    session_id: str,
+    reusable: bool = Query(False, description="For /live/events: survives EventSource reconnects"),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    A ticket to open the session's live channel with: single-use and valid
+    for a few seconds for the WebSocket, reusable until the session
+    completes for the event stream
+    """
+    oid = _parse_oid(session_id)
+    owned = await StudySession.get_motor_collection().count_documents(
+        {"_id": oid, "user.$id": current_user.id, "end_time": None}, limit=1
     )
-    if not session:
+    if not owned:
         raise HTTPException(404, "Session not found or not yours")
+    ttl = Config.LIVE_STREAM_TICKET_SECONDS if reusable else Config.LIVE_TICKET_SECONDS
+    ticket = await LiveTicket.issue(current_user.id, oid, ttl, reusable=reusable)
+    return {"ticket": ticket, "expires_in": ttl, "reusable": reusable}
 
-    session.last_heartbeat = datetime.utcnow()
-    await session.save()
-    return {"message": "Heartbeat received"}
 
-import asyncio
-from datetime import datetime, timedelta
+async def _open_live_channel(session_id: str, ticket: str, reusable: bool = False):
+    """
+    Authenticate a live channel. Neither API can set headers, so the client
+    passes a ticket from POST /live/ticket in the query rather than its
+    bearer token, which would end up in access logs.
+    """
+    oid = _parse_oid(session_id)
+    user_id = await LiveTicket.redeem(ticket, oid, reusable=reusable)
+    user = await User.get(user_id) if user_id is not None else None
+    if user is None:
+        raise HTTPException(401, "Invalid or expired live ticket")
+    if not await heartbeat_buffer.record(oid, user.id):
+        raise HTTPException(404, "Session not found or not yours")
+    session_scheduler.touch(oid)
+    return oid, user
 
-# Background task to monitor sessions and auto-pause inactive ones
-async def monitor_sessions():
+
+async def _keep_alive(oid: PydanticObjectId, user_id):
+    # an open channel is the heartbeat: feed the buffer without any client traffic
     while True:
-        cutoff = datetime.utcnow() - timedelta(seconds=30)
+        await asyncio.sleep(Config.LIVE_KEEPALIVE_SECONDS)
+        await heartbeat_buffer.record(oid, user_id)
+        session_scheduler.touch(oid)
 
-        # Only sessions that are active, not paused, and not ended
-        sessions_to_pause = await StudySession.find({
-            "is_paused": False,
-            "end_time": None,
-            "last_heartbeat": {"$lt": cutoff}
-        }).to_list()
 
-        for session in sessions_to_pause:
-            session.is_paused = True
-            session.total_paused = int(session.total_paused or 0)  # safe conversion
-            session.paused_at = datetime.utcnow()
-            await session.save()
-            print(f"[monitor] Paused session {session.id} due to inactivity")
+async def _forward_events(websocket: WebSocket, queue: asyncio.Queue):
+    while True:
+        await websocket.send_json(await queue.get())
 
-        await asyncio.sleep(30)
 
-# Method to find the last session for a user that does not have an end time
-@router.get("/last-active-session", response_model=Optional[StudySession])
-async def get_last_active_session(
-    current_user: User = Depends(get_current_user)
-):
-    session = await StudySession.find_one(
-        StudySession.user.id == current_user.id,
-        StudySession.end_time == None
+# Live session channel: replaces HTTP heartbeats for as long as the socket is
+# open, accepts {"action": "pause" | "resume" | "complete" | "ping", ...}
+# commands and pushes state changes, including auto-pauses.
+@router.websocket("/{session_id}/live")
+async def live_session(websocket: WebSocket, session_id: str, ticket: str = Query(...)):
+    try:
+        oid, user = await _open_live_channel(session_id, ticket)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    queue = live_sessions.subscribe(oid)
+    tasks = [
+        asyncio.create_task(_keep_alive(oid, user.id)),
+        asyncio.create_task(_forward_events(websocket, queue)),
+    ]
+    try:
+        while True:
+            raw = await websocket.receive_text()
+            try:
+                message = json.loads(raw)
+                action = message.get("action")
+            except (ValueError, AttributeError):
+                await websocket.send_json({"ok": False, "action": None, "detail": "Expected a JSON object"})
+                continue
+            try:
+                if action == "pause":
+                    result = await _pause(oid, user)
+                elif action == "resume":
+                    result = await _resume(oid, user)
+                elif action == "complete":
+                    result = await _complete(oid, CompleteSessionRequest(**message), user)
+                elif action == "ping":
+                    result = {"message": "pong"}
+                else:
+                    raise HTTPException(400, f"Unknown action: {action}")
+            except HTTPException as e:
+                await websocket.send_json({"ok": False, "action": action, "detail": e.detail})
+                continue
+            except ValidationError as e:
+                await websocket.send_json({"ok": False, "action": action, "detail": e.errors()})
+                continue
+
+            await websocket.send_json({"ok": True, "action": action, **result})
+            if action == "complete":
+                await websocket.close()
+                break
+    except WebSocketDisconnect:
+        pass
+    finally:
+        for task in tasks:
+            task.cancel()
+        # collects the cancellations, and the error of a forwarder whose send failed
+        await asyncio.gather(*tasks, return_exceptions=True)
+        live_sessions.unsubscribe(oid, queue)
+
+
+# Server-sent events fallback: same liveness and push notices, commands go
+# through the regular POST endpoints. Opened with a reusable ticket, since
+# EventSource reconnects to the same URL after any network blip.
+@router.get("/{session_id}/live/events")
+async def live_session_events(session_id: str, ticket: str = Query(...)):
+    oid, user = await _open_live_channel(session_id, ticket, reusable=True)
+
+    async def events():
+        queue = live_sessions.subscribe(oid)
+        keep_alive = asyncio.create_task(_keep_alive(oid, user.id))
+        try:
+            yield "event: connected\ndata: {}\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=Config.LIVE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+                if event["event"] == "completed":
+                    break
+        finally:
+            keep_alive.cancel()
+            await asyncio.gather(keep_alive, return_exceptions=True)
+            live_sessions.unsubscribe(oid, queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
-    return session if session else None
 
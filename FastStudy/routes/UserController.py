@@ -1,14 +1,37 @@
-from fastapi import APIRouter, HTTPException, Depends
+import csv
+import io
+import json
+from enum import Enum
+
+from uuid import uuid4
+
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pymongo import ASCENDING
+from config import Config
 from auth.dependencies import get_current_user
 from models import StudySession
-from models.User import User, ChallengeProgress, MilestoneProgress, StudyStat, UserRole
-from models.Challenge import Challenge, ChallengeType, TierName
+from models.DailyStat import DailyStat
+from services.active_sessions import active_sessions
+from services.links import link_id
+from services.catalog import CHALLENGES, MILESTONES, SHOP_ITEMS, catalog_cache
+from services.conditional import conditional, make_etag
+from services.leaderboards import SCORE_PROJECTION, leaderboards
+from services.streaks import record_focus, rollup, recent_study_stats, current_streak
+from services import coins as coins_ledger
+from services.challenges import StudyEvent, advance as advance_challenge, challenge_reward, completion_key, evaluate as evaluate_challenges
+from services.shop import checkout
+from services.milestones import claim_all, claim_tier, track_progress as track_milestones
+from models.CoinEntry import CoinReason
+from models.UserChallenge import UserChallenge
+from models.UserMilestone import UserMilestone
+from models.User import User, ChallengeProgress, MilestoneProgress, StudyStat, UserRole, DayTotals
+from models.Challenge import Challenge, TierName
 from models.Milestone import Milestone
-from typing import List, Optional
-from datetime import datetime, timedelta
-from pydantic import BaseModel
+from typing import Dict, List, Optional
+from datetime import datetime
+from pydantic import BaseModel, Field
 from beanie import PydanticObjectId
-import math
 from pydantic import EmailStr
 from beanie import Link
 
@@ -20,7 +43,6 @@ class UserOut(BaseModel):
     _id: str
     name: str
     email: EmailStr
-    password: str  # This stores the hashed password despite the name
     coins: int = 0
     day_streak: int = 0
     longest_streak: int = 0
@@ -45,6 +67,99 @@ class UserOut(BaseModel):
         validate_by_name = True  # was allow_population_by_field_name
         from_attributes = True  # was orm_mode
 
+class UserView(BaseModel):
+    """A user as selected by ?fields=; fields outside the projection stay unset and are omitted"""
+    id: Optional[PydanticObjectId] = Field(None, alias="_id")
+    name: Optional[str] = None
+    email: Optional[EmailStr] = None
+    role: Optional[UserRole] = None
+    is_active: Optional[bool] = None
+    last_login: Optional[datetime] = None
+    coins: Optional[int] = None
+    day_streak: Optional[int] = None
+    longest_streak: Optional[int] = None
+    streak_multiplier: Optional[float] = None
+    last_active_date: Optional[datetime] = None
+    streak_start: Optional[datetime] = None
+    last_study_day: Optional[datetime] = None
+    total_focus_time: Optional[int] = None
+    weekly_focus_time: Optional[int] = None
+    today_focus_time: Optional[int] = None
+    monthly_focus_time: Optional[int] = None
+    recent_days: Optional[Dict[str, DayTotals]] = None
+    challenges: Optional[List[ChallengeProgress]] = None
+    milestones: Optional[List[MilestoneProgress]] = None
+    purchased_items: Optional[List[Link[ShopItem]]] = None
+    blocked_websites: Optional[List[str]] = None
+    current_session: Optional[Link[StudySession]] = None
+
+    class Config:
+        validate_by_name = True
+
+
+# Named groups of user fields a client may ask for with ?fields=; the
+# password hash is never part of any of them
+USER_FIELD_SETS = {
+    "profile": ["name", "email", "role", "is_active", "last_login"],
+    "coins": ["coins"],
+    "streak": ["day_streak", "longest_streak", "streak_multiplier",
+               "last_active_date", "streak_start", "last_study_day"],
+    "focus": ["total_focus_time", "weekly_focus_time", "today_focus_time",
+              "monthly_focus_time", "recent_days"],
+    "challenges": ["challenges"],
+    "milestones": ["milestones"],
+    "items": ["purchased_items"],
+    "blocked": ["blocked_websites"],
+    "session": ["current_session"],
+}
+# the slim view: no heavy arrays, no secrets
+DEFAULT_USER_FIELDS = ("profile", "coins", "streak", "focus")
+# what the admin listing and export show per user unless ?fields= says otherwise
+SUMMARY_USER_FIELDS = ("profile", "coins", "day_streak", "total_focus_time")
+
+FIELDS_QUERY = Query(
+    None,
+    description="Comma-separated field sets or fields: " + ", ".join(USER_FIELD_SETS)
+                + f" (default: {','.join(DEFAULT_USER_FIELDS)})"
+)
+
+
+# ?fields= entries kept in their own collections rather than on the user document
+PROGRESS_FIELDS = {"challenges": UserChallenge, "milestones": UserMilestone}
+
+
+def user_projection(fields: Optional[str], default=DEFAULT_USER_FIELDS):
+    """
+    Turn a ?fields= value into a Mongo projection on users plus the list of
+    progress fields to attach, rejecting anything not whitelisted
+    """
+    requested = [f.strip() for f in fields.split(",") if f.strip()] if fields else default
+    allowed = {f for group in USER_FIELD_SETS.values() for f in group}
+    selected = {}
+    for name in requested:
+        if name in USER_FIELD_SETS:
+            selected.update(dict.fromkeys(USER_FIELD_SETS[name], 1))
+        elif name in allowed:
+            selected[name] = 1
+        else:
+            raise HTTPException(status_code=400, detail=f"Unknown field '{name}'")
+    wanted = [name for name in PROGRESS_FIELDS if selected.pop(name, None)]
+    return {"_id": 1, **selected}, wanted
+
+
+async def attach_progress(docs: list, wanted: list):
+    """Fill the requested progress lists of a batch of user docs, one $in query per kind"""
+    if not docs:
+        return
+    ids = [doc["_id"] for doc in docs]
+    for name in wanted:
+        by_user = {user_id: [] for user_id in ids}
+        async for record in PROGRESS_FIELDS[name].find({"user_id": {"$in": ids}}):
+            by_user[record.user_id].append(record.as_progress())
+        for doc in docs:
+            doc[name] = by_user[doc["_id"]]
+
+
 # Helper functions
 async def get_user_or_404(user_id: str) -> User:
     user = await User.get(PydanticObjectId(user_id))
@@ -58,6 +173,10 @@ class AddCoinsRequest(BaseModel):
     amount: int
 
 
+class CheckoutRequest(BaseModel):
+    item_ids: List[str]
+
+
 class BlockWebsiteRequest(BaseModel):
     website: str
 
@@ -67,101 +186,192 @@ class UpdateFocusTimeRequest(BaseModel):
 
 
 @router.get("/me", response_model=UserOut)
-async def read_current_user(current_user: User = Depends(get_current_user)):
-    now   = datetime.utcnow()
-    today = now.date()
-
-    # build the set of all calendar‐days on which the user has studied
-    studied_days = { stat.date.date() for stat in current_user.study_stats }
-
-    # if the user has never studied, zero everything out
-    if not studied_days:
-        current_user.day_streak         = 0
-        # longest_streak remains whatever they had
-        current_user.streak_multiplier  = 1.0
-        current_user.today_focus_time   = 0
-    else:
-        # walk backwards from today to compute day_streak
-        streak = 0
-        cursor = today
-        while cursor in studied_days:
-            streak  += 1
-            cursor  -= timedelta(days=1)
-
-        current_user.day_streak       = streak
-        current_user.longest_streak   = max(current_user.longest_streak, streak)
-
-        # recalc streak multiplier
-        if   streak >= 30: current_user.streak_multiplier = 3.0
-        elif streak >= 14: current_user.streak_multiplier = 2.0
-        elif streak >=  7: current_user.streak_multiplier = 1.5
-        else:              current_user.streak_multiplier = 1.0
-
-        # sum up today's focus_time if any
-        current_user.today_focus_time = sum(
-            s.focus_time for s in current_user.study_stats
-            if s.date.date() == today
-        )
-
-    # stamp “last seen”
-    current_user.last_active_date = now
-
-    # rolling focus totals
-    week_ago  = now - timedelta(days=7)
-    month_ago = now - timedelta(days=30)
-    current_user.weekly_focus_time  = sum(
-        s.focus_time for s in current_user.study_stats
-        if s.date >= week_ago
-    )
-    current_user.monthly_focus_time = sum(
-        s.focus_time for s in current_user.study_stats
-        if s.date >= month_ago
+async def read_current_user(
+        request: Request,
+        response: Response,
+        current_user: User = Depends(get_current_user)
+):
+    now = datetime.utcnow()
+    # the in‑flight study session, if any, straight from the registry
+    current_session = await active_sessions.current(
+        current_user.id, link_id(current_user.current_session)
     )
 
-    # persist + load links for the front end
-    await current_user.save()
-    # load purchased items
-    await current_user.fetch_link("purchased_items")
-      # load the in‑flight study session, if any
+    # everything the payload is built from: the user's writes, the day the
+    # rolling totals are anchored to, the session's state and the shop catalog
+    not_modified = conditional(
+        request, response,
+        make_etag(
+            current_user.id, current_user.revision, now.date(),
+            current_session and current_session["_id"],
+            current_session and current_session.get("is_paused"),
+            current_session and current_session.get("total_paused"),
+            catalog_cache.version(SHOP_ITEMS)
+        ),
+        "private, no-cache"
+    )
+    if not_modified:
+        return not_modified
 
-    if current_user.current_session:
-        await current_user.fetch_link("current_session")
+    # streaks and rolling totals come from the counters kept by record_focus;
+    # nothing here writes back to the user
+    for field, value in rollup(current_user, now).items():
+        setattr(current_user, field, value)
 
     # build the dict that Pydantic will serialise
     user_dict = current_user.dict(by_alias=True)
-    # overwrite purchased_items with the *actual* documents
+    await attach_progress([user_dict], list(PROGRESS_FIELDS))
+    # the last month of daily totals for the dashboard charts
+    user_dict["study_stats"] = recent_study_stats(current_user)
+    # overwrite purchased_items with the *actual* documents, from the catalog cache
     user_dict["purchased_items"] = [
         item.dict(by_alias=True)
-        for item in current_user.purchased_items
+        for item in await catalog_cache.resolve(SHOP_ITEMS, current_user.purchased_items)
     ]
 
     # overwrite current_session with the *actual* document (or null)
-    if current_user.current_session:
-        # .current_session is now the full StudySession document
-        user_dict["current_session"] = current_user.current_session.dict(by_alias=True)
-    else:
-        user_dict["current_session"] = None
+    user_dict["current_session"] = current_session
 
     return user_dict
 
-@router.get("/", response_model=List[User])
-async def get_users(current_user: User = Depends(get_current_user)):
+class ExportFormat(str, Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+
+def _admin_user_filter(
+        role: Optional[UserRole],
+        is_active: Optional[bool],
+        last_login_from: Optional[datetime],
+        last_login_to: Optional[datetime]
+) -> dict:
+    query = {}
+    if role:
+        query["role"] = role.value
+    if is_active is not None:
+        query["is_active"] = is_active
+    if last_login_from or last_login_to:
+        query["last_login"] = {}
+        if last_login_from:
+            query["last_login"]["$gte"] = last_login_from
+        if last_login_to:
+            query["last_login"]["$lt"] = last_login_to
+    return query
+
+
+def _csv_cell(value):
+    if isinstance(value, (list, dict)):
+        return json.dumps(value)
+    return value
+
+
+# Admin listing in _id order. Pages are keyed on _id; the cursor for the
+# next page is sent back in the X-Next-Cursor header.
+@router.get("/", response_model=List[UserView], response_model_exclude_unset=True)
+async def get_users(
+        response: Response,
+        cursor: Optional[str] = None,
+        limit: int = Query(50, ge=1, le=200),
+        role: Optional[UserRole] = None,
+        is_active: Optional[bool] = None,
+        last_login_from: Optional[datetime] = None,
+        last_login_to: Optional[datetime] = None,
+        fields: Optional[str] = FIELDS_QUERY,
+        current_user: User = Depends(get_current_user)
+):
+    if not current_user.role == UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+    query = _admin_user_filter(role, is_active, last_login_from, last_login_to)
+    if cursor:
+        try:
+            query["_id"] = {"$gt": PydanticObjectId(cursor)}
+        except Exception:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    projection, wanted = user_projection(fields, SUMMARY_USER_FIELDS)
+    # one extra document tells us whether there's another page
+    docs = await User.get_motor_collection().find(
+        query, projection
+    ).sort("_id", ASCENDING).limit(limit + 1).to_list(length=limit + 1)
+    if len(docs) > limit:
+        docs = docs[:limit]
+        response.headers["X-Next-Cursor"] = str(docs[-1]["_id"])
+    await attach_progress(docs, wanted)
+    return [UserView.model_validate(doc) for doc in docs]
+
+
+# Every matching user streamed straight off the cursor, as NDJSON or CSV,
+# so memory stays bounded by the batch size whatever the user count.
+# Declared before /{user_id} so that route doesn't shadow it.
+@router.get("/export")
+async def export_users(
+        format: ExportFormat = ExportFormat.NDJSON,
+        role: Optional[UserRole] = None,
+        is_active: Optional[bool] = None,
+        last_login_from: Optional[datetime] = None,
+        last_login_to: Optional[datetime] = None,
+        fields: Optional[str] = FIELDS_QUERY,
+        current_user: User = Depends(get_current_user)
+):
     if not current_user.role == UserRole.ADMIN:
         raise HTTPException(status_code=403, detail="Admin access required")
-    return await User.find_all().to_list()
+
+    projection, wanted = user_projection(fields, SUMMARY_USER_FIELDS)
+    found = User.get_motor_collection().find(
+        _admin_user_filter(role, is_active, last_login_from, last_login_to), projection
+    ).sort("_id", ASCENDING).batch_size(Config.EXPORT_BATCH_SIZE)
+
+    async def documents():
+        # one cursor batch at a time, so progress is attached per batch
+        while batch := await found.to_list(length=Config.EXPORT_BATCH_SIZE):
+            await attach_progress(batch, wanted)
+            for doc in batch:
+                yield UserView.model_validate(doc).model_dump(mode="json", by_alias=True, exclude_unset=True)
+
+    if format == ExportFormat.NDJSON:
+        async def stream():
+            async for doc in documents():
+                yield json.dumps(doc) + "\n"
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    columns = [*projection, *wanted]
+
+    async def stream():
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+        writer.writeheader()
+        async for doc in documents():
+            writer.writerow({key: _csv_cell(value) for key, value in doc.items()})
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/csv",
+        headers={"Content-Disposition": 'attachment; filename="users.csv"'}
+    )
 
 
-@router.get("/{user_id}", response_model=User)
+@router.get("/{user_id}", response_model=UserView, response_model_exclude_unset=True)
 async def get_user(
         user_id: str,
+        fields: Optional[str] = FIELDS_QUERY,
         current_user: User = Depends(get_current_user)
 ):
     if str(current_user.id) != user_id and not current_user.role == UserRole.ADMIN:
         raise HTTPException(status_code=403, detail="Can only view your own profile")
-    return await get_user_or_404(user_id)
+    projection, wanted = user_projection(fields)
+    doc = await User.get_motor_collection().find_one({"_id": PydanticObjectId(user_id)}, projection)
+    if not doc:
+        raise HTTPException(status_code=404, detail="User not found")
+    await attach_progress([doc], wanted)
+    return UserView.model_validate(doc)
 
 
-@router.post("/", response_model=User, status_code=201)
+@router.post("/", response_model=UserView, response_model_exclude_unset=True, status_code=201)
 async def create_user(
         user: User,
         current_user: User = Depends(get_current_user)
@@ -172,27 +382,48 @@ async def create_user(
     existing_user = await User.find_one(User.email == user.email)
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
+    coins, user.coins = user.coins, 0
     await user.insert()
-    return user
+    if coins:
+        # the starting balance goes through the ledger like any other credit
+        doc = await coins_ledger.post(user.id, coins, CoinReason.OPENING_BALANCE, coins_ledger.OPENING_KEY)
+        user.coins = doc["coins"]
+    # the default field sets, like GET /users/{id}: never the password hash
+    projection, _ = user_projection(None)
+    return UserView.model_validate({
+        field: value for field, value in user.model_dump(by_alias=True).items() if field in projection
+    })
 
 
 # User management endpoints
-@router.post("/{user_id}/add-coins", response_model=User)
+@router.post("/{user_id}/add-coins", response_model=UserView, response_model_exclude_unset=True)
 async def add_coins(
         user_id: str,
         request: AddCoinsRequest,
+        fields: Optional[str] = FIELDS_QUERY,
+        idempotency_key: Optional[str] = Header(None),
         current_user: User = Depends(get_current_user)
 ):
     if not current_user.role == UserRole.ADMIN:
         raise HTTPException(status_code=403, detail="Admin access required")
 
-    user = await get_user_or_404(user_id)
-    user.coins += request.amount
-    await user.save()
-    return user
+    projection, wanted = user_projection(fields)
+    # clients retrying a grant send the same Idempotency-Key to get it applied once
+    doc = await coins_ledger.post(
+        PydanticObjectId(user_id),
+        request.amount,
+        CoinReason.ADMIN_GRANT,
+        f"admin:{idempotency_key or uuid4().hex}",
+        ref=str(current_user.id),
+        guard=True,
+        projection=projection
+    )
+    if "coins" not in projection:
+        doc.pop("coins", None)
+    await attach_progress([doc], wanted)
+    return UserView.model_validate(doc)
 
 
-# Challenge progress endpoints
 @router.get("/{user_id}/challenges", response_model=List[ChallengeProgress])
 async def get_user_challenges(
         user_id: str,
@@ -201,8 +432,8 @@ async def get_user_challenges(
     if str(current_user.id) != user_id and not current_user.role == UserRole.ADMIN:
         raise HTTPException(status_code=403, detail="Can only view your own challenges")
 
-    user = await get_user_or_404(user_id)
-    return user.challenges
+    records = await UserChallenge.find(UserChallenge.user_id == PydanticObjectId(user_id)).to_list()
+    return [record.as_progress() for record in records]
 
 
 @router.post("/{user_id}/challenges/{challenge_id}/progress")
@@ -215,38 +446,20 @@ async def update_challenge_progress(
     if str(current_user.id) != user_id:
         raise HTTPException(status_code=403, detail="Can only update your own challenges")
 
-    user = await get_user_or_404(user_id)
-    challenge = await Challenge.get(PydanticObjectId(challenge_id))
+    challenge = await catalog_cache.get(CHALLENGES, challenge_id)
 
     if not challenge:
         raise HTTPException(status_code=404, detail="Challenge not found")
+    if challenge.metric is not None:
+        raise HTTPException(status_code=400, detail="Progress on this challenge is tracked automatically")
 
-    challenge_progress = next(
-        (cp for cp in user.challenges if str(cp.challenge_id.id) == challenge_id),
-        None
-    )
-
-    if not challenge_progress:
-        challenge_progress = ChallengeProgress(
-            challenge_id=PydanticObjectId(challenge_id),
-            progress=progress,
-            is_completed=progress >= challenge.goal
-        )
-        user.challenges.append(challenge_progress)
-    else:
-        challenge_progress.progress += progress
-        challenge_progress.is_completed = challenge_progress.progress >= challenge.goal
-        challenge_progress.last_updated = datetime.utcnow()
-
-    if challenge_progress.is_completed and challenge_progress.progress == progress:
-        coins_to_add = challenge.coins
-        if challenge.challenge_type == ChallengeType.DAILY:
-            streak_bonus = 1 + min(math.floor(user.day_streak / 7), 2)
-            coins_to_add = math.floor(challenge.coins * streak_bonus)
-        user.coins += coins_to_add
-
-    await user.save()
-    return challenge_progress
+    reward = challenge_reward(challenge, current_streak(current_user, datetime.utcnow()))
+    # a completion is credited inside, through the coin ledger
+    record, completed_now = await advance_challenge(current_user.id, challenge, progress, reward)
+    if not completed_now:
+        # bump the revision anyway, since the progress shows on /users/me
+        await User.apply_update(current_user.id, {})
+    return record.as_progress()
 
 
 # Milestone endpoints
@@ -258,8 +471,25 @@ async def get_user_milestones(
     if str(current_user.id) != user_id and not current_user.role == UserRole.ADMIN:
         raise HTTPException(status_code=403, detail="Can only view your own milestones")
 
-    user = await get_user_or_404(user_id)
-    return user.milestones
+    records = await UserMilestone.find(UserMilestone.user_id == PydanticObjectId(user_id)).to_list()
+    return [record.as_progress() for record in records]
+
+
+@router.post("/{user_id}/milestones/claim-all")
+async def claim_all_milestone_tiers(
+        user_id: str,
+        current_user: User = Depends(get_current_user)
+):
+    if str(current_user.id) != user_id:
+        raise HTTPException(status_code=403, detail="Can only claim your own milestones")
+
+    claimed, coins, balance = await claim_all(current_user.id)
+    return {
+        "message": "Milestone tiers claimed successfully",
+        "claimed": [{"milestone_id": mid, "tiers": tiers} for mid, tiers in claimed.items()],
+        "coins": coins,
+        "new_balance": balance
+    }
 
 
 @router.post("/{user_id}/milestones/{milestone_id}/claim-tier")
@@ -272,48 +502,16 @@ async def claim_milestone_tier(
     if str(current_user.id) != user_id:
         raise HTTPException(status_code=403, detail="Can only claim your own milestones")
 
-    user = await get_user_or_404(user_id)
-    milestone = await Milestone.get(PydanticObjectId(milestone_id))
+    milestone = await catalog_cache.get(MILESTONES, milestone_id)
 
     if not milestone:
         raise HTTPException(status_code=404, detail="Milestone not found")
-
-    milestone_progress = next(
-        (mp for mp in user.milestones if str(mp.milestone_id.id) == milestone_id),
-        None
-    )
-
-    if not milestone_progress:
-        raise HTTPException(status_code=400, detail="Milestone not started by user")
-
-    tier = milestone.tiers.get(tier_name)
-    if not tier:
+    try:
+        tier = TierName(tier_name)
+    except ValueError:
         raise HTTPException(status_code=404, detail="Tier not found")
 
-    if milestone_progress.progress < tier.value:
-        raise HTTPException(status_code=400, detail="Tier requirements not met")
-
-    if tier.claimed:
-        raise HTTPException(status_code=400, detail="Tier already claimed")
-
-    user.coins += tier.coins
-    tier.claimed = True
-    milestone_progress.current_tier = tier_name
-
-    next_tier = None
-    if tier_name == "bronze":
-        next_tier = "silver"
-    elif tier_name == "silver":
-        next_tier = "gold"
-    elif tier_name == "gold":
-        next_tier = "platinum"
-
-    if next_tier and next_tier in milestone.tiers:
-        milestone_progress.next_goal = milestone.tiers[next_tier].value
-    else:
-        milestone_progress.next_goal = None
-
-    await user.save()
+    await claim_tier(current_user.id, milestone, tier)
     return {"message": "Tier reward claimed successfully"}
 
 
@@ -327,21 +525,33 @@ async def purchase_item(
     if str(current_user.id) != user_id:
         raise HTTPException(status_code=403, detail="Can only purchase for yourself")
 
-    user = await get_user_or_404(user_id)
-    item = await ShopItem.get(PydanticObjectId(item_id))
+    item = await catalog_cache.get(SHOP_ITEMS, item_id)
 
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
 
-    if user.coins < item.price:
-        raise HTTPException(status_code=400, detail="Not enough coins")
-
-    user.coins -= item.price
-    user.purchased_items.append(item)
-    await user.save()
+    await checkout(current_user.id, [item.id])
     return {"message": "Item purchased successfully"}
 
 
+@router.post("/{user_id}/shop/checkout")
+async def checkout_cart(
+        user_id: str,
+        request: CheckoutRequest,
+        current_user: User = Depends(get_current_user)
+):
+    if str(current_user.id) != user_id:
+        raise HTTPException(status_code=403, detail="Can only purchase for yourself")
+
+    items, total, balance = await checkout(current_user.id, request.item_ids)
+    return {
+        "message": "Items purchased successfully",
+        "items": [str(item.id) for item in items],
+        "total": total,
+        "new_balance": balance
+    }
+
+
 # Study stats endpoints
 @router.get("/{user_id}/stats", response_model=List[StudyStat])
 async def get_user_stats(
@@ -351,8 +561,9 @@ async def get_user_stats(
     if str(current_user.id) != user_id and not current_user.role == UserRole.ADMIN:
         raise HTTPException(status_code=403, detail="Can only view your own stats")
 
-    user = await get_user_or_404(user_id)
-    return user.study_stats
+    return await DailyStat.find(
+        DailyStat.user_id == PydanticObjectId(user_id)
+    ).sort(-DailyStat.date).to_list()
 
 
 @router.post("/{user_id}/stats/update-focus")
@@ -364,40 +575,25 @@ async def update_focus_time(
     if str(current_user.id) != user_id:
         raise HTTPException(status_code=403, detail="Can only update your own stats")
 
-    user = await get_user_or_404(user_id)
-    user.total_focus_time += request.minutes
-    user.weekly_focus_time += request.minutes
-    user.monthly_focus_time += request.minutes
-
-    today = datetime.utcnow().date()
-    last_active = user.last_active_date.date() if user.last_active_date else None
-
-    if last_active == today:
-        pass
-    elif last_active == today - timedelta(days=1):
-        user.day_streak += 1
-        user.longest_streak = max(user.longest_streak, user.day_streak)
-    else:
-        user.day_streak = 1
-
-    user.last_active_date = datetime.utcnow()
-
-    today_stat = next(
-        (stat for stat in user.study_stats if stat.date.date() == today),
-        None
+    now = datetime.utcnow()
+    scores = await User.apply_update_and_fetch(
+        current_user.id, record_focus(now, request.minutes, sessions=1), projection=SCORE_PROJECTION
+    )
+    if scores:
+        leaderboards.record(scores)
+
+    new_day = await DailyStat.record(
+        current_user.id,
+        now,
+        focus_time=request.minutes,
+        sessions=1
+    )
+    if scores:
+        await track_milestones(current_user.id, scores.get("total_focus_time", 0), new_day)
+    await evaluate_challenges(
+        current_user.id, StudyEvent(focus_minutes=request.minutes, sessions=1)
     )
 
-    if today_stat:
-        today_stat.focus_time += request.minutes
-        today_stat.sessions += 1
-    else:
-        user.study_stats.append(StudyStat(
-            date=datetime.utcnow(),
-            focus_time=request.minutes,
-            sessions=1
-        ))
-
-    await user.save()
     return {"message": "Focus time updated successfully"}
 
 
@@ -423,12 +619,14 @@ async def add_blocked_website(
     if str(current_user.id) != user_id:
         raise HTTPException(status_code=403, detail="Can only modify your own blocked sites")
 
-    user = await get_user_or_404(user_id)
-    if request.website in user.blocked_websites:
+    result = await User.apply_update(
+        PydanticObjectId(user_id),
+        {"$push": {"blocked_websites": request.website}},
+        precondition={"blocked_websites": {"$ne": request.website}}
+    )
+    if not result.matched_count:
+        await get_user_or_404(user_id)
         raise HTTPException(status_code=400, detail="Website already blocked")
-
-    user.blocked_websites.append(request.website)
-    await user.save()
     return {"message": "Website blocked successfully"}
 
 
@@ -441,12 +639,14 @@ async def remove_blocked_website(
     if str(current_user.id) != user_id:
         raise HTTPException(status_code=403, detail="Can only modify your own blocked sites")
 
-    user = await get_user_or_404(user_id)
-    if website not in user.blocked_websites:
+    result = await User.apply_update(
+        PydanticObjectId(user_id),
+        {"$pull": {"blocked_websites": website}},
+        precondition={"blocked_websites": website}
+    )
+    if not result.matched_count:
+        await get_user_or_404(user_id)
         raise HTTPException(status_code=404, detail="Website not in blocked list")
-
-    user.blocked_websites.remove(website)
-    await user.save()
     return {"message": "Website unblocked successfully"}
 
 
@@ -459,28 +659,36 @@ async def redeem_challenge(
     if str(current_user.id) != user_id:
         raise HTTPException(403, "Can only redeem your own challenges")
 
-    # find the ChallengeProgress entry
-    cp = next(
-        (c for c in current_user.challenges if str(c.challenge_id.id) == challenge_id),
-        None
-    )
-    if not cp:
+    chal = await catalog_cache.get(CHALLENGES, challenge_id)
+    if not chal:
         raise HTTPException(404, "No progress found for that challenge")
-    if not cp.is_completed:
-        raise HTTPException(400, "Challenge not yet completed")
-    if cp.redeemed:
-        raise HTTPException(400, "Already redeemed")
 
-    # credit coins
-    chal = await Challenge.get(PydanticObjectId(challenge_id))
-    current_user.coins += chal.coins
-
-    # mark redeemed
-    cp.redeemed = True
-    cp.redeemed_at = datetime.utcnow()
+    # mark redeemed and the reward owed in one go, only if completed and not redeemed yet
+    records = UserChallenge.get_motor_collection()
+    query = {"user_id": current_user.id, "challenge_id": chal.id}
+    now = datetime.utcnow()
+    key = completion_key(chal.id, now)
+    redeemed = await records.find_one_and_update(
+        {**query, "is_completed": True, "redeemed": {"$ne": True}},
+        {
+            "$set": {"redeemed": True, "redeemed_at": now},
+            "$push": {"unpaid": coins_ledger.owe(key, chal.coins)},
+        },
+    )
+    if not redeemed:
+        cp = await records.find_one(query)
+        if not cp:
+            raise HTTPException(404, "No progress found for that challenge")
+        if not cp.get("is_completed"):
+            raise HTTPException(400, "Challenge not yet completed")
+        if not cp.get("unpaid"):
+            raise HTTPException(400, "Already redeemed")
+        # redeemed by an attempt whose credit didn't go through: finish it
+        key = cp["unpaid"][0]["key"]
 
-    await current_user.save()
-    return {"message":"Challenge redeemed","new_balance":current_user.coins}
+    # credit coins
+    _, user = await coins_ledger.pay_owed(UserChallenge, current_user.id, key, CoinReason.CHALLENGE, ref=str(chal.id))
+    return {"message":"Challenge redeemed","new_balance":user["coins"]}
 
 
 @router.post("/{user_id}/milestones/{milestone_id}/redeem/{tier_name}")
@@ -493,38 +701,14 @@ async def redeem_milestone_tier(
     if str(current_user.id) != user_id:
         raise HTTPException(403, "Can only redeem your own milestones")
 
-    mp = next(
-        (m for m in current_user.milestones if str(m.milestone_id.id) == milestone_id),
-        None
-    )
-    if not mp:
+    # static config
+    milestone = await catalog_cache.get(MILESTONES, milestone_id)
+    if not milestone:
         raise HTTPException(404, "Milestone not started")
 
-    # static config
-    milestone = await Milestone.get(PydanticObjectId(milestone_id))
-    tier_req = milestone.tiers[tier_name]
-    if mp.progress < tier_req.value:
-        raise HTTPException(400, "Requirements not met")
-    if tier_name in mp.claimed_tiers:
-        raise HTTPException(400, "Tier already claimed")
-
-    # credit coins and mark claimed
-    current_user.coins += tier_req.coins
-    mp.claimed_tiers.append(tier_name)
-
-    # set next goal if any
-    next_tier = {
-      TierName.BRONZE: TierName.SILVER,
-      TierName.SILVER: TierName.GOLD,
-      TierName.GOLD: TierName.PLATINUM
-    }.get(tier_name)
-    if next_tier and next_tier in milestone.tiers:
-      mp.next_goal = milestone.tiers[next_tier].value
-    else:
-      mp.next_goal = None
-
-    await current_user.save()
+    # credit coins, mark claimed and set the next goal in one go
+    _, balance = await claim_tier(current_user.id, milestone, tier_name)
     return {
       "message": f"{tier_name} tier redeemed",
-      "new_balance": current_user.coins
-    }
\ No newline at end of file
+      "new_balance": balance
+    }
@@ -0,0 +1,117 @@
+# services/active_sessions.py
+import logging
+from datetime import datetime
+
+from bson import ObjectId
+
+from metrics import metrics
+from models.StudySession import StudySession
+
+logger = logging.getLogger("studyshield.active_sessions")
+
+# what transitions on any worker change; checked against Mongo on every hit
+_STATE_FIELDS = {"is_paused": 1, "paused_at": 1, "total_paused": 1}
+
+
+def serialize_session(doc: dict) -> dict:
+    """Raw session document -> the JSON shape the StudySession model produces"""
+    out = {}
+    for key, value in doc.items():
+        if key == "user":
+            value = {"id": str(value.id), "collection": value.collection}
+        elif isinstance(value, ObjectId):
+            value = str(value)
+        elif isinstance(value, datetime):
+            value = value.isoformat()
+        out[key] = value
+    return out
+
+
+class ActiveSessionRegistry:
+    """
+    Per-worker map of user id -> their open study session, kept JSON-ready.
+    Hydrated at startup and updated by create/pause/resume/complete and
+    auto-pause, so the current session is served without a DB read.
+
+    Another worker may have changed a user's session, so callers pass the
+    session id pinned on the user document: when it doesn't match the entry
+    held here, the registry falls back to a single read by _id. When it
+    does, the pause state is still re-read (three fields by _id), since a
+    pause, resume or auto-pause may have happened on another worker.
+    """
+
+    def __init__(self):
+        self._by_user = {}  # str(user_id) -> serialized session
+        self._user_by_session = {}  # str(session_id) -> str(user_id)
+
+    def __len__(self):
+        return len(self._by_user)
+
+    def put(self, user_id, session: dict):
+        user_key = str(user_id)
+        previous = self._by_user.get(user_key)
+        if previous is not None:
+            self._user_by_session.pop(previous["_id"], None)
+        self._by_user[user_key] = session
+        self._user_by_session[session["_id"]] = user_key
+
+    def update(self, session_id, **fields):
+        user_key = self._user_by_session.get(str(session_id))
+        if user_key is not None:
+            self._by_user[user_key] = {**self._by_user[user_key], **fields}
+
+    def remove(self, user_id):
+        session = self._by_user.pop(str(user_id), None)
+        if session is not None:
+            self._user_by_session.pop(session["_id"], None)
+
+    async def current(self, user_id, pinned_session_id):
+        """The user's open session, or None"""
+        if pinned_session_id is None:
+            return None
+
+        collection = StudySession.get_motor_collection()
+        session = self._by_user.get(str(user_id))
+        if session is not None and session["_id"] == str(pinned_session_id):
+            # another worker or the scheduler may have paused/resumed/ended it:
+            # check the entry's pause state with an _id lookup of three fields
+            state = await collection.find_one({"_id": pinned_session_id, "end_time": None}, _STATE_FIELDS)
+            if state is None:
+                self.remove(user_id)
+                return None
+            state = serialize_session(state)
+            if any(session.get(field) != state.get(field) for field in _STATE_FIELDS):
+                metrics.incr("active_sessions.stale")
+                session = {**session, **{field: state.get(field) for field in _STATE_FIELDS}}
+                self.put(user_id, session)
+            else:
+                metrics.incr("active_sessions.hit")
+            return session
+
+        metrics.incr("active_sessions.miss")
+        doc = await collection.find_one(
+            {"_id": pinned_session_id, "end_time": None}
+        )
+        if doc is None:
+            self.remove(user_id)
+            return None
+        session = serialize_session(doc)
+        self.put(user_id, session)
+        return session
+
+    async def hydrate(self):
+        """Load every open session; the newest one wins if a user has several"""
+        # sorted on the owner so the partial open-session index serves it
+        cursor = StudySession.get_motor_collection().find(
+            {"end_time": None}
+        ).sort("user.$id", 1)
+        async for doc in cursor:
+            current = self._by_user.get(str(doc["user"].id))
+            if current is None or current["start_time"] < doc["start_time"].isoformat():
+                self.put(doc["user"].id, serialize_session(doc))
+        metrics.gauge("active_sessions.size", len(self))
+        logger.info(f"Loaded {len(self)} active session(s)")
+
+
+# Global active session registry
+active_sessions = ActiveSessionRegistry()
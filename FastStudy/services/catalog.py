@@ -0,0 +1,124 @@
+# services/catalog.py
+import asyncio
+import logging
+
+from beanie import PydanticObjectId
+
+from config import Config
+from metrics import metrics
+from models.CatalogVersion import CatalogVersion
+from models.Challenge import Challenge
+from models.Milestone import Milestone, TierLadder
+from models.ShopItem import ShopItem
+from services.links import link_id
+
+logger = logging.getLogger("studyshield.catalog")
+
+# the admin-managed catalogs, by the name their CatalogVersion is kept under
+CHALLENGES = "challenges"
+MILESTONES = "milestones"
+SHOP_ITEMS = "shop_items"
+
+
+class CatalogCache:
+    """
+    Per-worker copy of the challenges, milestones and shop items catalogs.
+    Loaded at startup and served from memory; every worker polls the
+    CatalogVersion documents and reloads a catalog when its version moves,
+    and the worker that changes one reloads it right away through bump().
+
+    Documents handed out are shared between requests and must not be mutated.
+    """
+
+    def __init__(self, poll_interval: float):
+        self.poll_interval = poll_interval
+        self._models = {CHALLENGES: Challenge, MILESTONES: Milestone, SHOP_ITEMS: ShopItem}
+        self._docs = {name: {} for name in self._models}  # name -> {_id: document}
+        self._versions = dict.fromkeys(self._models)
+        self._ladders = {}  # milestone _id -> TierLadder, compiled with each milestones load
+        self._lock = asyncio.Lock()
+        self._task = None
+
+    def version(self, name: str):
+        return self._versions[name]
+
+    async def refresh(self, *names: str, force: bool = False) -> int:
+        """Reload the named catalogs (all by default) whose version changed; returns how many were"""
+        names = names or tuple(self._models)
+        async with self._lock:
+            versions = await CatalogVersion.current(*names)
+            reloaded = 0
+            for name, version in versions.items():
+                if not force and self._versions[name] == version:
+                    continue
+                docs = await self._models[name].find_all().to_list()
+                self._docs[name] = {doc.id: doc for doc in docs}
+                if name == MILESTONES:
+                    self._ladders = {doc.id: TierLadder(doc) for doc in docs}
+                self._versions[name] = version
+                reloaded += 1
+                metrics.incr(f"catalog.{name}.reload")
+                logger.info(f"Loaded {len(docs)} {name} at version {version}")
+            return reloaded
+
+    async def bump(self, name: str):
+        """Record a change to a catalog for every worker and reload it here"""
+        await CatalogVersion.bump(name)
+        await self.refresh(name)
+
+    async def _ready(self, name: str) -> dict:
+        if self._versions[name] is None:
+            metrics.incr(f"catalog.{name}.miss")
+            await self.refresh(name)
+        else:
+            metrics.incr(f"catalog.{name}.hit")
+        return self._docs[name]
+
+    async def all(self, name: str) -> list:
+        return list((await self._ready(name)).values())
+
+    async def find(self, name: str, **equals) -> list:
+        """Documents whose attributes equal every keyword given"""
+        return [
+            doc for doc in (await self._ready(name)).values()
+            if all(getattr(doc, field) == value for field, value in equals.items())
+        ]
+
+    async def get(self, name: str, doc_id):
+        try:
+            doc_id = PydanticObjectId(doc_id)
+        except Exception:
+            return None
+        return (await self._ready(name)).get(doc_id)
+
+    async def resolve(self, name: str, links) -> list:
+        """The documents a list of links points at, in order; dangling links are dropped"""
+        docs = await self._ready(name)
+        return [docs[ref] for ref in map(link_id, links) if ref in docs]
+
+    def ladder(self, milestone: Milestone) -> TierLadder:
+        """The compiled tier ladder of a milestone handed out by this cache"""
+        ladder = self._ladders.get(milestone.id)
+        return ladder if ladder is not None else TierLadder(milestone)
+
+    async def start(self):
+        await self.refresh(force=True)
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"❌ Catalog refresh failed, retrying next tick: {str(e)}", exc_info=True)
+
+
+# Global catalog cache instance
+catalog_cache = CatalogCache(Config.CATALOG_POLL_SECONDS)
@@ -0,0 +1,193 @@
+# services/challenges.py
+import math
+from datetime import datetime
+from typing import List
+
+from pydantic import BaseModel
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from metrics import metrics
+from models.CoinEntry import CoinReason
+from models.Challenge import Challenge, ChallengeMetric, ChallengeType
+from models.DailyStat import DailyStat
+from models.User import User
+from models.UserChallenge import UserChallenge
+from services import coins as coins_ledger
+from services.coins import with_owed
+from services.catalog import CHALLENGES, catalog_cache
+from services.streaks import streak_length
+
+# fields a daily challenge record starts each UTC day with
+DAILY_RESET = {
+    "progress": 0,
+    "is_completed": False,
+    "redeemed": False,
+    "redeemed_at": None,
+    "subjects": [],
+}
+
+
+def reset_stale_daily(day_start: datetime) -> dict:
+    """
+    Pipeline stage putting a daily challenge record back to DAILY_RESET
+    when it was last updated before `day_start`, so progress never carries
+    into a day the rollover hasn't reached yet
+    """
+    stale = {"$lt": ["$last_updated", day_start]}
+    return {"$set": {
+        field: {"$cond": [stale, {"$literal": value}, f"${field}"]} for field, value in DAILY_RESET.items()
+    }}
+
+
+class StudyEvent(BaseModel):
+    """A piece of study activity, in the units challenge metrics count"""
+    focus_minutes: int = 0
+    sessions: int = 0
+    distractions_blocked: int = 0
+    subjects: List[str] = []
+
+    def amount(self, metric: ChallengeMetric) -> int:
+        if metric == ChallengeMetric.FOCUS_MINUTES:
+            return self.focus_minutes
+        if metric == ChallengeMetric.SESSIONS:
+            return self.sessions
+        if metric == ChallengeMetric.DISTRACTIONS_BLOCKED:
+            return self.distractions_blocked
+        return len(self.subjects)
+
+
+def challenge_reward(challenge: Challenge, streak: int) -> int:
+    """Coins for completing a challenge; dailies pay a streak bonus of up to 3x"""
+    if challenge.challenge_type == ChallengeType.DAILY:
+        streak_bonus = 1 + min(math.floor(streak / 7), 2)
+        return math.floor(challenge.coins * streak_bonus)
+    return challenge.coins
+
+
+class ChallengeRules:
+    """
+    The server-evaluated challenges (those with a metric) grouped by metric,
+    recompiled whenever the challenges catalog version moves
+    """
+
+    def __init__(self):
+        self.version = object()
+        self._by_metric = {}
+
+    async def matching(self, event: StudyEvent) -> List[Challenge]:
+        version = catalog_cache.version(CHALLENGES)
+        if version != self.version:
+            self._by_metric = {}
+            for challenge in await catalog_cache.all(CHALLENGES):
+                if challenge.metric is not None:
+                    self._by_metric.setdefault(challenge.metric, []).append(challenge)
+            self.version = version
+        return [
+            challenge
+            for metric, challenges in self._by_metric.items() if event.amount(metric) > 0
+            for challenge in challenges
+        ]
+
+
+challenge_rules = ChallengeRules()
+
+
+async def advance(user_id, challenge: Challenge, amount: int, reward: int, subjects: List[str] = ()):
+    """
+    Add progress to one user's record for a challenge in a single targeted
+    upsert; a daily record left from an earlier day is reset first. A
+    record that completes here is credited `reward` on the spot, so it is
+    marked redeemed too: the same upsert records the reward as owed, and
+    it is then paid through the coin ledger (or by
+    services.coins.settle_owed, should that fail). Returns (record,
+    completed_now); an already completed record is returned unchanged.
+    """
+    now = datetime.utcnow()
+    key = completion_key(challenge.id, now)
+    if challenge.metric == ChallengeMetric.DISTINCT_SUBJECTS:
+        counted = [
+            {"$set": {"subjects": {"$setUnion": [{"$ifNull": ["$subjects", []]}, {"$literal": list(subjects)}]}}},
+            {"$set": {"progress": {"$size": "$subjects"}}},
+        ]
+    else:
+        counted = [{"$set": {"progress": {"$add": [{"$ifNull": ["$progress", 0]}, amount]}}}]
+
+    query = {"user_id": user_id, "challenge_id": challenge.id, "is_completed": {"$ne": True}}
+    reset = []
+    if challenge.challenge_type == ChallengeType.DAILY:
+        day_start = DailyStat.day_of(now)
+        # yesterday's completion doesn't block today's progress
+        query = {
+            "user_id": user_id,
+            "challenge_id": challenge.id,
+            "$or": [{"is_completed": {"$ne": True}}, {"last_updated": {"$lt": day_start}}],
+        }
+        reset = [reset_stale_daily(day_start)]
+
+    completed = {"$gte": ["$progress", challenge.goal]}
+    collection = UserChallenge.get_motor_collection()
+    try:
+        doc = await collection.find_one_and_update(
+            # completed records never match, so the upsert collides with them instead
+            query,
+            [
+                *reset,
+                *counted,
+                {"$set": {
+                    "is_completed": completed,
+                    "redeemed": {"$cond": [completed, True, {"$ifNull": ["$redeemed", False]}]},
+                    "redeemed_at": {"$cond": [completed, now, {"$ifNull": ["$redeemed_at", None]}]},
+                    "subjects": {"$ifNull": ["$subjects", []]},
+                    "unpaid": {"$cond": [completed, with_owed(key, reward), {"$ifNull": ["$unpaid", []]}]},
+                    "last_updated": now,
+                }},
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:
+        doc = await collection.find_one({"user_id": user_id, "challenge_id": challenge.id})
+        return UserChallenge.model_validate(doc), False
+    if doc["is_completed"]:
+        await coins_ledger.pay_owed(UserChallenge, user_id, key, CoinReason.CHALLENGE, ref=str(challenge.id))
+    return UserChallenge.model_validate(doc), doc["is_completed"]
+
+
+def completion_key(challenge_id, redeemed_at: datetime) -> str:
+    """Ledger idempotency key of one completion of a challenge"""
+    return f"challenge:{challenge_id}:{redeemed_at.isoformat()}"
+
+
+async def evaluate(user_id, event: StudyEvent) -> int:
+    """
+    Apply a study event to every matching challenge of a user, one upsert
+    per challenge record, each completion paid through the coin ledger.
+    Returns the coins awarded.
+    """
+    challenges = await challenge_rules.matching(event)
+    if not challenges:
+        return 0
+
+    user = await User.get_motor_collection().find_one(
+        {"_id": user_id}, {"streak_start": 1, "last_study_day": 1}
+    )
+    if user is None:
+        return 0
+    streak = streak_length(user.get("streak_start"), user.get("last_study_day"), datetime.utcnow())
+
+    coins = 0
+    for challenge in challenges:
+        reward = challenge_reward(challenge, streak)
+        _, completed_now = await advance(
+            user_id, challenge, event.amount(challenge.metric), reward, event.subjects
+        )
+        if completed_now:
+            coins += reward
+
+    # progress moved after any payment above bumped it, so /users/me must not answer 304
+    await User.apply_update(user_id, {})
+    metrics.incr("challenges.evaluated")
+    if coins:
+        metrics.incr("challenges.coins_awarded", coins)
+    return coins
@@ -0,0 +1,349 @@
+# services/coins.py
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException
+from pymongo.errors import DuplicateKeyError
+
+from config import Config
+from metrics import metrics
+from models.CoinEntry import CoinEntry, CoinReason, EntryStatus, OwedCoins
+from models.User import User
+from models.UserChallenge import UserChallenge
+from models.UserMilestone import UserMilestone
+from services.lease import Lease
+
+logger = logging.getLogger("studyshield.coins")
+
+# idempotency keys remembered on the user, enough to recognise any retry
+APPLIED_OPS_KEPT = 100
+# a pending entry older than this belongs to a post that will not finish
+PENDING_GRACE = timedelta(minutes=5)
+OPENING_KEY = "opening"
+
+
+def _merge_update(base: dict, extra: dict) -> dict:
+    merged = {op: dict(fields) for op, fields in base.items()}
+    for op, fields in (extra or {}).items():
+        merged.setdefault(op, {}).update(fields)
+    return merged
+
+
+async def _mark_applied(entry: dict):
+    """
+    Mark a ledger entry applied, recreating it when a concurrent failure
+    took it out meanwhile, so a balance change never goes without its entry
+    """
+    await CoinEntry.get_motor_collection().update_one(
+        {"user_id": entry["user_id"], "idempotency_key": entry["idempotency_key"]},
+        {
+            "$set": {"status": EntryStatus.APPLIED.value},
+            "$setOnInsert": {
+                field: value for field, value in entry.items()
+                if field not in ("_id", "user_id", "idempotency_key", "status")
+            },
+        },
+        upsert=True,
+    )
+
+
+async def _drop_pending(entry: dict):
+    """
+    Take a pending entry out of the ledger: a conditional delete on its
+    status, then a re-check of applied_ops in case another attempt at the
+    same post reached the balance in between, which puts it back applied
+    """
+    deleted = await CoinEntry.get_motor_collection().delete_one({
+        "user_id": entry["user_id"],
+        "idempotency_key": entry["idempotency_key"],
+        "status": EntryStatus.PENDING.value,
+    })
+    if deleted.deleted_count and await User.get_motor_collection().count_documents(
+            {"_id": entry["user_id"], "applied_ops": entry["idempotency_key"]}, limit=1
+    ):
+        await _mark_applied(entry)
+        metrics.incr("coins.restored")
+
+
+async def post(
+        user_id,
+        amount: int,
+        reason: CoinReason,
+        key: str,
+        ref: str = None,
+        guard: bool = False,
+        extra_update: dict = None,
+        precondition: dict = None,
+        conflict: str = None,
+        projection: dict = None
+) -> dict:
+    """
+    Record a coin change in the ledger and apply it to the balance with a
+    single $inc, guarded by the key not having been applied already and,
+    with `guard`, by the balance covering a debit. `extra_update` rides
+    along in the same update, and `precondition` adds to its filter (a
+    409 with `conflict` when that is what failed). Replaying a key is a
+    no-op. Returns the user document after the change, projected.
+    """
+    ledger = CoinEntry.get_motor_collection()
+    projection = {"coins": 1, **(projection or {})}
+    entry = CoinEntry(user_id=user_id, amount=amount, reason=reason, idempotency_key=key, ref=ref) \
+        .model_dump(by_alias=True, exclude={"id"}, mode="python")
+    try:
+        await ledger.insert_one(dict(entry))
+    except DuplicateKeyError:
+        existing = await ledger.find_one({"user_id": user_id, "idempotency_key": key})
+        if existing["status"] == EntryStatus.APPLIED.value:
+            metrics.incr("coins.replayed")
+            return await User.get_motor_collection().find_one({"_id": user_id}, projection)
+        # pending: an earlier attempt may or may not have reached the balance
+
+    guarded = {"applied_ops": {"$ne": key}, **(precondition or {})}
+    if guard and amount < 0:
+        guarded["coins"] = {"$gte": -amount}
+    doc = await User.apply_update_and_fetch(
+        user_id,
+        _merge_update(
+            {
+                "$inc": {"coins": amount},
+                "$push": {"applied_ops": {"$each": [key], "$slice": -APPLIED_OPS_KEPT}},
+            },
+            extra_update,
+        ),
+        projection=projection,
+        precondition=guarded,
+    )
+
+    if doc is None:
+        users = User.get_motor_collection()
+        # an earlier attempt at the same key may have reached the balance
+        doc = await users.find_one({"_id": user_id, "applied_ops": key}, projection)
+        if doc is None:
+            # never reached the balance: take the entry back out, unless a
+            # concurrent attempt at the same key applies it after all
+            await _drop_pending(entry)
+            if not await users.count_documents({"_id": user_id}, limit=1):
+                raise HTTPException(status_code=404, detail="User not found")
+            if precondition and not await users.count_documents({"_id": user_id, **precondition}, limit=1):
+                raise HTTPException(status_code=409, detail=conflict)
+            metrics.incr("coins.insufficient")
+            raise HTTPException(status_code=400, detail="Not enough coins")
+
+    await _mark_applied(entry)
+    metrics.incr(f"coins.{reason.value}")
+    return doc
+
+
+async def open_balance(user_id, coins: int):
+    """Ledger entry for coins a user already holds when created outside post()"""
+    if coins:
+        entry = CoinEntry(
+            user_id=user_id,
+            amount=coins,
+            reason=CoinReason.OPENING_BALANCE,
+            idempotency_key=OPENING_KEY,
+            status=EntryStatus.APPLIED,
+        )
+        await CoinEntry.get_motor_collection().update_one(
+            {"user_id": user_id, "idempotency_key": OPENING_KEY},
+            {"$setOnInsert": entry.model_dump(by_alias=True, exclude={"id"}, mode="python")},
+            upsert=True,
+        )
+
+
+async def settle_pending() -> int:
+    """
+    Resolve entries left pending by interrupted posts: applied if the key
+    reached the user's applied_ops, dropped if it is confirmed absent.
+    applied_ops only keeps the latest APPLIED_OPS_KEPT keys, so an entry
+    missing from a full list is left for reconcile() to report. Returns
+    how many were resolved.
+    """
+    ledger = CoinEntry.get_motor_collection()
+    users = User.get_motor_collection()
+    settled = 0
+    cursor = ledger.find({
+        "status": EntryStatus.PENDING.value,
+        "created_at": {"$lt": datetime.utcnow() - PENDING_GRACE},
+    })
+    async for entry in cursor:
+        user = await users.find_one({"_id": entry["user_id"]}, {"applied_ops": 1})
+        applied_ops = (user or {}).get("applied_ops", [])
+        if entry["idempotency_key"] in applied_ops:
+            await _mark_applied(entry)
+        elif len(applied_ops) < APPLIED_OPS_KEPT:
+            await _drop_pending(entry)
+        else:
+            metrics.incr("coins.unresolved")
+            logger.warning(
+                f"⚠️ Can't tell whether {entry['idempotency_key']} of {entry['user_id']} was applied, leaving it pending"
+            )
+            continue
+        settled += 1
+    return settled
+
+
+def owe(key: str, coins: int) -> dict:
+    """An OwedCoins entry to add to a progress record's `unpaid` list"""
+    return OwedCoins(key=key, coins=coins).model_dump()
+
+
+def with_owed(key: str, coins: int) -> dict:
+    """Pipeline expression: a progress record's `unpaid` list plus an OwedCoins entry"""
+    return {"$concatArrays": [{"$ifNull": ["$unpaid", []]}, {"$literal": [owe(key, coins)]}]}
+
+
+# the progress collections that owe coins, and what they are paid for
+_OWING = ((UserChallenge, CoinReason.CHALLENGE), (UserMilestone, CoinReason.MILESTONE))
+
+
+async def pay_owed(model, user_id, key: str, reason: CoinReason, ref: str = None):
+    """
+    Post everything the user's `model` progress records owe under `key` as
+    one ledger entry, then clear it from them. Safe to repeat: the ledger
+    key makes a second post a no-op. Returns (coins paid, user document
+    projected to coins).
+    """
+    collection = model.get_motor_collection()
+    query = {"user_id": user_id, "unpaid.key": key}
+    total = 0
+    async for record in collection.find(query, {"unpaid": 1}):
+        total += sum(owed["coins"] for owed in record["unpaid"] if owed["key"] == key)
+    if not total:
+        return 0, await User.get_motor_collection().find_one({"_id": user_id}, {"coins": 1})
+
+    doc = await post(user_id, total, reason, key, ref=ref)
+    await collection.update_many(query, {"$pull": {"unpaid": {"key": key}}})
+    return total, doc
+
+
+async def pay_all_owed(model, user_id, reason: CoinReason) -> int:
+    """Pay whatever the user's `model` records still owe, e.g. before a retry; returns the coins"""
+    keys = await model.get_motor_collection().distinct(
+        "unpaid.key", {"user_id": user_id, "unpaid": {"$ne": []}}
+    )
+    paid = 0
+    for key in keys:
+        coins, _ = await pay_owed(model, user_id, key, reason)
+        paid += coins
+    return paid
+
+
+async def settle_owed() -> int:
+    """Pay rewards whose credit never finished (older than the grace period); returns how many"""
+    cutoff = datetime.utcnow() - PENDING_GRACE
+    settled = 0
+    for model, reason in _OWING:
+        owing = model.get_motor_collection().aggregate([
+            {"$match": {"unpaid.at": {"$lt": cutoff}}},
+            {"$unwind": "$unpaid"},
+            {"$match": {"unpaid.at": {"$lt": cutoff}}},
+            {"$group": {"_id": {"user_id": "$user_id", "key": "$unpaid.key"}}},
+        ])
+        async for group in owing:
+            try:
+                await pay_owed(model, group["_id"]["user_id"], group["_id"]["key"], reason)
+            except HTTPException as e:
+                # e.g. the user was deleted; leave it owed and visible
+                logger.warning(f"⚠️ Could not pay {group['_id']}: {e.detail}")
+                continue
+            settled += 1
+    if settled:
+        metrics.incr("coins.owed_settled", settled)
+    return settled
+
+
+async def reconcile(apply: bool = False) -> dict:
+    """
+    Recompute every balance from the applied ledger entries in one
+    aggregation. Reports how many users drift from their ledger; with
+    `apply`, $merges the ledger sums into User.coins. Best run while
+    coins are quiet, since a post landing mid-run is overwritten.
+    """
+    started = time.perf_counter()
+    settled = await settle_pending()
+    settled += await settle_owed()
+    ledger = CoinEntry.get_motor_collection()
+    sums = [
+        {"$match": {"status": EntryStatus.APPLIED.value}},
+        {"$group": {"_id": "$user_id", "coins": {"$sum": "$amount"}}},
+    ]
+    drifted = await ledger.aggregate([
+        *sums,
+        {"$lookup": {
+            "from": User.get_collection_name(),
+            "localField": "_id",
+            "foreignField": "_id",
+            "as": "user",
+            "pipeline": [{"$project": {"coins": 1}}],
+        }},
+        {"$match": {"$expr": {"$ne": ["$coins", {"$first": "$user.coins"}]}}},
+        {"$count": "users"},
+    ]).to_list(length=1)
+    drifted = drifted[0]["users"] if drifted else 0
+
+    if apply and drifted:
+        await ledger.aggregate([
+            *sums,
+            {"$merge": {
+                "into": User.get_collection_name(),
+                "on": "_id",
+                "whenMatched": [{"$set": {
+                    "coins": "$$new.coins",
+                    "revision": {"$add": [{"$ifNull": ["$revision", 0]}, 1]},
+                }}],
+                "whenNotMatched": "discard",
+            }},
+        ]).to_list(length=None)
+
+    metrics.observe("coins.reconcile", time.perf_counter() - started)
+    logger.info(f"Coin reconciliation: {drifted} drifted user(s), {settled} pending entry(ies) settled")
+    return {"drifted": drifted, "settled": settled, "applied": apply and drifted > 0}
+
+
+class CoinSettler:
+    """
+    Finishes interrupted coin credits in the background, on whichever
+    worker holds the lease: pending ledger entries first, then rewards
+    progress records still owe.
+    """
+
+    def __init__(self, poll_interval: float, lease: Lease):
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self._task = None
+
+    async def run_due(self):
+        if not await self.lease.acquire():
+            return
+        pending = await settle_pending()
+        owed = await settle_owed()
+        if pending or owed:
+            logger.info(f"✅ Settled {pending} pending ledger entry(ies) and {owed} owed reward(s)")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.lease.release()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.run_due()
+            except Exception as e:
+                logger.error(f"❌ Coin settlement failed, retrying next tick: {str(e)}", exc_info=True)
+
+
+# Global coin settler instance
+coin_settler = CoinSettler(
+    poll_interval=Config.COIN_SETTLE_SECONDS,
+    lease=Lease("coins", ttl=Config.COIN_SETTLE_LEASE_SECONDS),
+)
@@ -0,0 +1,34 @@
+# services/conditional.py
+import hashlib
+
+from fastapi import Request, Response
+
+
+def make_etag(*parts) -> str:
+    """Weak ETag over the given version parts; the body itself is never hashed"""
+    digest = hashlib.sha1("|".join(map(str, parts)).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def is_fresh(request: Request, etag: str) -> bool:
+    """True when the client's If-None-Match already names this ETag"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # weak comparison, as RFC 9110 requires for If-None-Match
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag.removeprefix("W/") in candidates
+
+
+def conditional(request: Request, response: Response, etag: str, cache_control: str):
+    """
+    Stamp ETag and Cache-Control on the response; returns a bodiless 304 to
+    send instead when the client's copy is current, else None
+    """
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if is_fresh(request, etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
@@ -0,0 +1,114 @@
+# services/heartbeats.py
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime
+
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+from config import Config
+from metrics import metrics
+from models.StudySession import StudySession
+
+logger = logging.getLogger("studyshield.heartbeats")
+
+
+class HeartbeatBuffer:
+    """
+    Keeps only the latest heartbeat per session in memory and writes all of
+    them every `flush_interval` seconds as a single unordered bulk_write.
+    Ownership is checked against a bounded session -> user map of open
+    sessions, so a warm heartbeat costs no DB round trip at all. Sessions
+    are dropped from it when they complete here, or at the next flush when
+    they completed on another worker.
+    """
+
+    def __init__(self, flush_interval: float, owner_cache_size: int):
+        self.flush_interval = flush_interval
+        self.owner_cache_size = owner_cache_size
+        self._pending = {}  # session_id -> latest heartbeat
+        self._owners = OrderedDict()  # session_id -> user_id
+        self._task = None
+
+    def remember(self, session_id, user_id):
+        self._owners[session_id] = user_id
+        self._owners.move_to_end(session_id)
+        while len(self._owners) > self.owner_cache_size:
+            self._owners.popitem(last=False)
+
+    def forget(self, session_id):
+        self._owners.pop(session_id, None)
+        self._pending.pop(session_id, None)
+
+    async def record(self, session_id, user_id) -> bool:
+        """Buffer a heartbeat; False when the session doesn't exist, is over or isn't the user's"""
+        owner = self._owners.get(session_id)
+        if owner is None:
+            doc = await StudySession.get_motor_collection().find_one(
+                {"_id": session_id, "end_time": None}, {"user": 1}
+            )
+            if doc is None:
+                return False
+            owner = doc["user"].id
+            metrics.incr("heartbeats.owner_lookup")
+        self.remember(session_id, owner)
+
+        if owner != user_id:
+            return False
+        self._pending[session_id] = datetime.utcnow()
+        metrics.incr("heartbeats.received")
+        return True
+
+    async def flush(self) -> int:
+        if not self._pending:
+            return 0
+        pending, self._pending = self._pending, {}
+
+        # $max rather than a plain $set so a slower worker can't move the
+        # timestamp backwards; completed sessions are left alone
+        ops = [
+            UpdateOne({"_id": session_id, "end_time": None}, {"$max": {"last_heartbeat": beat}})
+            for session_id, beat in pending.items()
+        ]
+        sessions = StudySession.get_motor_collection()
+        try:
+            with metrics.timer("heartbeats.flush"):
+                result = await sessions.bulk_write(ops, ordered=False)
+            if result.matched_count < len(ops):
+                # completed on another worker: stop accepting their heartbeats here
+                async for doc in sessions.find(
+                    {"_id": {"$in": list(pending)}, "end_time": {"$ne": None}}, {"_id": 1}
+                ):
+                    self.forget(doc["_id"])
+                    metrics.incr("heartbeats.ended")
+        except PyMongoError as e:
+            logger.error(f"❌ Heartbeat flush failed, retrying next tick: {str(e)}")
+            for session_id, beat in pending.items():
+                self._pending.setdefault(session_id, beat)
+            return 0
+
+        metrics.incr("heartbeats.flushed", len(ops))
+        return len(ops)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"❌ Unexpected heartbeat flush error: {str(e)}", exc_info=True)
+
+
+# Global heartbeat buffer instance
+heartbeat_buffer = HeartbeatBuffer(Config.HEARTBEAT_FLUSH_SECONDS, Config.HEARTBEAT_OWNER_CACHE_SIZE)
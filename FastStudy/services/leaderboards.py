@@ -0,0 +1,333 @@
+# services/leaderboards.py
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime, timedelta
+
+from config import Config
+from database import db
+from metrics import metrics
+from models.User import User
+from services.lease import Lease
+
+logger = logging.getLogger("studyshield.leaderboards")
+
+DAILY = "daily"
+WEEKLY = "weekly"
+ALL_TIME = "all-time"
+BOARDS = (DAILY, WEEKLY, ALL_TIME)
+
+# the user fields the boards are computed from, for updates that feed record()
+SCORE_PROJECTION = {"name": 1, "total_focus_time": 1, "recent_days": 1, "focus_updated_at": 1}
+# re-read this far behind the poll cursor so writes that commit out of order aren't missed
+_POLL_OVERLAP = timedelta(seconds=2)
+
+
+class _Node:
+    __slots__ = ("key", "next", "width")
+
+    def __init__(self, key, level: int, width: int):
+        self.key = key
+        self.next = [None] * level
+        # how many level-0 steps each forward pointer skips
+        self.width = [width] * level
+
+
+class RankedScores:
+    """
+    Indexable skip list of members ordered by score, highest first, ties by
+    member. Setting a score, a member's rank and the entry at a rank are all
+    O(log n) expected; a page of k entries is O(log n + k).
+    """
+
+    MAX_LEVEL = 32
+    P = 0.25
+
+    def __init__(self):
+        self._head = _Node(None, self.MAX_LEVEL, 0)
+        self._level = 1
+        self._scores = {}  # member -> score
+
+    def __len__(self):
+        return len(self._scores)
+
+    def score(self, member):
+        return self._scores.get(member)
+
+    def set(self, member, score: int):
+        old = self._scores.get(member)
+        if old == score:
+            return
+        if old is not None:
+            self._remove((-old, member))
+        self._insert((-score, member))
+        self._scores[member] = score
+
+    def discard(self, member):
+        old = self._scores.pop(member, None)
+        if old is not None:
+            self._remove((-old, member))
+
+    def rank(self, member):
+        """1-based position of a member, None when it has no score"""
+        score = self._scores.get(member)
+        if score is None:
+            return None
+        key, rank, node = (-score, member), 0, self._head
+        for i in reversed(range(self._level)):
+            while node.next[i] is not None and node.next[i].key <= key:
+                rank += node.width[i]
+                node = node.next[i]
+        return rank
+
+    def page(self, offset: int, limit: int) -> list:
+        """(member, score) pairs from 0-based position `offset`"""
+        node, traversed = self._head, 0
+        for i in reversed(range(self._level)):
+            while node.next[i] is not None and traversed + node.width[i] <= offset:
+                traversed += node.width[i]
+                node = node.next[i]
+        entries, node = [], node.next[0]
+        while node is not None and len(entries) < limit:
+            entries.append((node.key[1], -node.key[0]))
+            node = node.next[0]
+        return entries
+
+    def _random_level(self) -> int:
+        level = 1
+        while level < self.MAX_LEVEL and random.random() < self.P:
+            level += 1
+        return level
+
+    def _insert(self, key):
+        update = [self._head] * self.MAX_LEVEL
+        rank = [0] * self.MAX_LEVEL
+        node = self._head
+        for i in reversed(range(self._level)):
+            rank[i] = rank[i + 1] if i + 1 < self._level else 0
+            while node.next[i] is not None and node.next[i].key < key:
+                rank[i] += node.width[i]
+                node = node.next[i]
+            update[i] = node
+
+        level = self._random_level()
+        if level > self._level:
+            for i in range(self._level, level):
+                self._head.width[i] = len(self._scores)
+            self._level = level
+
+        new = _Node(key, level, 0)
+        for i in range(level):
+            new.next[i] = update[i].next[i]
+            update[i].next[i] = new
+            new.width[i] = update[i].width[i] - (rank[0] - rank[i])
+            update[i].width[i] = rank[0] - rank[i] + 1
+        for i in range(level, self._level):
+            update[i].width[i] += 1
+
+    def _remove(self, key):
+        update = [self._head] * self.MAX_LEVEL
+        node = self._head
+        for i in reversed(range(self._level)):
+            while node.next[i] is not None and node.next[i].key < key:
+                node = node.next[i]
+            update[i] = node
+
+        target = node.next[0]
+        for i in range(self._level):
+            if update[i].next[i] is target:
+                update[i].width[i] += target.width[i] - 1
+                update[i].next[i] = target.next[i]
+            else:
+                update[i].width[i] -= 1
+        while self._level > 1 and self._head.next[self._level - 1] is None:
+            self._level -= 1
+
+
+def period_of(board: str, moment: datetime) -> str:
+    """The day (daily), Monday (weekly) or constant (all-time) a moment counts towards"""
+    day = moment.date()
+    if board == DAILY:
+        return day.isoformat()
+    if board == WEEKLY:
+        return (day - timedelta(days=day.weekday())).isoformat()
+    return ALL_TIME
+
+
+def scores_of(doc: dict, now: datetime) -> dict:
+    """Each board's score of a user document, from its stored focus counters"""
+    days = doc.get("recent_days") or {}
+    week_start = period_of(WEEKLY, now)
+    return {
+        DAILY: days.get(period_of(DAILY, now), {}).get("focus_time", 0),
+        WEEKLY: sum(totals.get("focus_time", 0) for day, totals in days.items() if day >= week_start),
+        ALL_TIME: doc.get("total_focus_time", 0),
+    }
+
+
+class Leaderboards:
+    """
+    Per-worker daily, weekly and all-time focus-time rankings. Users whose
+    focus time is recorded on this worker are re-ranked right away through
+    record(); every worker also polls the users whose focus counters changed
+    since its last pass and sets their scores from the stored counters, so
+    all of them converge. The worker holding the lease snapshots the boards to Mongo,
+    and a restarting worker loads the snapshot and catches up from it
+    instead of scanning every user.
+    """
+
+    collection_name = "leaderboard_snapshots"
+
+    def __init__(self, poll_interval: float, snapshot_interval: float, lease: Lease):
+        self.poll_interval = poll_interval
+        self.snapshot_interval = snapshot_interval
+        self.lease = lease
+        self._boards = {board: RankedScores() for board in BOARDS}
+        self._periods = {board: period_of(board, datetime.utcnow()) for board in BOARDS}
+        self._names = {}  # member -> display name
+        self._since = None  # server time of the newest focus update applied
+        self._last_snapshot = time.monotonic()
+        self._task = None
+
+    def _roll(self, now: datetime):
+        """Start a new daily/weekly board once its period is over"""
+        for board in (DAILY, WEEKLY):
+            period = period_of(board, now)
+            if period != self._periods[board]:
+                self._boards[board] = RankedScores()
+                self._periods[board] = period
+                logger.info(f"Started the {board} leaderboard for {period}")
+
+    def _apply(self, doc: dict, now: datetime):
+        member = str(doc["_id"])
+        self._names[member] = doc.get("name", "")
+        for board, score in scores_of(doc, now).items():
+            if score > 0:
+                self._boards[board].set(member, score)
+            else:
+                self._boards[board].discard(member)
+        updated_at = doc.get("focus_updated_at")
+        if updated_at is not None and (self._since is None or updated_at > self._since):
+            self._since = updated_at
+
+    def record(self, doc: dict):
+        """
+        Re-rank a user right after their focus time was stored, from the
+        updated document (projected with SCORE_PROJECTION); other workers
+        pick the change up on their next poll
+        """
+        now = datetime.utcnow()
+        self._roll(now)
+        self._apply(doc, now)
+        metrics.incr("leaderboards.recorded")
+
+    def period(self, board: str) -> str:
+        return self._periods[board]
+
+    def size(self, board: str) -> int:
+        return len(self._boards[board])
+
+    def top(self, board: str, limit: int, offset: int = 0) -> list:
+        """(rank, member, name, score) of a page of the board"""
+        self._roll(datetime.utcnow())
+        return [
+            (offset + i + 1, member, self._names.get(member, ""), score)
+            for i, (member, score) in enumerate(self._boards[board].page(offset, limit))
+        ]
+
+    def standing(self, board: str, user_id):
+        """(rank, score) of a user, or None while they have no focus time on the board"""
+        self._roll(datetime.utcnow())
+        member = str(user_id)
+        rank = self._boards[board].rank(member)
+        return None if rank is None else (rank, self._boards[board].score(member))
+
+    async def load(self):
+        """Fill the boards from the latest snapshot, or from the users themselves without one"""
+        now = datetime.utcnow()
+        started = time.perf_counter()
+        snapshots = {
+            doc["_id"]: doc async for doc in db.database[self.collection_name].find({"_id": {"$in": list(BOARDS)}})
+        }
+        if ALL_TIME not in snapshots:
+            users = User.get_motor_collection()
+            async for doc in users.find({"total_focus_time": {"$gt": 0}}, SCORE_PROJECTION):
+                self._apply(doc, now)
+            self._since = self._since or now
+            logger.info(f"Built leaderboards from {self.size(ALL_TIME)} user(s) in {time.perf_counter() - started:.2f}s")
+            return
+
+        for board, snapshot in snapshots.items():
+            if snapshot["period"] != self._periods[board]:
+                continue
+            for member, name, score in snapshot["entries"]:
+                self._names[member] = name
+                self._boards[board].set(member, score)
+        self._since = min(snapshot["taken_at"] for snapshot in snapshots.values())
+        caught_up = await self.poll()
+        logger.info(
+            f"Loaded leaderboards from snapshot ({self.size(ALL_TIME)} user(s), {caught_up} update(s) since) "
+            f"in {time.perf_counter() - started:.2f}s"
+        )
+
+    async def poll(self) -> int:
+        """Set the scores of users whose focus counters changed since the last poll; returns how many"""
+        now = datetime.utcnow()
+        self._roll(now)
+        applied = 0
+        cursor = User.get_motor_collection().find(
+            {"focus_updated_at": {"$gte": self._since - _POLL_OVERLAP}}, SCORE_PROJECTION
+        )
+        async for doc in cursor:
+            self._apply(doc, now)
+            applied += 1
+        metrics.gauge("leaderboards.users", self.size(ALL_TIME))
+        return applied
+
+    async def snapshot(self):
+        """Store every board with the poll cursor it is current to"""
+        started = time.perf_counter()
+        snapshots = db.database[self.collection_name]
+        for board in BOARDS:
+            entries = [
+                [member, self._names.get(member, ""), score]
+                for member, score in self._boards[board].page(0, len(self._boards[board]))
+            ]
+            await snapshots.replace_one(
+                {"_id": board},
+                {"period": self._periods[board], "taken_at": self._since, "entries": entries},
+                upsert=True,
+            )
+        metrics.observe("leaderboards.snapshot", time.perf_counter() - started)
+
+    async def start(self):
+        await self.load()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.lease.release()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.poll()
+                if time.monotonic() - self._last_snapshot >= self.snapshot_interval:
+                    self._last_snapshot = time.monotonic()
+                    if await self.lease.acquire():
+                        await self.snapshot()
+            except Exception as e:
+                logger.error(f"❌ Leaderboard refresh failed, retrying next tick: {str(e)}", exc_info=True)
+
+
+# Global leaderboards instance
+leaderboards = Leaderboards(
+    poll_interval=Config.LEADERBOARD_POLL_SECONDS,
+    snapshot_interval=Config.LEADERBOARD_SNAPSHOT_SECONDS,
+    lease=Lease("leaderboards", ttl=Config.LEADERBOARD_LEASE_SECONDS),
+)
@@ -0,0 +1,60 @@
+# services/lease.py
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from database import db
+
+logger = logging.getLogger("studyshield.lease")
+
+
+class Lease:
+    """
+    Mongo-backed lease so a background job runs on exactly one worker across
+    the deployment. The holder renews it every pass; if that worker dies the
+    lease expires after `ttl` seconds and another worker takes over.
+    """
+
+    collection_name = "leases"
+
+    def __init__(self, name: str, ttl: int):
+        self.name = name
+        self.ttl = ttl
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.held = False
+
+    async def acquire(self) -> bool:
+        """Take or renew the lease; True while this worker is the leader"""
+        now = datetime.utcnow()
+        was_held = self.held
+        try:
+            doc = await db.database[self.collection_name].find_one_and_update(
+                {
+                    "_id": self.name,
+                    "$or": [{"holder": self.holder}, {"expires_at": {"$lt": now}}],
+                },
+                {"$set": {"holder": self.holder, "expires_at": now + timedelta(seconds=self.ttl)}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+            self.held = doc is not None
+        except DuplicateKeyError:
+            # someone else holds an unexpired lease, so the upsert collided on _id
+            self.held = False
+
+        if self.held != was_held:
+            logger.info(f"Lease {self.name} {'acquired' if self.held else 'lost'} by {self.holder}")
+        return self.held
+
+    async def release(self):
+        if self.held:
+            await db.database[self.collection_name].update_one(
+                {"_id": self.name, "holder": self.holder},
+                {"$set": {"expires_at": datetime.utcnow()}},
+            )
+            self.held = False
@@ -0,0 +1,9 @@
+# services/links.py
+
+
+def link_id(link):
+    """The referenced _id of an unfetched Link, a fetched document or a DBRef"""
+    if link is None:
+        return None
+    ref = getattr(link, "ref", None)
+    return ref.id if ref is not None else link.id
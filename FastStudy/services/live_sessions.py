@@ -0,0 +1,54 @@
+# services/live_sessions.py
+import asyncio
+import logging
+from collections import defaultdict
+
+from metrics import metrics
+
+logger = logging.getLogger("studyshield.live_sessions")
+
+
+class LiveSessionHub:
+    """
+    Per-worker registry of open live channels (WebSocket or SSE), keyed by
+    session id. State changes for a session are fanned out to every channel
+    watching it; a channel that stops draining its queue loses events rather
+    than holding up the publisher.
+    """
+
+    def __init__(self, queue_size: int = 32):
+        self.queue_size = queue_size
+        self._channels = defaultdict(set)  # session_id -> {asyncio.Queue}
+
+    @property
+    def connections(self) -> int:
+        return sum(len(queues) for queues in self._channels.values())
+
+    def is_live(self, session_id) -> bool:
+        return bool(self._channels.get(session_id))
+
+    def subscribe(self, session_id) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._channels[session_id].add(queue)
+        metrics.gauge("live.connections", self.connections)
+        return queue
+
+    def unsubscribe(self, session_id, queue: asyncio.Queue):
+        queues = self._channels.get(session_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._channels[session_id]
+        metrics.gauge("live.connections", self.connections)
+
+    def publish(self, session_id, event: str, **data):
+        for queue in self._channels.get(session_id, ()):
+            try:
+                queue.put_nowait({"event": event, "session_id": str(session_id), **data})
+            except asyncio.QueueFull:
+                metrics.incr("live.dropped")
+                logger.warning(f"Dropped {event} for session {session_id}, channel not draining")
+
+
+# Global live session hub
+live_sessions = LiveSessionHub()
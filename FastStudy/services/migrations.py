@@ -0,0 +1,347 @@
+# services/migrations.py
+import logging
+import time
+from datetime import datetime, timedelta
+
+from pymongo import UpdateOne
+
+from config import Config
+from metrics import metrics
+from models.CoinEntry import CoinEntry, CoinReason, EntryStatus
+from models.DailyStat import DailyStat
+from models.User import User
+from models.UserChallenge import UserChallenge
+from models.UserMilestone import UserMilestone
+from services.coins import OPENING_KEY
+from services.lease import Lease
+from services.streaks import ROLLING_WINDOW_DAYS, period_starts
+
+logger = logging.getLogger("studyshield.migrations")
+
+
+# the daily_stats counters fold_study_stats carries over from study_stats
+_LEGACY_COUNTERS = ("focus_time", "sessions", "distractions_blocked")
+
+
+async def _renew(lease: Lease):
+    """Keep the migration lease for the next batch; stop if another worker took it"""
+    if lease is not None and not await lease.acquire():
+        raise RuntimeError(f"Lost the {lease.name} lease, leaving the rest to its holder")
+
+
+async def fold_study_stats(batch_size: int = 500, lease: Lease = None) -> int:
+    """
+    Fold legacy embedded User.study_stats arrays into the daily_stats
+    collection and strip them from the user documents. Runs entirely
+    server-side: one $merge aggregation plus one $unset per batch of users.
+    Each bucket remembers the legacy totals folded into it, so a batch
+    merged twice is counted once. Returns the number of users migrated.
+    """
+    users = User.get_motor_collection()
+    migrated = 0
+    started = time.perf_counter()
+
+    while True:
+        batch = [
+            doc["_id"]
+            async for doc in users.find({"study_stats": {"$exists": True}}, {"_id": 1}).limit(batch_size)
+        ]
+        if not batch:
+            break
+        await _renew(lease)
+
+        await users.aggregate([
+            {"$match": {"_id": {"$in": batch}}},
+            {"$unwind": "$study_stats"},
+            {"$group": {
+                "_id": {
+                    "user_id": "$_id",
+                    "date": {"$dateFromParts": {
+                        "year": {"$year": "$study_stats.date"},
+                        "month": {"$month": "$study_stats.date"},
+                        "day": {"$dayOfMonth": "$study_stats.date"},
+                    }},
+                },
+                "focus_time": {"$sum": "$study_stats.focus_time"},
+                "sessions": {"$sum": "$study_stats.sessions"},
+                "distractions_blocked": {"$sum": {"$ifNull": ["$study_stats.distractions_blocked", 0]}},
+            }},
+            {"$project": {
+                "_id": 0,
+                "user_id": "$_id.user_id",
+                "date": "$_id.date",
+                "focus_time": 1,
+                "sessions": 1,
+                "distractions_blocked": 1,
+                "legacy": {field: f"${field}" for field in _LEGACY_COUNTERS},
+            }},
+            {"$merge": {
+                "into": DailyStat.get_collection_name(),
+                "on": ["user_id", "date"],
+                # swap out whatever an earlier (crashed or concurrent) pass folded
+                # in for this bucket, so merging the same batch again adds nothing
+                "whenMatched": [{"$set": {
+                    **{
+                        field: {"$add": [
+                            {"$subtract": [f"${field}", {"$ifNull": [f"$legacy.{field}", 0]}]},
+                            f"$$new.{field}",
+                        ]}
+                        for field in _LEGACY_COUNTERS
+                    },
+                    "legacy": "$$new.legacy",
+                }}],
+                "whenNotMatched": "insert",
+            }},
+        ]).to_list(length=None)
+
+        await users.update_many({"_id": {"$in": batch}}, {"$unset": {"study_stats": ""}})
+        migrated += len(batch)
+        logger.info(f"Folded study_stats for {migrated} user(s) so far")
+
+    metrics.observe("migrations.fold_study_stats", time.perf_counter() - started)
+    return migrated
+
+
+def _ref_id(path: str) -> dict:
+    """The $id of the DBRef at `path`; a plain field path can't name $id"""
+    return {"$getField": {"field": {"$literal": "$id"}, "input": path}}
+
+
+# embedded array -> (collection, referenced id field, fields copied with default expressions)
+_PROGRESS_ARRAYS = {
+    "challenges": (UserChallenge, "challenge_id", {
+        "progress": 0, "is_completed": False, "redeemed": False,
+        "redeemed_at": None, "last_updated": "$$NOW", "subjects": [],
+    }),
+    "milestones": (UserMilestone, "milestone_id", {
+        "progress": 0, "current_tier": None, "next_goal": None, "claimed_tiers": [],
+    }),
+}
+
+
+async def split_progress(batch_size: int = 500, lease: Lease = None) -> int:
+    """
+    Move the embedded User.challenges and User.milestones arrays into the
+    challenge_progress and milestone_progress collections, one $merge per
+    array per batch of users, then strip them from the user documents.
+    Returns the number of users migrated.
+    """
+    users = User.get_motor_collection()
+    migrated = 0
+    started = time.perf_counter()
+
+    while True:
+        batch = [
+            doc["_id"]
+            async for doc in users.find(
+                {"$or": [{"challenges": {"$exists": True}}, {"milestones": {"$exists": True}}]}, {"_id": 1}
+            ).limit(batch_size)
+        ]
+        if not batch:
+            break
+        await _renew(lease)
+
+        for array, (model, ref_field, fields) in _PROGRESS_ARRAYS.items():
+            await users.aggregate([
+                {"$match": {"_id": {"$in": batch}}},
+                {"$unwind": f"${array}"},
+                {"$project": {
+                    "_id": 0,
+                    "user_id": "$_id",
+                    ref_field: _ref_id(f"${array}.{ref_field}"),
+                    **{
+                        field: {"$ifNull": [f"${array}.{field}", default]}
+                        for field, default in fields.items()
+                    },
+                }},
+                {"$merge": {
+                    "into": model.get_collection_name(),
+                    "on": ["user_id", ref_field],
+                    "whenMatched": "keepExisting",
+                    "whenNotMatched": "insert",
+                }},
+            ]).to_list(length=None)
+
+        await users.update_many({"_id": {"$in": batch}}, {"$unset": {"challenges": "", "milestones": ""}})
+        migrated += len(batch)
+        logger.info(f"Moved challenge/milestone progress for {migrated} user(s) so far")
+
+    metrics.observe("migrations.split_progress", time.perf_counter() - started)
+    return migrated
+
+
+def _streak_bounds(days: list) -> tuple:
+    """
+    For a user's studied days, newest first: the start of the run that ends
+    at the latest day, and the length of the longest run
+    """
+    run_start, run, longest = days[0], 1, 1
+    current_start, current_open = days[0], True
+    for newer, older in zip(days, days[1:]):
+        if newer - older == timedelta(days=1):
+            run += 1
+            run_start = older
+        else:
+            run, run_start = 1, older
+            current_open = False
+        if current_open:
+            current_start = run_start
+        longest = max(longest, run)
+    return current_start, longest
+
+
+async def backfill_rollups(batch_size: int = 500, lease: Lease = None) -> int:
+    """
+    Seed the streak and rolling-window counters (recent_days, streak_start,
+    last_study_day) of users that predate them from their daily_stats.
+    Returns the number of users backfilled.
+    """
+    users = User.get_motor_collection()
+    stats = DailyStat.get_motor_collection()
+    oldest = DailyStat.day_of(datetime.utcnow() - timedelta(days=ROLLING_WINDOW_DAYS - 1))
+    backfilled = 0
+    started = time.perf_counter()
+
+    while True:
+        batch = [
+            doc
+            async for doc in users.find(
+                {"recent_days": {"$exists": False}}, {"_id": 1, "longest_streak": 1}
+            ).limit(batch_size)
+        ]
+        if not batch:
+            break
+        await _renew(lease)
+
+        # every studied day per user, newest first, in one round trip
+        days_by_user = {
+            group["_id"]: group["days"]
+            async for group in stats.aggregate([
+                {"$match": {"user_id": {"$in": [doc["_id"] for doc in batch]}}},
+                {"$sort": {"user_id": 1, "date": -1}},
+                {"$group": {
+                    "_id": "$user_id",
+                    "days": {"$push": {
+                        "date": "$date",
+                        "focus_time": "$focus_time",
+                        "sessions": "$sessions",
+                        "distractions_blocked": "$distractions_blocked",
+                    }},
+                }},
+            ])
+        }
+
+        writes = []
+        for doc in batch:
+            days = days_by_user.get(doc["_id"], [])
+            update = {"recent_days": {
+                day["date"].date().isoformat(): {
+                    "focus_time": day["focus_time"],
+                    "sessions": day["sessions"],
+                    "distractions_blocked": day.get("distractions_blocked", 0),
+                }
+                for day in days if day["date"] >= oldest
+            }}
+            if days:
+                streak_start, longest = _streak_bounds([day["date"] for day in days])
+                update.update({
+                    "streak_start": streak_start,
+                    "last_study_day": days[0]["date"],
+                    "day_streak": (days[0]["date"] - streak_start).days + 1,
+                    "longest_streak": max(doc.get("longest_streak", 0), longest),
+                })
+            writes.append(UpdateOne({"_id": doc["_id"]}, {"$set": update}))
+
+        await users.bulk_write(writes, ordered=False)
+        backfilled += len(batch)
+        logger.info(f"Backfilled streak rollups for {backfilled} user(s) so far")
+
+    metrics.observe("migrations.backfill_rollups", time.perf_counter() - started)
+    return backfilled
+
+
+async def open_ledger(batch_size: int = 500, lease: Lease = None) -> int:
+    """
+    Give users that predate the coin ledger an opening entry for the
+    balance they hold, one $merge per batch, and start their applied_ops.
+    Returns the number of users opened.
+    """
+    users = User.get_motor_collection()
+    opened = 0
+    started = time.perf_counter()
+
+    while True:
+        batch = [
+            doc["_id"]
+            async for doc in users.find({"applied_ops": {"$exists": False}}, {"_id": 1}).limit(batch_size)
+        ]
+        if not batch:
+            break
+        await _renew(lease)
+
+        await users.aggregate([
+            {"$match": {"_id": {"$in": batch}, "coins": {"$nin": [0, None]}}},
+            {"$project": {
+                "_id": 0,
+                "user_id": "$_id",
+                "amount": "$coins",
+                "reason": CoinReason.OPENING_BALANCE.value,
+                "idempotency_key": OPENING_KEY,
+                "status": EntryStatus.APPLIED.value,
+                "created_at": "$$NOW",
+            }},
+            {"$merge": {
+                "into": CoinEntry.get_collection_name(),
+                "on": ["user_id", "idempotency_key"],
+                "whenMatched": "keepExisting",
+                "whenNotMatched": "insert",
+            }},
+        ]).to_list(length=None)
+
+        await users.update_many({"_id": {"$in": batch}}, {"$set": {"applied_ops": []}})
+        opened += len(batch)
+        logger.info(f"Opened coin ledger for {opened} user(s) so far")
+
+    metrics.observe("migrations.open_ledger", time.perf_counter() - started)
+    return opened
+
+
+async def stamp_periods() -> int:
+    """
+    Date the weekly/monthly focus counters of users that predate
+    week_start/month_start to the current week and month, so neither the
+    rollover nor the next session takes them for last period's totals.
+    One update_many; returns the number of users stamped.
+    """
+    week, month = period_starts(datetime.utcnow())
+    result = await User.get_motor_collection().update_many(
+        {"week_start": {"$exists": False}},
+        {"$set": {"week_start": week, "month_start": month}},
+    )
+    return result.modified_count
+
+
+async def run_pending_migrations():
+    """Run data migrations at startup on a single worker"""
+    lease = Lease("migrations", ttl=Config.MIGRATION_LEASE_SECONDS)
+    if not await lease.acquire():
+        logger.info("Another worker is running migrations, skipping")
+        return
+    try:
+        migrated = await fold_study_stats(lease=lease)
+        if migrated:
+            logger.info(f"✅ Moved study_stats of {migrated} user(s) into daily_stats")
+        backfilled = await backfill_rollups(lease=lease)
+        if backfilled:
+            logger.info(f"✅ Backfilled streak rollups for {backfilled} user(s)")
+        moved = await split_progress(lease=lease)
+        if moved:
+            logger.info(f"✅ Moved challenge/milestone progress of {moved} user(s) into their own collections")
+        opened = await open_ledger(lease=lease)
+        if opened:
+            logger.info(f"✅ Opened the coin ledger for {opened} user(s)")
+        stamped = await stamp_periods()
+        if stamped:
+            logger.info(f"✅ Dated the weekly/monthly focus counters of {stamped} user(s)")
+    finally:
+        await lease.release()
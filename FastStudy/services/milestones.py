@@ -0,0 +1,267 @@
+# services/milestones.py
+import asyncio
+import logging
+import time
+from uuid import uuid4
+
+from fastapi import HTTPException
+from pymongo import ReturnDocument, UpdateOne
+
+from auth.cache import principal_cache
+from metrics import metrics
+from models.Challenge import ProgressUnit, TierName
+from models.CoinEntry import CoinReason
+from models.DailyStat import DailyStat
+from models.Milestone import Milestone, TierLadder
+from models.User import User
+from models.UserMilestone import UserMilestone
+from services import coins as coins_ledger
+from services.catalog import MILESTONES, catalog_cache
+
+logger = logging.getLogger("studyshield.milestones")
+
+
+def claim_update(ladder: TierLadder, tiers: list, key: str, coins: int) -> list:
+    """
+    Pipeline update adding `tiers` to a progress record's claimed tiers,
+    moving current_tier/next_goal to the highest tier claimed, whatever
+    order the tiers were claimed in, and recording their `coins` as owed
+    under the ledger `key`
+    """
+    names = {"$literal": [name.value for name in ladder.names]}
+    goals = {"$literal": [*ladder.values, None]}
+    return [
+        {"$set": {"claimed_tiers": {"$setUnion": [
+            {"$ifNull": ["$claimed_tiers", []]}, {"$literal": [name.value for name in tiers]}
+        ]}}},
+        {"$set": {"_top": {"$max": {"$map": {
+            "input": "$claimed_tiers", "in": {"$indexOfArray": [names, "$$this"]},
+        }}}}},
+        {"$set": {
+            "current_tier": {"$arrayElemAt": [names, "$_top"]},
+            "next_goal": {"$arrayElemAt": [goals, {"$add": ["$_top", 1]}]},
+        }},
+        {"$unset": "_top"},
+        {"$set": {"unpaid": coins_ledger.with_owed(key, coins)}},
+    ]
+
+
+async def claim_tier(user_id, milestone: Milestone, tier_name: TierName):
+    """
+    Claim one tier of a milestone: a single conditional update on the
+    user's progress record (requirement met, tier not yet claimed) that
+    also records the reward as owed, then the reward paid through the coin
+    ledger. Returns (record, new coin balance).
+    """
+    tier = milestone.tiers.get(tier_name)
+    if not tier:
+        raise HTTPException(status_code=404, detail="Tier not found")
+
+    key = f"milestone:{milestone.id}:{tier_name.value}"
+    collection = UserMilestone.get_motor_collection()
+    doc = await collection.find_one_and_update(
+        {
+            "user_id": user_id,
+            "milestone_id": milestone.id,
+            "progress": {"$gte": tier.value},
+            "claimed_tiers": {"$ne": tier_name.value},
+        },
+        claim_update(catalog_cache.ladder(milestone), [tier_name], key, tier.coins),
+        return_document=ReturnDocument.AFTER,
+    )
+    if doc is None:
+        # tell the caller which precondition failed
+        existing = await collection.find_one({"user_id": user_id, "milestone_id": milestone.id})
+        if existing is None:
+            raise HTTPException(status_code=404, detail="Milestone not started")
+        if tier_name.value not in existing.get("claimed_tiers", []):
+            raise HTTPException(status_code=400, detail="Tier requirements not met")
+        if not any(owed["key"] == key for owed in existing.get("unpaid", [])):
+            raise HTTPException(status_code=400, detail="Tier already claimed")
+        # claimed by an attempt whose credit didn't go through: finish it
+        doc = existing
+
+    _, user = await coins_ledger.pay_owed(
+        UserMilestone, user_id, key, CoinReason.MILESTONE, ref=str(milestone.id)
+    )
+    doc["unpaid"] = [owed for owed in doc.get("unpaid", []) if owed["key"] != key]
+    return UserMilestone.model_validate(doc), user["coins"]
+
+
+async def claim_all(user_id):
+    """
+    Claim every tier the user's progress has reached across all their
+    milestones: one conditional update per progress record with something
+    to claim, run together, each recording its share of the reward as owed
+    under one claim key, then the whole reward credited in a single ledger
+    post. Rewards an earlier, interrupted claim still owes are paid first.
+    Returns ({milestone id: tiers claimed}, coins, new balance).
+    """
+    recovered = await coins_ledger.pay_all_owed(UserMilestone, user_id, CoinReason.MILESTONE)
+
+    collection = UserMilestone.get_motor_collection()
+    pending = []
+    async for record in collection.find({"user_id": user_id}):
+        milestone = await catalog_cache.get(MILESTONES, record["milestone_id"])
+        if milestone is None:
+            continue
+        ladder = catalog_cache.ladder(milestone)
+        tiers = ladder.eligible(record["progress"], record.get("claimed_tiers", []))
+        if tiers:
+            pending.append((record, ladder, tiers))
+
+    key = f"milestones:{uuid4().hex}"
+    # a record claimed concurrently since it was read simply doesn't match
+    claimed = await asyncio.gather(*(
+        collection.find_one_and_update(
+            {
+                "_id": record["_id"],
+                "progress": {"$gte": ladder.values[ladder.names.index(tiers[-1])]},
+                "claimed_tiers": {"$nin": [name.value for name in tiers]},
+            },
+            claim_update(ladder, tiers, key, ladder.reward(tiers)),
+            projection={"_id": 1},
+        )
+        for record, ladder, tiers in pending
+    ))
+    won = {
+        str(record["milestone_id"]): tiers
+        for (record, ladder, tiers), doc in zip(pending, claimed) if doc is not None
+    }
+    if not won and not recovered:
+        raise HTTPException(status_code=400, detail="No milestone tiers to claim")
+
+    # pays exactly what the records that matched owe under the key
+    coins, user = await coins_ledger.pay_owed(UserMilestone, user_id, key, CoinReason.MILESTONE)
+    return won, coins + recovered, user["coins"]
+
+
+def _new_record(ladder: TierLadder) -> dict:
+    """Fields of a progress record created by the first activity counting towards it"""
+    return {"current_tier": None, "next_goal": ladder.values[0] if ladder.values else None, "claimed_tiers": []}
+
+
+async def track_progress(user_id, total_focus_time: int, new_day: bool, distractions_blocked: int = 0):
+    """
+    Move a user's progress on every milestone after a piece of study was
+    stored, by the milestone's unit: whole hours of total focus time,
+    distinct study days, distracting sites blocked. One upsert per
+    milestone, sent in a single bulk write, then a revision bump.
+    """
+    hours = total_focus_time // 60
+    writes = []
+    for milestone in await catalog_cache.all(MILESTONES):
+        if milestone.progress_unit == ProgressUnit.HOURS and hours:
+            # set from the lifetime total, so minutes carry over between sessions
+            update = {"$max": {"progress": hours}}
+        elif milestone.progress_unit == ProgressUnit.DAYS and new_day:
+            update = {"$inc": {"progress": 1}}
+        elif milestone.progress_unit == ProgressUnit.BLOCKS and distractions_blocked:
+            update = {"$inc": {"progress": distractions_blocked}}
+        else:
+            continue
+        writes.append(UpdateOne(
+            {"user_id": user_id, "milestone_id": milestone.id},
+            {**update, "$setOnInsert": _new_record(catalog_cache.ladder(milestone))},
+            upsert=True,
+        ))
+    if writes:
+        await UserMilestone.get_motor_collection().bulk_write(writes, ordered=False)
+        # the progress shows on /users/me, whose ETag is the user's revision
+        await User.apply_update(user_id, {})
+        metrics.incr("milestones.tracked")
+
+
+def _merge_progress(milestones: list) -> list:
+    """
+    The stages turning (user_id, hours, days, blocks) rows into one
+    progress record per user and milestone, $merged without ever lowering
+    progress that is already stored
+    """
+    rows = [
+        {"id": milestone.id, "unit": milestone.progress_unit.value, "new": _new_record(catalog_cache.ladder(milestone))}
+        for milestone in milestones
+    ]
+    return [
+        {"$set": {"milestone": {"$literal": rows}}},
+        {"$unwind": "$milestone"},
+        {"$project": {
+            "_id": 0,
+            "user_id": 1,
+            "milestone_id": "$milestone.id",
+            "progress": {"$switch": {
+                "branches": [
+                    {"case": {"$eq": ["$milestone.unit", ProgressUnit.HOURS.value]}, "then": "$hours"},
+                    {"case": {"$eq": ["$milestone.unit", ProgressUnit.DAYS.value]}, "then": "$days"},
+                ],
+                "default": "$blocks",
+            }},
+            "current_tier": "$milestone.new.current_tier",
+            "next_goal": "$milestone.new.next_goal",
+            "claimed_tiers": "$milestone.new.claimed_tiers",
+        }},
+        {"$match": {"progress": {"$gt": 0}}},
+        {"$merge": {
+            "into": UserMilestone.get_collection_name(),
+            "on": ["user_id", "milestone_id"],
+            "whenMatched": [{"$set": {"progress": {"$max": ["$progress", "$$new.progress"]}}}],
+            "whenNotMatched": "insert",
+        }},
+    ]
+
+
+async def backfill_progress() -> dict:
+    """
+    Compute every user's milestone progress from their stored activity:
+    hours from User.total_focus_time, study days and blocks from
+    daily_stats. Two aggregations, both $merged server-side, after which
+    the revision of every user they touched is bumped so /users/me stops
+    answering 304. Returns the number of milestones backfilled per unit.
+    """
+    started = time.perf_counter()
+    milestones = await catalog_cache.all(MILESTONES)
+    by_unit = {
+        unit: [m for m in milestones if m.progress_unit == unit] for unit in ProgressUnit
+    }
+
+    if by_unit[ProgressUnit.HOURS]:
+        await User.get_motor_collection().aggregate([
+            {"$match": {"total_focus_time": {"$gte": 60}}},
+            {"$project": {
+                "user_id": "$_id",
+                "hours": {"$toInt": {"$floor": {"$divide": ["$total_focus_time", 60]}}},
+            }},
+            *_merge_progress(by_unit[ProgressUnit.HOURS]),
+        ]).to_list(length=None)
+        await User.get_motor_collection().update_many(
+            {"total_focus_time": {"$gte": 60}}, {"$inc": {"revision": 1}}
+        )
+
+    from_stats = by_unit[ProgressUnit.DAYS] + by_unit[ProgressUnit.BLOCKS]
+    if from_stats:
+        await DailyStat.get_motor_collection().aggregate([
+            {"$group": {
+                "_id": "$user_id",
+                "days": {"$sum": 1},
+                "blocks": {"$sum": "$distractions_blocked"},
+            }},
+            {"$set": {"user_id": "$_id"}},
+            *_merge_progress(from_stats),
+        ]).to_list(length=None)
+        await DailyStat.get_motor_collection().aggregate([
+            {"$group": {"_id": "$user_id"}},
+            {"$merge": {
+                "into": User.get_collection_name(),
+                "on": "_id",
+                "whenMatched": [{"$set": {"revision": {"$add": [{"$ifNull": ["$revision", 0]}, 1]}}}],
+                "whenNotMatched": "discard",
+            }},
+        ]).to_list(length=None)
+
+    if by_unit[ProgressUnit.HOURS] or from_stats:
+        principal_cache.clear()
+
+    metrics.observe("milestones.backfill", time.perf_counter() - started)
+    counts = {unit.value: len(group) for unit, group in by_unit.items()}
+    logger.info(f"✅ Backfilled milestone progress for {counts}")
+    return counts
@@ -0,0 +1,202 @@
+# services/rollover.py
+import asyncio
+import logging
+import time
+from datetime import date, datetime
+
+from pymongo import ASCENDING, ReturnDocument
+
+from auth.cache import principal_cache
+from config import Config
+from database import db
+from metrics import metrics
+from models.Challenge import ChallengeType
+from models.User import User
+from models.UserChallenge import UserChallenge
+from services.catalog import CHALLENGES, catalog_cache
+from services.challenges import DAILY_RESET
+from services.lease import Lease
+from services.streaks import period_starts
+
+logger = logging.getLogger("studyshield.rollover")
+
+def rollover_updates(day: date, daily_ids: list) -> list:
+    """
+    The (collection, user id field, filter, update) updates due at the start
+    of `day`: daily challenge progress, and weekly_focus_time and
+    monthly_focus_time once the week or month turns, each with a revision
+    bump on the users it changed. Every reset only matches records that
+    predate the new period, so activity recorded after midnight but before
+    a user's chunk runs is kept.
+    """
+    day_start = datetime(day.year, day.month, day.day)
+    week, month = period_starts(day_start)
+    users = User.get_motor_collection()
+    updates = []
+    if daily_ids:
+        updates.append((
+            UserChallenge.get_motor_collection(),
+            "user_id",
+            {"challenge_id": {"$in": daily_ids}, "last_updated": {"$lt": day_start}},
+            {"$set": DAILY_RESET},
+        ))
+        # reset progress shows on /users/me too, so its ETag must move with the chunk
+        updates.append((users, "_id", {}, {"$inc": {"revision": 1}}))
+
+    # not only on Mondays and the 1st, so a missed day still catches up
+    for counter, marker, start in (("weekly_focus_time", "week_start", week),
+                                   ("monthly_focus_time", "month_start", month)):
+        updates.append((
+            users,
+            "_id",
+            {marker: {"$not": {"$gte": start}}},
+            {"$set": {counter: 0, marker: start}, "$inc": {"revision": 1}},
+        ))
+    return updates
+
+
+class RolloverJob:
+    """
+    Resets daily challenges and rolls the weekly/monthly focus counters once
+    per UTC day, on whichever worker holds the lease. Users are processed
+    in _id ranges of `chunk_size` with server-side update_many calls (on
+    their progress records by user_id), and
+    the last finished range is checkpointed in the jobs collection so a
+    crashed run resumes where it stopped.
+    """
+
+    collection_name = "jobs"
+
+    def __init__(self, chunk_size: int, lease: Lease, poll_interval: float):
+        self.chunk_size = chunk_size
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self._task = None
+
+    @staticmethod
+    def job_id(day: date) -> str:
+        return f"rollover:{day.isoformat()}"
+
+    async def run(self, day: date) -> dict:
+        """Run (or resume) the rollover for `day`; returns the job document"""
+        jobs = db.database[self.collection_name]
+        users = User.get_motor_collection()
+        job = await jobs.find_one_and_update(
+            {"_id": self.job_id(day)},
+            {"$setOnInsert": {
+                "started_at": datetime.utcnow(), "last_id": None, "processed": 0, "finished_at": None,
+            }},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        if job["finished_at"] is not None:
+            return job
+
+        daily_ids = [c.id for c in await catalog_cache.find(CHALLENGES, challenge_type=ChallengeType.DAILY)]
+        updates = rollover_updates(day, daily_ids)
+        last_id, processed = job["last_id"], job["processed"]
+        started = time.perf_counter()
+        resumed_at = processed
+
+        while True:
+            id_range = {"$gt": last_id} if last_id is not None else {}
+            # the last _id of the next chunk; only ids are read
+            boundary = await users.find({"_id": id_range} if id_range else {}, {"_id": 1}) \
+                .sort("_id", ASCENDING).skip(self.chunk_size - 1).limit(1).to_list(length=1)
+            if boundary:
+                id_range = {**id_range, "$lte": boundary[0]["_id"]}
+
+            for collection, id_field, query, update in updates:
+                await collection.update_many({id_field: id_range, **query} if id_range else query, update)
+
+            if not boundary:
+                processed += await users.count_documents({"_id": id_range} if id_range else {})
+                break
+
+            last_id = boundary[0]["_id"]
+            processed += self.chunk_size
+            await jobs.update_one({"_id": job["_id"]}, {"$set": {"last_id": last_id, "processed": processed}})
+            # keep the lease for the whole run; stop if another worker took it
+            if not await self.lease.acquire():
+                logger.warning(f"⚠️ Lost the rollover lease at {last_id}, leaving the rest to its holder")
+                return job
+
+        elapsed = time.perf_counter() - started
+        rate = (processed - resumed_at) / elapsed if elapsed else 0
+        job = await jobs.find_one_and_update(
+            {"_id": job["_id"]},
+            {"$set": {
+                "processed": processed,
+                "finished_at": datetime.utcnow(),
+                "users_per_second": round(rate, 1),
+            }},
+            return_document=ReturnDocument.AFTER,
+        )
+        principal_cache.clear()
+        metrics.observe("rollover.run", elapsed)
+        metrics.incr("rollover.users", processed - resumed_at)
+        logger.info(f"✅ Rollover for {day.isoformat()} done: {processed} user(s), {rate:.0f} users/s")
+        return job
+
+    async def run_due(self):
+        """Run today's rollover if it hasn't finished and this worker gets the lease"""
+        today = datetime.utcnow().date()
+        jobs = db.database[self.collection_name]
+        job = await jobs.find_one({"_id": self.job_id(today)}, {"finished_at": 1})
+        if job is not None and job["finished_at"] is not None:
+            return
+        if not await self.lease.acquire():
+            return
+        try:
+            if job is None and not await self._has_rolled_before():
+                # first run (or the jobs were lost): it is mid-day, so today's
+                # progress and counters are current; start rolling from tomorrow
+                await self.mark_rolled(today)
+                logger.info(f"No earlier rollover found, marked {today.isoformat()} as rolled over")
+                return
+            await self.run(today)
+        finally:
+            await self.lease.release()
+
+    async def _has_rolled_before(self) -> bool:
+        previous = await db.database[self.collection_name].find_one(
+            {"_id": {"$regex": "^rollover:"}}, {"_id": 1}
+        )
+        return previous is not None
+
+    async def mark_rolled(self, day: date):
+        """Record `day` as rolled over without touching any user"""
+        now = datetime.utcnow()
+        await db.database[self.collection_name].update_one(
+            {"_id": self.job_id(day)},
+            {"$setOnInsert": {
+                "started_at": now, "last_id": None, "processed": 0, "finished_at": now, "baseline": True,
+            }},
+            upsert=True,
+        )
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.lease.release()
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_due()
+            except Exception as e:
+                logger.error(f"❌ Rollover failed, retrying next tick: {str(e)}", exc_info=True)
+            await asyncio.sleep(self.poll_interval)
+
+
+# Global rollover job instance
+rollover_job = RolloverJob(
+    chunk_size=Config.ROLLOVER_CHUNK_SIZE,
+    lease=Lease("rollover", ttl=Config.ROLLOVER_LEASE_SECONDS),
+    poll_interval=Config.ROLLOVER_POLL_SECONDS,
+)
@@ -0,0 +1,194 @@
+# services/session_scheduler.py
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+
+from config import Config
+from metrics import metrics
+from models.StudySession import StudySession
+from services.active_sessions import active_sessions
+from services.lease import Lease
+from services.live_sessions import live_sessions
+
+logger = logging.getLogger("studyshield.session_scheduler")
+
+
+def _epoch(moment: datetime) -> float:
+    # Mongo hands back naive UTC datetimes
+    return moment.replace(tzinfo=timezone.utc).timestamp()
+
+
+class DeadlineWheel:
+    """
+    Hashed timing wheel of per-key deadlines. schedule() and cancel() are
+    O(1); advance() only visits the slots whose tick has passed.
+    """
+
+    def __init__(self, slots: int, resolution: float = 1.0):
+        self.resolution = resolution
+        self._slots = [set() for _ in range(slots)]
+        self._deadlines = {}  # key -> tick
+        self._current = int(time.time() // resolution)
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def __contains__(self, key):
+        return key in self._deadlines
+
+    def schedule(self, key, when: float):
+        self.cancel(key)
+        # anything already due fires on the next tick
+        tick = max(int(-(-when // self.resolution)), self._current + 1)
+        self._deadlines[key] = tick
+        self._slots[tick % len(self._slots)].add(key)
+
+    def cancel(self, key):
+        tick = self._deadlines.pop(key, None)
+        if tick is not None:
+            self._slots[tick % len(self._slots)].discard(key)
+
+    def advance(self, now: float) -> list:
+        """Move the wheel up to `now` and return the keys whose deadline passed"""
+        target = int(now // self.resolution)
+        steps = min(target - self._current, len(self._slots))
+        expired = []
+        for step in range(1, steps + 1):
+            slot = self._slots[(self._current + step) % len(self._slots)]
+            for key in [k for k in slot if self._deadlines[k] <= target]:
+                slot.discard(key)
+                del self._deadlines[key]
+                expired.append(key)
+        self._current = max(self._current, target)
+        return expired
+
+
+async def pause_stale_sessions(cutoff: datetime, session_ids=None) -> int:
+    """Pause running sessions whose last heartbeat is older than cutoff"""
+    query = {
+        "is_paused": False,
+        "end_time": None,
+        "last_heartbeat": {"$lt": cutoff}
+    }
+    if session_ids is not None:
+        query["_id"] = {"$in": list(session_ids)}
+
+    # The pipeline update stamps paused_at with the server clock in the same round trip
+    result = await StudySession.get_motor_collection().update_many(
+        query,
+        [{"$set": {
+            "is_paused": True,
+            "paused_at": "$$NOW",
+            "total_paused": {"$toInt": {"$ifNull": ["$total_paused", 0]}},
+        }}]
+    )
+    return result.modified_count
+
+
+class SessionScheduler:
+    """
+    Auto-pauses a session exactly `timeout` seconds after its last heartbeat.
+
+    Each worker schedules the sessions it hears about (create, resume,
+    heartbeat) and cancels them on pause/complete. The worker holding the
+    scheduler lease also loads every open session when it becomes leader, so
+    sessions whose worker went away still get paused. Expiry is guarded by
+    the stored last_heartbeat, so a heartbeat seen by another worker wins.
+    """
+
+    def __init__(self, timeout: int, slots: int, resolution: float, lease: Lease, rehydrate_interval: int):
+        self.timeout = timeout
+        self.wheel = DeadlineWheel(slots, resolution)
+        self.lease = lease
+        self.rehydrate_interval = rehydrate_interval
+        self._task = None
+
+    def touch(self, session_id, last_heartbeat: datetime = None):
+        beat = _epoch(last_heartbeat) if last_heartbeat else time.time()
+        self.wheel.schedule(session_id, beat + self.timeout)
+
+    def cancel(self, session_id):
+        self.wheel.cancel(session_id)
+
+    async def hydrate(self):
+        """Rebuild the wheel from every open, running session"""
+        started = time.perf_counter()
+        # sorted on last_heartbeat so the partial running-sessions index serves it
+        cursor = StudySession.get_motor_collection().find(
+            {"end_time": None, "is_paused": False},
+            {"last_heartbeat": 1}
+        ).sort("last_heartbeat", 1)
+        count = 0
+        async for doc in cursor:
+            self.touch(doc["_id"], doc.get("last_heartbeat"))
+            count += 1
+        metrics.observe("scheduler.hydrate", time.perf_counter() - started)
+        logger.info(f"Scheduled auto-pause deadlines for {count} open session(s)")
+
+    async def expire(self, session_ids: list):
+        cutoff = datetime.utcnow() - timedelta(seconds=self.timeout)
+        paused = await pause_stale_sessions(cutoff, session_ids)
+        metrics.incr("scheduler.expired", len(session_ids))
+        metrics.incr("scheduler.paused", paused)
+
+        cursor = StudySession.get_motor_collection().find(
+            {"_id": {"$in": session_ids}, "end_time": None},
+            {"is_paused": 1, "paused_at": 1, "last_heartbeat": 1}
+        )
+        async for doc in cursor:
+            if doc.get("is_paused"):
+                paused_at = doc["paused_at"].isoformat() if doc.get("paused_at") else None
+                active_sessions.update(doc["_id"], is_paused=True, paused_at=paused_at)
+                live_sessions.publish(doc["_id"], "paused", reason="inactivity", paused_at=paused_at)
+            else:
+                # still running: it had a heartbeat we didn't see locally
+                self.touch(doc["_id"], doc.get("last_heartbeat"))
+                metrics.incr("scheduler.rescheduled")
+
+        if paused:
+            logger.info(f"[scheduler] Paused {paused} session(s) due to inactivity")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.lease.release()
+
+    async def run(self):
+        renew_every = self.lease.ttl / 3
+        last_renewal = last_hydrate = 0.0
+        while True:
+            now = time.time()
+            try:
+                if now - last_renewal >= renew_every:
+                    last_renewal = now
+                    was_leader = self.lease.held
+                    if await self.lease.acquire() and (
+                        not was_leader or now - last_hydrate >= self.rehydrate_interval
+                    ):
+                        last_hydrate = now
+                        await self.hydrate()
+
+                expired = self.wheel.advance(now)
+                if expired:
+                    await self.expire(expired)
+            except Exception as e:
+                logger.error(f"❌ Session scheduler tick failed: {str(e)}", exc_info=True)
+
+            metrics.gauge("scheduler.deadlines", len(self.wheel))
+            await asyncio.sleep(self.wheel.resolution)
+
+
+# Global session scheduler instance
+session_scheduler = SessionScheduler(
+    timeout=Config.SESSION_INACTIVITY_SECONDS,
+    slots=Config.SCHEDULER_SLOTS,
+    resolution=Config.SCHEDULER_TICK_SECONDS,
+    lease=Lease("session-scheduler", ttl=Config.SCHEDULER_LEASE_SECONDS),
+    rehydrate_interval=Config.SCHEDULER_REHYDRATE_SECONDS,
+)
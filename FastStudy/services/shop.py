@@ -0,0 +1,50 @@
+# services/shop.py
+from bson import DBRef
+from fastapi import HTTPException
+
+from models.CoinEntry import CoinReason
+from models.ShopItem import ShopItem
+from services import coins as coins_ledger
+from services.catalog import SHOP_ITEMS, catalog_cache
+
+
+async def checkout(user_id, item_ids: list):
+    """
+    Buy a cart of shop items: priced from the catalog cache, then the
+    total debited and the items added in one conditional update, which
+    only applies while the balance covers the total and none of the items
+    is owned yet. The cart itself is the idempotency key, so a repeated
+    click is a no-op rather than a second charge. Returns (items, total,
+    new balance).
+
+    Going through the coin ledger costs three writes, not one: the pending
+    ledger entry, the conditional update on the user, and marking the entry
+    applied. Only the middle one decides anything; the other two keep the
+    debit in the ledger that reconcile() checks balances against, and are
+    dropped or settled by settle_pending() if the request dies around them.
+    """
+    items = []
+    for item_id in dict.fromkeys(item_ids):
+        item = await catalog_cache.get(SHOP_ITEMS, item_id)
+        if not item:
+            raise HTTPException(status_code=404, detail=f"Item not found: {item_id}")
+        items.append(item)
+    if not items:
+        raise HTTPException(status_code=400, detail="Cart is empty")
+
+    ids = sorted(item.id for item in items)
+    total = sum(item.price for item in items)
+    user = await coins_ledger.post(
+        user_id,
+        -total,
+        CoinReason.PURCHASE,
+        f"purchase:{','.join(map(str, ids))}",
+        ref=",".join(map(str, ids)),
+        guard=True,
+        extra_update={"$addToSet": {"purchased_items": {
+            "$each": [DBRef(ShopItem.get_collection_name(), item_id) for item_id in ids]
+        }}},
+        precondition={"purchased_items.$id": {"$nin": ids}},
+        conflict="Item already purchased",
+    )
+    return items, total, user["coins"]
@@ -0,0 +1,131 @@
+# services/streaks.py
+from datetime import datetime, timedelta
+
+from models.DailyStat import DailyStat
+
+# recent_days keeps this many days (today included), enough for the monthly window
+ROLLING_WINDOW_DAYS = 31
+WEEK_DAYS = 7
+MONTH_DAYS = 30
+
+_DAY_MS = 24 * 60 * 60 * 1000
+
+
+def streak_multiplier(streak: int) -> float:
+    if   streak >= 30: return 3.0
+    elif streak >= 14: return 2.0
+    elif streak >=  7: return 1.5
+    else:              return 1.0
+
+
+def period_starts(day: datetime) -> tuple:
+    """The Monday and the 1st (midnight UTC) starting the week and month of `day`"""
+    day = DailyStat.day_of(day)
+    return day - timedelta(days=day.weekday()), day.replace(day=1)
+
+
+def record_focus(
+        moment: datetime,
+        minutes: int,
+        sessions: int = 0,
+        distractions_blocked: int = 0,
+        extra: dict = None
+) -> list:
+    """
+    Pipeline update folding one piece of focus time into a user's compact
+    counters: lifetime/weekly/monthly totals, the rolling window of daily
+    totals (older days are dropped) and the streak bounds. The weekly and
+    monthly totals restart when the stored week_start/month_start predate
+    the moment's period, whether or not the rollover has reached the user
+    yet. `extra` is merged into the first $set stage.
+    """
+    day = DailyStat.day_of(moment)
+    week, month = period_starts(day)
+    key = day.date().isoformat()
+    oldest = (day - timedelta(days=ROLLING_WINDOW_DAYS - 1)).date().isoformat()
+    today = f"$recent_days.{key}"
+    streak = {"$add": [
+        {"$toInt": {"$divide": [{"$subtract": ["$last_study_day", "$streak_start"]}, _DAY_MS]}},
+        1
+    ]}
+
+    return [
+        {"$set": {
+            "recent_days": {"$mergeObjects": [
+                {"$arrayToObject": {"$filter": {
+                    "input": {"$objectToArray": {"$ifNull": ["$recent_days", {}]}},
+                    "cond": {"$gte": ["$$this.k", oldest]},
+                }}},
+                {key: {
+                    "focus_time": {"$add": [{"$ifNull": [f"{today}.focus_time", 0]}, minutes]},
+                    "sessions": {"$add": [{"$ifNull": [f"{today}.sessions", 0]}, sessions]},
+                    "distractions_blocked": {"$add": [
+                        {"$ifNull": [f"{today}.distractions_blocked", 0]}, distractions_blocked
+                    ]},
+                }},
+            ]},
+            # studied yesterday or earlier today: the streak carries on
+            "streak_start": {"$cond": [
+                {"$in": ["$last_study_day", [day, day - timedelta(days=1)]]},
+                {"$ifNull": ["$streak_start", day]},
+                day
+            ]},
+            "last_study_day": day,
+            "last_active_date": moment,
+            # server time, the cursor services.leaderboards polls on
+            "focus_updated_at": "$$NOW",
+            "total_focus_time": {"$add": [{"$ifNull": ["$total_focus_time", 0]}, minutes]},
+            "weekly_focus_time": {"$add": [
+                {"$cond": [{"$lt": ["$week_start", week]}, 0, {"$ifNull": ["$weekly_focus_time", 0]}]}, minutes
+            ]},
+            "monthly_focus_time": {"$add": [
+                {"$cond": [{"$lt": ["$month_start", month]}, 0, {"$ifNull": ["$monthly_focus_time", 0]}]}, minutes
+            ]},
+            "week_start": {"$max": ["$week_start", week]},
+            "month_start": {"$max": ["$month_start", month]},
+            **(extra or {}),
+        }},
+        {"$set": {
+            "day_streak": streak,
+            "longest_streak": {"$max": [{"$ifNull": ["$longest_streak", 0]}, streak]},
+        }},
+    ]
+
+
+def streak_length(streak_start: datetime, last_study_day: datetime, now: datetime) -> int:
+    """Consecutive study days ending today; 0 until the user studies today"""
+    if not last_study_day or not streak_start:
+        return 0
+    if last_study_day.date() != now.date():
+        return 0
+    return (last_study_day.date() - streak_start.date()).days + 1
+
+
+def current_streak(user, now: datetime) -> int:
+    return streak_length(user.streak_start, user.last_study_day, now)
+
+
+def rollup(user, now: datetime) -> dict:
+    """Streak and rolling focus totals for /users/me, from the stored counters only"""
+    today = now.date()
+    week_start = (today - timedelta(days=WEEK_DAYS)).isoformat()
+    month_start = (today - timedelta(days=MONTH_DAYS)).isoformat()
+    streak = current_streak(user, now)
+
+    return {
+        "day_streak": streak,
+        "longest_streak": max(user.longest_streak, streak),
+        "streak_multiplier": streak_multiplier(streak),
+        "today_focus_time": user.recent_days[today.isoformat()].focus_time
+            if today.isoformat() in user.recent_days else 0,
+        "weekly_focus_time": sum(t.focus_time for d, t in user.recent_days.items() if d >= week_start),
+        "monthly_focus_time": sum(t.focus_time for d, t in user.recent_days.items() if d >= month_start),
+    }
+
+
+def recent_study_stats(user) -> list:
+    """The rolling window as StudyStat-shaped dicts, newest first"""
+    return [
+        {"date": datetime.fromisoformat(day), **totals.dict()}
+        for day, totals in sorted(user.recent_days.items(), reverse=True)
+    ]
@@ -0,0 +1,37 @@
+# tests/conftest.py
+import os
+
+# auth.utils reads the signing key at import time
+os.environ.setdefault("SECRET_KEY", "test-secret")
+
+import mongomock.collection
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from auth.cache import principal_cache
+from database import db
+from services.catalog import catalog_cache
+
+
+# pymongo 4.11's UpdateOne passes `sort` to bulk builders, which mongomock predates
+_add_update = mongomock.collection.BulkOperationBuilder.add_update
+mongomock.collection.BulkOperationBuilder.add_update = \
+    lambda self, *args, sort=None, **kwargs: _add_update(self, *args, **kwargs)
+
+
+@pytest.fixture
+async def mongo():
+    """A fresh in-memory database with every model initialised, as init_db does"""
+    db.client = AsyncMongoMockClient()
+    db.database = db.client["StudyShieldTest"]
+    assert await db.initialize_collections()
+    principal_cache.clear()
+    await catalog_cache.refresh(force=True)
+    yield db.database
+    principal_cache.clear()
+
+
+@pytest.fixture
+async def user(mongo):
+    from models.User import User
+    return await User(name="Ada", username="ada", email="ada@example.com", password="hash").create()
@@ -0,0 +1,110 @@
+# tests/test_coin_ledger.py
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from models.CoinEntry import CoinEntry, CoinReason, EntryStatus
+from models.User import User
+from services import coins as coins_ledger
+
+
+async def balance(user) -> int:
+    return (await User.get_motor_collection().find_one({"_id": user.id}))["coins"]
+
+
+async def ledger_entry(user, key):
+    return await CoinEntry.get_motor_collection().find_one({"user_id": user.id, "idempotency_key": key})
+
+
+async def pending(user, key, amount, age=timedelta()):
+    entry = CoinEntry(
+        user_id=user.id, amount=amount, reason=CoinReason.PURCHASE, idempotency_key=key,
+        created_at=datetime.utcnow() - age,
+    ).model_dump(by_alias=True, exclude={"id"}, mode="python")
+    await CoinEntry.get_motor_collection().insert_one(dict(entry))
+    return entry
+
+
+async def reach_balance(user, key, amount):
+    """What the guarded update of an attempt at `key` does to the user"""
+    await User.get_motor_collection().update_one(
+        {"_id": user.id}, {"$inc": {"coins": amount}, "$push": {"applied_ops": key}}
+    )
+
+
+async def test_replayed_key_is_applied_once(user):
+    for _ in range(3):
+        doc = await coins_ledger.post(user.id, 10, CoinReason.ADMIN_GRANT, "grant:1")
+
+    assert doc["coins"] == 10
+    assert (await ledger_entry(user, "grant:1"))["status"] == EntryStatus.APPLIED.value
+    assert await CoinEntry.get_motor_collection().count_documents({"user_id": user.id}) == 1
+
+
+async def test_uncovered_debit_leaves_no_entry(user):
+    with pytest.raises(HTTPException) as raised:
+        await coins_ledger.post(user.id, -10, CoinReason.PURCHASE, "purchase:1", guard=True)
+
+    assert raised.value.status_code == 400
+    assert await balance(user) == 0
+    assert await ledger_entry(user, "purchase:1") is None
+
+
+async def test_retry_of_a_pending_post_that_was_applied_returns_it(user):
+    await pending(user, "grant:2", 10)
+    await reach_balance(user, "grant:2", 10)
+
+    doc = await coins_ledger.post(user.id, 10, CoinReason.ADMIN_GRANT, "grant:2")
+
+    assert doc["coins"] == 10
+    assert (await ledger_entry(user, "grant:2"))["status"] == EntryStatus.APPLIED.value
+
+
+async def test_first_attempt_applying_after_a_failed_retry_keeps_its_entry(user):
+    # attempt A recorded the entry, retry B fails and takes it out...
+    entry = await pending(user, "purchase:2", -10)
+    with pytest.raises(HTTPException):
+        await coins_ledger.post(user.id, -10, CoinReason.PURCHASE, "purchase:2", guard=True)
+    assert await ledger_entry(user, "purchase:2") is None
+
+    # ...then A's guarded update lands (coins came in meanwhile) and A marks it applied
+    await reach_balance(user, "purchase:2", -10)
+    await coins_ledger._mark_applied(entry)
+
+    assert (await ledger_entry(user, "purchase:2"))["amount"] == -10
+    assert (await ledger_entry(user, "purchase:2"))["status"] == EntryStatus.APPLIED.value
+
+
+async def test_dropping_a_pending_entry_applied_meanwhile_puts_it_back(user):
+    entry = await pending(user, "grant:3", 10)
+    await reach_balance(user, "grant:3", 10)
+
+    await coins_ledger._drop_pending(entry)
+
+    assert (await ledger_entry(user, "grant:3"))["status"] == EntryStatus.APPLIED.value
+
+
+async def test_settle_pending(user):
+    old = coins_ledger.PENDING_GRACE * 2
+    await pending(user, "grant:applied", 10, age=old)
+    await reach_balance(user, "grant:applied", 10)
+    await pending(user, "grant:lost", 10, age=old)
+    await pending(user, "grant:recent", 10)
+
+    assert await coins_ledger.settle_pending() == 2
+
+    assert (await ledger_entry(user, "grant:applied"))["status"] == EntryStatus.APPLIED.value
+    assert await ledger_entry(user, "grant:lost") is None
+    assert (await ledger_entry(user, "grant:recent"))["status"] == EntryStatus.PENDING.value
+
+
+async def test_settle_pending_leaves_entries_it_cannot_confirm(user):
+    await User.get_motor_collection().update_one(
+        {"_id": user.id},
+        {"$set": {"applied_ops": [f"op:{i}" for i in range(coins_ledger.APPLIED_OPS_KEPT)]}},
+    )
+    await pending(user, "grant:old", 10, age=coins_ledger.PENDING_GRACE * 2)
+
+    assert await coins_ledger.settle_pending() == 0
+    assert (await ledger_entry(user, "grant:old"))["status"] == EntryStatus.PENDING.value
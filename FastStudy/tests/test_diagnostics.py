@@ -0,0 +1,13 @@
+# tests/test_diagnostics.py
+from datetime import datetime
+
+from diagnostics import query_shapes
+
+
+def test_sample_values_are_taken_per_run():
+    before = datetime.utcnow()
+    first, second = query_shapes(), query_shapes()
+
+    assert first[1]["filter"]["user.$id"] != second[1]["filter"]["user.$id"]
+    sampled = next(shape for shape in second if shape["name"] == "leaderboards: poll changed focus counters")
+    assert sampled["filter"]["focus_updated_at"]["$gte"] >= before
@@ -0,0 +1,42 @@
+# tests/test_heartbeats.py
+from datetime import datetime
+
+import pytest
+
+from models.StudySession import StudySession
+from services.heartbeats import HeartbeatBuffer
+
+
+@pytest.fixture
+async def session(user):
+    return await StudySession(user=user, tasks=[], planned_duration=25, start_time=datetime.utcnow()).insert()
+
+
+async def end(session):
+    await StudySession.get_motor_collection().update_one(
+        {"_id": session.id}, {"$set": {"end_time": datetime.utcnow()}}
+    )
+
+
+async def test_heartbeat_for_a_finished_session_is_refused(session, user):
+    await end(session)
+    buffer = HeartbeatBuffer(flush_interval=60, owner_cache_size=10)
+
+    assert not await buffer.record(session.id, user.id)
+
+
+async def test_session_finished_on_another_worker_is_forgotten_at_flush(session, user):
+    buffer = HeartbeatBuffer(flush_interval=60, owner_cache_size=10)
+    assert await buffer.record(session.id, user.id)
+
+    await end(session)
+    assert await buffer.record(session.id, user.id)  # still cached on this worker
+    await buffer.flush()
+
+    assert not await buffer.record(session.id, user.id)
+
+
+async def test_heartbeat_from_someone_else_is_refused(session):
+    buffer = HeartbeatBuffer(flush_interval=60, owner_cache_size=10)
+
+    assert not await buffer.record(session.id, session.id)
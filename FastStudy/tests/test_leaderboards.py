@@ -0,0 +1,42 @@
+# tests/test_leaderboards.py
+import random
+
+from services.leaderboards import RankedScores
+
+
+def expected_order(scores: dict) -> list:
+    return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+
+def test_rank_and_page_follow_scores_then_members():
+    board = RankedScores()
+    for member, score in {"c": 10, "a": 30, "b": 10, "d": 20}.items():
+        board.set(member, score)
+
+    assert board.page(0, 10) == [("a", 30), ("d", 20), ("b", 10), ("c", 10)]
+    assert [board.rank(member) for member in "abcd"] == [1, 3, 4, 2]
+    assert board.page(1, 2) == [("d", 20), ("b", 10)]
+    assert board.rank("missing") is None
+
+
+def test_matches_a_sorted_list_under_random_updates():
+    rng = random.Random(7)
+    board, scores = RankedScores(), {}
+    for _ in range(3000):
+        member = f"user{rng.randrange(200)}"
+        if rng.random() < 0.1:
+            board.discard(member)
+            scores.pop(member, None)
+        else:
+            score = rng.randrange(50)
+            board.set(member, score)
+            scores[member] = score
+
+    ordered = expected_order(scores)
+    assert len(board) == len(scores)
+    assert board.page(0, len(ordered)) == ordered
+    for position, (member, score) in enumerate(ordered, start=1):
+        assert board.rank(member) == position
+        assert board.score(member) == score
+    for offset in (0, 17, len(ordered) - 5, len(ordered)):
+        assert board.page(offset, 5) == ordered[offset:offset + 5]
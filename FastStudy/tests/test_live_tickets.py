@@ -0,0 +1,33 @@
+# tests/test_live_tickets.py
+from beanie import PydanticObjectId
+
+from models.LiveTicket import LiveTicket
+
+
+async def test_single_use_ticket_is_used_up(user):
+    session_id = PydanticObjectId()
+    ticket = await LiveTicket.issue(user.id, session_id, ttl=30)
+
+    assert await LiveTicket.redeem(ticket, session_id) == user.id
+    assert await LiveTicket.redeem(ticket, session_id) is None
+
+
+async def test_reusable_ticket_survives_reconnects_until_revoked(user):
+    session_id = PydanticObjectId()
+    ticket = await LiveTicket.issue(user.id, session_id, ttl=3600, reusable=True)
+
+    for _ in range(3):
+        assert await LiveTicket.redeem(ticket, session_id, reusable=True) == user.id
+    # each kind only opens its own channel
+    assert await LiveTicket.redeem(ticket, session_id) is None
+    assert await LiveTicket.redeem(ticket, PydanticObjectId(), reusable=True) is None
+
+    await LiveTicket.revoke(session_id)
+    assert await LiveTicket.redeem(ticket, session_id, reusable=True) is None
+
+
+async def test_expired_ticket_is_refused(user):
+    session_id = PydanticObjectId()
+    ticket = await LiveTicket.issue(user.id, session_id, ttl=-1, reusable=True)
+
+    assert await LiveTicket.redeem(ticket, session_id, reusable=True) is None
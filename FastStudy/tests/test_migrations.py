@@ -0,0 +1,35 @@
+# tests/test_migrations.py
+from datetime import datetime, timedelta
+
+from services.migrations import _streak_bounds
+
+
+def days(*offsets):
+    """Studied days, newest first, `offsets` days before a fixed day"""
+    latest = datetime(2026, 10, 18)
+    return [latest - timedelta(days=offset) for offset in offsets]
+
+
+def test_single_day():
+    studied = days(0)
+    assert _streak_bounds(studied) == (studied[0], 1)
+
+
+def test_unbroken_run():
+    studied = days(0, 1, 2, 3)
+    assert _streak_bounds(studied) == (studied[-1], 4)
+
+
+def test_current_run_shorter_than_an_older_one():
+    studied = days(0, 1, 5, 6, 7, 8, 9)
+    assert _streak_bounds(studied) == (studied[1], 5)
+
+
+def test_current_run_longer_than_an_older_one():
+    studied = days(0, 1, 2, 4, 5)
+    assert _streak_bounds(studied) == (studied[2], 3)
+
+
+def test_gap_right_after_the_latest_day():
+    studied = days(0, 2, 3, 4)
+    assert _streak_bounds(studied) == (studied[0], 3)
@@ -0,0 +1,59 @@
+# tests/test_principals.py
+import pytest
+
+from auth.cache import principal_cache
+from fastapi import HTTPException
+
+from auth.dependencies import require_admin, resolve_principal
+from auth.utils import create_access_token
+from models.User import User, UserRole
+
+
+async def test_principal_is_read_only_on_miss_and_hit(user):
+    token = create_access_token({"sub": user.email})
+
+    cold = await resolve_principal(token)
+    warm = await resolve_principal(token)
+    assert principal_cache.hits == 1
+
+    for principal in (cold, warm):
+        principal.coins = 1000
+        with pytest.raises(RuntimeError):
+            await principal.save()
+    assert (await User.get(user.id)).coins == 0
+
+
+async def test_write_on_another_worker_is_seen_on_the_next_hit(user):
+    token = create_access_token({"sub": user.email})
+    await resolve_principal(token)
+
+    # what apply_update does on another worker: this worker's cache isn't evicted
+    await User.get_motor_collection().update_one(
+        {"_id": user.id}, {"$set": {"coins": 42, "is_active": False}, "$inc": {"revision": 1}}
+    )
+
+    principal = await resolve_principal(token)
+    assert principal.coins == 42
+    assert principal.is_active is False
+
+
+async def test_email_change_elsewhere_drops_the_old_subject(user):
+    token = create_access_token({"sub": user.email})
+    await resolve_principal(token)
+
+    await User.get_motor_collection().update_one(
+        {"_id": user.id}, {"$set": {"email": "lovelace@example.com"}, "$inc": {"revision": 1}}
+    )
+
+    with pytest.raises(HTTPException) as raised:
+        await resolve_principal(token)
+    assert raised.value.status_code == 401
+
+
+async def test_require_admin(user):
+    with pytest.raises(HTTPException) as raised:
+        await require_admin(user)
+    assert raised.value.status_code == 403
+
+    user.role = UserRole.ADMIN
+    assert await require_admin(user) is user
@@ -0,0 +1,47 @@
+# tests/test_progress_revisions.py
+from models.Challenge import Challenge, ChallengeMetric, ChallengeType, ProgressUnit, TierName, TierRequirement
+from models.Milestone import Milestone
+from models.User import User
+from services import coins as coins_ledger
+from services.catalog import CHALLENGES, MILESTONES, catalog_cache
+from services.challenges import StudyEvent, evaluate
+from services.milestones import track_progress
+
+
+async def revision(user) -> int:
+    return (await User.get_motor_collection().find_one({"_id": user.id}))["revision"]
+
+
+async def test_track_progress_bumps_the_revision(user):
+    await Milestone(
+        title="Hours", description="", progress_unit=ProgressUnit.HOURS,
+        tiers={TierName.BRONZE: TierRequirement(value=1, coins=10)},
+    ).insert()
+    await catalog_cache.bump(MILESTONES)
+    before = await revision(user)
+
+    await track_progress(user.id, total_focus_time=90, new_day=True)
+
+    assert await revision(user) > before
+
+
+async def test_evaluate_bumps_the_revision_after_paying_a_completion(user, monkeypatch):
+    # the completing challenge is evaluated first, the other one moves after its payment
+    for goal in (10, 1000):
+        await Challenge(
+            title=f"Focus {goal}", description="", challenge_type=ChallengeType.SPECIAL,
+            goal=goal, coins=5, metric=ChallengeMetric.FOCUS_MINUTES,
+        ).insert()
+    await catalog_cache.bump(CHALLENGES)
+
+    paid_at = []
+    pay_owed = coins_ledger.pay_owed
+
+    async def spy(*args, **kwargs):
+        paid = await pay_owed(*args, **kwargs)
+        paid_at.append(await revision(user))
+        return paid
+
+    monkeypatch.setattr(coins_ledger, "pay_owed", spy)
+    assert await evaluate(user.id, StudyEvent(focus_minutes=25)) == 5
+    assert await revision(user) > paid_at[0]
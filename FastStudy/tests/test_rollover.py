@@ -0,0 +1,86 @@
+# tests/test_rollover.py
+from datetime import date, datetime, timedelta
+
+from beanie import PydanticObjectId
+
+from models.Challenge import Challenge, ChallengeType
+from models.User import User
+from models.UserChallenge import UserChallenge
+from services.catalog import CHALLENGES, catalog_cache
+from services.lease import Lease
+from services.rollover import RolloverJob, rollover_updates
+
+MONDAY = date(2026, 10, 19)
+MIDNIGHT = datetime(2026, 10, 19)
+
+
+def filters(updates: list, collection) -> list:
+    return [query for target, _, query, _ in updates if target.name == collection.get_collection_name()]
+
+
+async def test_updates_only_match_what_predates_the_period(mongo):
+    daily_id = PydanticObjectId()
+    updates = rollover_updates(MONDAY, [daily_id])
+
+    assert filters(updates, UserChallenge) == [
+        {"challenge_id": {"$in": [daily_id]}, "last_updated": {"$lt": MIDNIGHT}}
+    ]
+    assert {"week_start": {"$not": {"$gte": MIDNIGHT}}} in filters(updates, User)
+    assert {"month_start": {"$not": {"$gte": datetime(2026, 10, 1)}}} in filters(updates, User)
+
+
+async def test_no_daily_challenges_still_rolls_the_counters(mongo):
+    updates = rollover_updates(MONDAY + timedelta(days=1), [])
+
+    assert filters(updates, UserChallenge) == []
+    assert len(filters(updates, User)) == 2
+
+
+async def test_run_keeps_what_was_recorded_after_midnight(mongo):
+    daily = await Challenge(
+        title="Daily", description="", coins=5, goal=10, challenge_type=ChallengeType.DAILY
+    ).insert()
+    await catalog_cache.bump(CHALLENGES)
+
+    last_week = MIDNIGHT - timedelta(days=7)
+    stale = await User(
+        name="Stale", username="stale", email="stale@example.com", password="hash",
+        weekly_focus_time=300, monthly_focus_time=900, week_start=last_week, month_start=datetime(2026, 10, 1),
+    ).create()
+    early = await User(
+        name="Early", username="early", email="early@example.com", password="hash",
+        weekly_focus_time=25, monthly_focus_time=925, week_start=MIDNIGHT, month_start=datetime(2026, 10, 1),
+    ).create()
+    for user, last_updated in ((stale, MIDNIGHT - timedelta(hours=3)), (early, MIDNIGHT + timedelta(hours=1))):
+        await UserChallenge(
+            user_id=user.id, challenge_id=daily.id, progress=10, is_completed=True, redeemed=True,
+            last_updated=last_updated,
+        ).insert()
+
+    job = await RolloverJob(chunk_size=1, lease=Lease("rollover", ttl=60), poll_interval=60).run(MONDAY)
+    assert job["finished_at"] is not None
+
+    users = {doc["_id"]: doc async for doc in User.get_motor_collection().find()}
+    assert (users[stale.id]["weekly_focus_time"], users[stale.id]["week_start"]) == (0, MIDNIGHT)
+    assert users[stale.id]["monthly_focus_time"] == 900  # not the 1st
+    assert users[early.id]["weekly_focus_time"] == 25
+
+    records = {doc["user_id"]: doc async for doc in UserChallenge.get_motor_collection().find()}
+    assert (records[stale.id]["progress"], records[stale.id]["is_completed"]) == (0, False)
+    assert (records[early.id]["progress"], records[early.id]["redeemed"]) == (10, True)
+
+
+async def test_daily_progress_before_the_rollover_starts_from_zero(user):
+    from services.challenges import advance
+
+    daily = await Challenge(
+        title="Daily", description="", coins=5, goal=10, challenge_type=ChallengeType.DAILY
+    ).insert()
+    await UserChallenge(
+        user_id=user.id, challenge_id=daily.id, progress=10, is_completed=True, redeemed=True,
+        last_updated=datetime.utcnow() - timedelta(days=1),
+    ).insert()
+
+    record, completed_now = await advance(user.id, daily, 4, reward=5)
+
+    assert (record.progress, record.is_completed, record.redeemed, completed_now) == (4, False, False, False)
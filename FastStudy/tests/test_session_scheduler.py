@@ -0,0 +1,54 @@
+# tests/test_session_scheduler.py
+from services.session_scheduler import DeadlineWheel
+
+
+def wheel(slots: int = 8):
+    deadlines = DeadlineWheel(slots)
+    return deadlines, deadlines._current
+
+
+def test_keys_fire_once_their_deadline_passes():
+    deadlines, now = wheel()
+    deadlines.schedule("a", now + 2)
+    deadlines.schedule("b", now + 4)
+
+    assert deadlines.advance(now + 1) == []
+    assert deadlines.advance(now + 2) == ["a"]
+    assert deadlines.advance(now + 5) == ["b"]
+    assert len(deadlines) == 0
+
+
+def test_deadline_further_out_than_the_wheel_waits_its_turn():
+    deadlines, now = wheel(slots=8)
+    deadlines.schedule("far", now + 11)
+
+    assert deadlines.advance(now + 3) == []
+    assert "far" in deadlines
+    assert deadlines.advance(now + 11) == ["far"]
+
+
+def test_cancel_and_reschedule():
+    deadlines, now = wheel()
+    deadlines.schedule("a", now + 2)
+    deadlines.schedule("b", now + 2)
+    deadlines.cancel("a")
+    deadlines.schedule("b", now + 6)  # a heartbeat moves the deadline
+
+    assert deadlines.advance(now + 2) == []
+    assert deadlines.advance(now + 6) == ["b"]
+
+
+def test_overdue_deadline_fires_on_the_next_tick():
+    deadlines, now = wheel()
+    deadlines.schedule("late", now - 30)
+
+    assert deadlines.advance(now) == []
+    assert deadlines.advance(now + 1) == ["late"]
+
+
+def test_a_long_gap_expires_everything_due():
+    deadlines, now = wheel(slots=4)
+    for offset in range(1, 10):
+        deadlines.schedule(offset, now + offset)
+
+    assert sorted(deadlines.advance(now + 100)) == list(range(1, 10))
@@ -0,0 +1,21 @@
+# tests/test_user_views.py
+from models.User import User, UserRole
+from routes.UserController import UserOut, create_user
+
+
+def test_me_model_has_no_password():
+    assert "password" not in UserOut.model_fields
+
+
+async def test_create_user_returns_no_password(user):
+    admin = user.model_copy(update={"role": UserRole.ADMIN})
+    created = await create_user(
+        User(name="Grace", username="grace", email="grace@example.com", password="hash", coins=20),
+        current_user=admin,
+    )
+
+    body = created.model_dump(by_alias=True, exclude_unset=True)
+    assert "password" not in body
+    assert body["email"] == "grace@example.com"
+    assert body["coins"] == 20
+    assert body["_id"] is not None